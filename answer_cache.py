@@ -0,0 +1,159 @@
+# 自动应答缓存：对重复出现的确认类问题直接返回已记住的回答，不启动界面
+#
+# 缓存文件（JSON）包含两部分，可以手工编辑：
+#   {
+#     "rules": [
+#       {"match": "是否继续", "predefined_options": ["继续", "停止"], "project": "/path/to/project",
+#        "options": ["继续"], "text": ""}
+#     ],
+#     "entries": [
+#       {"prompt": "是否继续", "predefined_options": ["继续", "停止"], "project": "/path/to/project",
+#        "interactive_feedback": "选中选项: 继续", "created": 1700000000.0, "expires": 1700086400.0}
+#     ]
+#   }
+# rules 按顺序用正则匹配提示，predefined_options 和 project 省略时不限制；options/text 的含义与脚本化应答相同。
+# entries 由界面上的"总是这样回答"按钮写入，按规范化后的提示 + 预定义选项 + 项目精确匹配，expires 为 null 时永不过期。
+import os
+import re
+import sys
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from responder import compose_feedback, pick_options
+
+# 规范化时去掉的结尾标点
+_TRAILING_PUNCTUATION = "?？.。!！:：;；~～ "
+
+
+def normalize_prompt(prompt: str) -> str:
+    """忽略大小写、空白差异和结尾标点，"Proceed with the changes?" 与 "proceed with the  changes" 视为同一问题"""
+    return " ".join(prompt.casefold().split()).rstrip(_TRAILING_PUNCTUATION)
+
+
+def normalize_project(project: Optional[str]) -> Optional[str]:
+    if not project:
+        return None
+    return os.path.normcase(os.path.abspath(project))
+
+
+class AnswerCache:
+    """按提示、预定义选项和项目查找自动应答，并统计命中情况"""
+
+    def __init__(self, path: str, ttl_seconds: float):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.rules: List[Dict[str, Any]] = []
+        self.entries: Dict[Tuple[Optional[str], str, Tuple[str, ...]], Dict[str, Any]] = {}
+        self.counters = {"hits": 0, "rule_hits": 0, "misses": 0, "expired": 0, "stores": 0}
+        self._mtime: Optional[float] = None
+
+    @staticmethod
+    def _key(project: Optional[str], prompt: str, predefined_options: Optional[List[str]]) -> Tuple[Optional[str], str, Tuple[str, ...]]:
+        return normalize_project(project), normalize_prompt(prompt), tuple(predefined_options or [])
+
+    def _reload(self):
+        """文件被其他服务端进程或手工修改过时重新读取"""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        self.rules, self.entries = [], {}
+        if mtime is None:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取自动应答缓存失败: {e}", file=sys.stderr)
+            return
+        for rule in data.get("rules", []):
+            try:
+                self.rules.append({**rule, "pattern": re.compile(rule.get("match", ""), re.S | re.I)})
+            except re.error as e:
+                print(f"自动应答规则无效: {e}", file=sys.stderr)
+        for entry in data.get("entries", []):
+            key = self._key(entry.get("project"), entry.get("prompt", ""), entry.get("predefined_options"))
+            self.entries[key] = entry
+
+    def _save(self):
+        data = {
+            "rules": [{k: v for k, v in rule.items() if k != "pattern"} for rule in self.rules],
+            "entries": list(self.entries.values()),
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+        self._mtime = os.stat(self.path).st_mtime
+
+    def _match_rule(self, prompt: str, predefined_options: List[str], project: Optional[str]) -> Optional[Dict[str, Any]]:
+        for rule in self.rules:
+            if "predefined_options" in rule and list(rule["predefined_options"]) != predefined_options:
+                continue
+            if rule.get("project") and normalize_project(rule["project"]) != project:
+                continue
+            if rule["pattern"].search(prompt):
+                return rule
+        return None
+
+    def lookup(self, prompt: str, predefined_options: Optional[List[str]], project: Optional[str]) -> Optional[Dict[str, Any]]:
+        """命中时返回 {"interactive_feedback": ..., "source": "cache"|"rule", "expires": ...}"""
+        self._reload()
+        key = self._key(project, prompt, predefined_options)
+        entry = self.entries.get(key)
+        if entry is not None:
+            expires = entry.get("expires")
+            if expires is None or expires > time.time():
+                self.counters["hits"] += 1
+                return {"interactive_feedback": entry["interactive_feedback"], "source": "cache", "expires": expires}
+            self.counters["expired"] += 1
+            del self.entries[key]
+            self._save_quietly()
+
+        rule = self._match_rule(prompt, list(predefined_options or []), key[0])
+        if rule is not None:
+            self.counters["rule_hits"] += 1
+            selected = pick_options(rule.get("options", []), predefined_options or [])
+            return {"interactive_feedback": compose_feedback(selected, rule.get("text", "")), "source": "rule", "expires": None}
+
+        self.counters["misses"] += 1
+        return None
+
+    def store(self, prompt: str, predefined_options: Optional[List[str]], project: Optional[str], feedback: str):
+        """记住一个回答（界面上点击"总是这样回答"），在 ttl_seconds 后过期，ttl 不大于 0 时永不过期"""
+        self._reload()
+        now = time.time()
+        self.entries = {k: e for k, e in self.entries.items() if e.get("expires") is None or e["expires"] > now}
+        key = self._key(project, prompt, predefined_options)
+        self.entries[key] = {
+            "prompt": key[1],
+            "predefined_options": list(key[2]),
+            "project": key[0],
+            "interactive_feedback": feedback,
+            "created": now,
+            "expires": now + self.ttl_seconds if self.ttl_seconds > 0 else None,
+        }
+        self.counters["stores"] += 1
+        self._save_quietly()
+
+    def _save_quietly(self):
+        try:
+            self._save()
+        except OSError as e:
+            print(f"写入自动应答缓存失败: {e}", file=sys.stderr)
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.counters["hits"] + self.counters["rule_hits"] + self.counters["misses"]
+        hit_ratio = (self.counters["hits"] + self.counters["rule_hits"]) / lookups if lookups else 0.0
+        return {
+            **self.counters,
+            "hit_ratio": hit_ratio,
+            "entries": len(self.entries),
+            "rules": len(self.rules),
+            "path": self.path,
+        }
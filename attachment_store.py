@@ -0,0 +1,209 @@
+# 按内容寻址的附件存储
+# 目录结构：
+#   attachments/blobs/<sha256前两位>/<sha256>     附件内容，只读，相同内容只存一份
+#   attachments/sessions/<会话ID>/manifest.json   每次反馈的附件清单
+#   attachments/sessions/<会话ID>/<文件名>         指向 blob 的硬链接（不支持时用 reflink 或复制）
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import mimetypes
+from typing import Any, Dict, List, Optional
+
+CHUNK_SIZE = 1024 * 1024
+# Linux 上 ioctl(FICLONE) 的请求码，用于 btrfs/xfs 等文件系统的写时复制克隆
+FICLONE = 0x40049409
+
+
+def _reflink(src: str, dst: str) -> bool:
+    """尝试以写时复制的方式克隆文件，不支持时返回 False"""
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl
+    try:
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        return True
+    except OSError:
+        if os.path.exists(dst):
+            os.unlink(dst)
+        return False
+
+
+def link_or_copy(src: str, dst: str):
+    """依次尝试硬链接、reflink，最后才真正复制文件"""
+    try:
+        os.link(src, dst)
+        return
+    except OSError:
+        pass
+    if not _reflink(src, dst):
+        shutil.copyfile(src, dst)
+
+
+class _BlobWriter:
+    """边写入临时文件边计算SHA-256，关闭时把临时文件提交为 blob"""
+
+    def __init__(self, session: "StoreSession", meta: Dict[str, Any]):
+        self.session = session
+        self.meta = meta
+        self.hasher = hashlib.sha256()
+        fd, self.tmp_path = tempfile.mkstemp(dir=session.store.tmp_dir)
+        self.file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes):
+        self.hasher.update(chunk)
+        self.file.write(chunk)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.file.close()
+        if exc_type is not None:
+            os.unlink(self.tmp_path)
+            return
+        digest = self.session.store._commit_blob(self.tmp_path, self.hasher.hexdigest())
+        self.session._add_entry(self.meta, digest)
+
+
+class StoreSession:
+    """一次反馈的附件集合，首个附件写入时才创建会话目录"""
+
+    def __init__(self, store: "AttachmentStore", session_id: str):
+        self.store = store
+        self.session_id = session_id
+        self.entries: List[Dict[str, Any]] = []
+        self._names: set = set()
+
+    @property
+    def session_dir(self) -> str:
+        return os.path.join(self.store.sessions_dir, self.session_id)
+
+    def open(self, meta: Dict[str, Any]) -> _BlobWriter:
+        """返回一个可写对象，流式写入的附件内容会被哈希并存为 blob"""
+        return _BlobWriter(self, meta)
+
+    def add_file(self, path: str, meta: Dict[str, Any]) -> str:
+        """按路径加入一个已有文件：分块计算哈希，内容已存在时不再复制"""
+        hasher = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()
+        blob_path = self.store.blob_path(digest)
+        if not os.path.exists(blob_path):
+            fd, tmp_path = tempfile.mkstemp(dir=self.store.tmp_dir)
+            os.close(fd)
+            os.unlink(tmp_path)
+            # 不对用户文件做硬链接，避免原文件被修改后破坏 blob 内容
+            if not _reflink(path, tmp_path):
+                shutil.copyfile(path, tmp_path)
+            self.store._commit_blob(tmp_path, digest)
+        self._add_entry(meta, digest)
+        return digest
+
+    def _unique_name(self, name: str) -> str:
+        name = os.path.basename(name) or "attachment"
+        stem, ext = os.path.splitext(name)
+        candidate, index = name, 2
+        while candidate in self._names or candidate == "manifest.json":
+            candidate = f"{stem} ({index}){ext}"
+            index += 1
+        self._names.add(candidate)
+        return candidate
+
+    def _add_entry(self, meta: Dict[str, Any], digest: str):
+        os.makedirs(self.session_dir, exist_ok=True)
+        name = self._unique_name(meta["name"])
+        link_or_copy(self.store.blob_path(digest), os.path.join(self.session_dir, name))
+        self.entries.append({
+            "name": name,
+            "type": meta.get("file_type", meta.get("type", "file")),
+            "size": os.path.getsize(self.store.blob_path(digest)),
+            "mime_type": mimetypes.guess_type(name)[0] or "application/octet-stream",
+            "sha256": digest,
+        })
+
+    def commit(self) -> Optional[str]:
+        """写出会话清单，没有附件时不创建任何文件"""
+        if not self.entries:
+            return None
+        manifest_path = os.path.join(self.session_dir, "manifest.json")
+        _write_json_atomic(manifest_path, {
+            "session": self.session_id,
+            "created": time.time(),
+            "attachments": self.entries,
+        })
+        return manifest_path
+
+
+class AttachmentStore:
+    def __init__(self, root: str):
+        self.root = root
+        self.blobs_dir = os.path.join(root, "blobs")
+        self.sessions_dir = os.path.join(root, "sessions")
+        self.tmp_dir = os.path.join(root, "tmp")
+
+    def ensure_dirs(self):
+        for path in (self.blobs_dir, self.sessions_dir, self.tmp_dir):
+            os.makedirs(path, exist_ok=True)
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.blobs_dir, digest[:2], digest)
+
+    def new_session(self) -> StoreSession:
+        self.ensure_dirs()
+        return StoreSession(self, os.urandom(4).hex())
+
+    def _commit_blob(self, tmp_path: str, digest: str) -> str:
+        blob_path = self.blob_path(digest)
+        if os.path.exists(blob_path):
+            # 内容已存在，丢弃本次写入
+            os.unlink(tmp_path)
+            return digest
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        # blob 与会话目录中的文件共享 inode，设为只读以免被意外修改
+        os.chmod(tmp_path, 0o444)
+        try:
+            os.replace(tmp_path, blob_path)
+        except OSError:
+            os.unlink(tmp_path)
+            # 并发写入同一内容时，另一方可能已经先提交
+            if not os.path.exists(blob_path):
+                raise
+        return digest
+
+    def read_manifest(self, session_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self.sessions_dir, session_id, "manifest.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def find_attachment(self, session_id: str, name: str) -> Optional[Dict[str, Any]]:
+        """按清单查找会话中的附件，返回清单条目并附带文件路径；不在清单中的名字一律视为不存在"""
+        manifest = self.read_manifest(session_id)
+        if manifest is None:
+            return None
+        for entry in manifest.get("attachments", []):
+            if entry.get("name") == name:
+                return {**entry, "path": os.path.join(self.sessions_dir, session_id, name)}
+        return None
+
+
+def read_range(path: str, offset: int = 0, length: Optional[int] = None) -> bytes:
+    """读取文件的一段内容，length 为 None 时读到文件末尾"""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read() if length is None else f.read(length)
+
+
+def _write_json_atomic(path: str, data: Any):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
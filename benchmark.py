@@ -0,0 +1,228 @@
+# 端到端性能测试
+# 通过 stdio 启动 server.py，界面进程使用 Qt 的 offscreen 平台并开启自动应答
+# （INTERACTIVE_FEEDBACK_AUTO_RESPOND），因此测到的只是工具本身的开销，不含人工思考时间。
+# 每个场景统计以下阶段耗时的 p50/p95/p99（毫秒）：
+#   spawn             服务端收到调用 -> 界面准备好显示本次请求（常驻模式下首次调用包含进程启动）
+#   first_paint       服务端收到调用 -> 窗口首次绘制
+#   submit_to_result  界面提交 -> 客户端收到工具结果（附件传输、入库、序列化、MCP往返）
+#   serialization     服务端把结果转换为MCP内容块（JSON和图片base64编码）
+#   total             客户端发起调用 -> 收到结果
+#
+# --ui 只在当前进程内测试界面本身：
+#   window_build      构建 FeedbackUI 窗口
+#   first_paint       构建窗口 + 显示到首次绘制
+#   add_file          每添加一个普通文件附件的耗时
+#   add_image         每添加一个图片附件的耗时（不含后台生成缩略图）
+#
+# 用法: uv run benchmark.py [--iterations 20] [--mode daemon spawn] [--scenario text options images]
+#       uv run benchmark.py --ui
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from typing import Any, Dict, List
+
+from fastmcp import Client
+from fastmcp.client.transports import PythonStdioTransport
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+PHASES = ["spawn", "first_paint", "submit_to_result", "serialization", "total"]
+UI_PHASES = ["window_build", "first_paint", "add_file", "add_image"]
+PERCENTILES = [50, 95, 99]
+OPTIONS = ["继续", "修改后再继续", "停止"]
+
+
+def make_fixture_images(directory: str, count: int = 3) -> List[str]:
+    """生成测试用的大尺寸图片（内容确定，便于多次运行之间对比）"""
+    from PySide6.QtGui import QGuiApplication, QImage, QPainter, QColor, QLinearGradient
+
+    app = QGuiApplication.instance() or QGuiApplication(["benchmark", "-platform", "offscreen"])
+    rng = random.Random(0)
+    paths = []
+    for index in range(count):
+        image = QImage(3000, 2000, QImage.Format_RGB32)
+        painter = QPainter(image)
+        gradient = QLinearGradient(0, 0, image.width(), image.height())
+        gradient.setColorAt(0, QColor(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+        gradient.setColorAt(1, QColor(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+        painter.fillRect(image.rect(), gradient)
+        for _ in range(400):
+            color = QColor(rng.randrange(256), rng.randrange(256), rng.randrange(256))
+            painter.fillRect(rng.randrange(3000), rng.randrange(2000), rng.randrange(20, 300), rng.randrange(20, 300), color)
+        painter.end()
+        path = os.path.join(directory, f"fixture_{index}.png")
+        image.save(path)
+        paths.append(path)
+    del app
+    return paths
+
+
+def scenarios(fixtures: List[str]) -> Dict[str, Dict[str, Any]]:
+    return {
+        "text": {
+            "options": None,
+            "responder": {"text": "看起来不错，继续吧。"},
+        },
+        "options": {
+            "options": OPTIONS,
+            "responder": {"text": "补充说明", "options": [0, 2]},
+        },
+        "images": {
+            "options": None,
+            "responder": {"text": "见截图", "attachments": fixtures},
+        },
+    }
+
+
+def percentile(values: List[float], p: float) -> float:
+    """最近秩法计算百分位数"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def read_marks(log_path: str, offset: int) -> Dict[str, float]:
+    """读取本次调用新增的打点，同名事件取第一次出现的时间"""
+    marks: Dict[str, float] = {}
+    with open(log_path, "r", encoding="utf-8") as f:
+        f.seek(offset)
+        for line in f:
+            record = json.loads(line)
+            marks.setdefault(record["event"], record["time"])
+    return marks
+
+
+def phase_durations(marks: Dict[str, float], start: float, end: float) -> Dict[str, float]:
+    durations = {"total": end - start}
+    if "call_start" in marks:
+        if "ui_present" in marks:
+            durations["spawn"] = marks["ui_present"] - marks["call_start"]
+        if "ui_first_paint" in marks:
+            durations["first_paint"] = marks["ui_first_paint"] - marks["call_start"]
+    if "ui_submit" in marks:
+        durations["submit_to_result"] = end - marks["ui_submit"]
+    if "result_received" in marks and "result_serialized" in marks:
+        durations["serialization"] = marks["result_serialized"] - marks["result_received"]
+    return {phase: seconds * 1000 for phase, seconds in durations.items()}
+
+
+async def run_scenario(mode: str, name: str, scenario: Dict[str, Any], iterations: int, warmup: int, workdir: str) -> Dict[str, List[float]]:
+    log_path = os.path.join(workdir, f"timing_{mode}_{name}.jsonl")
+    open(log_path, "w").close()
+    env = {
+        **os.environ,
+        "QT_QPA_PLATFORM": "offscreen",
+        "INTERACTIVE_FEEDBACK_UI_MODE": mode,
+        "INTERACTIVE_FEEDBACK_TIMING_LOG": log_path,
+        "INTERACTIVE_FEEDBACK_AUTO_RESPOND": json.dumps(scenario["responder"]),
+        "INTERACTIVE_FEEDBACK_ATTACHMENTS_DIR": os.path.join(workdir, "attachments"),
+        # 不使用自动应答缓存，每次调用都经过界面
+        "INTERACTIVE_FEEDBACK_ANSWER_CACHE": "",
+        # 测试期间不启动垃圾回收，避免干扰
+        "INTERACTIVE_FEEDBACK_GC_STARTUP_DELAY": "86400",
+    }
+    transport = PythonStdioTransport(os.path.join(script_dir, "server.py"), env=env, cwd=script_dir)
+    samples: Dict[str, List[float]] = {phase: [] for phase in PHASES}
+    async with Client(transport) as client:
+        for index in range(warmup + iterations):
+            offset = os.path.getsize(log_path)
+            arguments: Dict[str, Any] = {"message": f"性能测试 #{index}：请确认本次修改。"}
+            if scenario["options"]:
+                arguments["predefined_options"] = scenario["options"]
+            start = time.time()
+            await client.call_tool("interactive_feedback", arguments)
+            end = time.time()
+            if index < warmup:
+                continue
+            for phase, value in phase_durations(read_marks(log_path, offset), start, end).items():
+                samples[phase].append(value)
+    return samples
+
+
+def run_ui_benchmark(iterations: int, attachments: int, workdir: str) -> Dict[str, List[float]]:
+    """在当前进程中反复构建、显示窗口并添加附件"""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    import feedback_ui
+    from PySide6.QtWidgets import QApplication
+
+    feedback_ui._init_application()
+    image = make_fixture_images(workdir, count=1)[0]
+    text_file = os.path.join(workdir, "fixture.txt")
+    with open(text_file, "w", encoding="utf-8") as f:
+        f.write("benchmark\n" * 100)
+
+    samples: Dict[str, List[float]] = {phase: [] for phase in UI_PHASES}
+    for _ in range(iterations):
+        began = time.perf_counter()
+        window = feedback_ui.FeedbackUI("性能测试：请确认本次修改。", OPTIONS)
+        built = time.perf_counter()
+        window.present()
+        while window.spans.is_open("first_show"):
+            QApplication.processEvents()
+        samples["window_build"].append((built - began) * 1000)
+        samples["first_paint"].append((time.perf_counter() - began) * 1000)
+
+        manager = window.attachments_manager
+        for phase, path in (("add_file", text_file), ("add_image", image)):
+            for _ in range(attachments):
+                began = time.perf_counter()
+                manager.add_file(path)
+                samples[phase].append((time.perf_counter() - began) * 1000)
+            manager.wait_for_tasks()
+            manager.clear()
+        window.close()
+        window.deleteLater()
+        QApplication.processEvents()
+    return samples
+
+
+def print_report(mode: str, name: str, samples: Dict[str, List[float]], phases: List[str] = PHASES):
+    print(f"\n[{mode}] {name}")
+    print(f"  {'阶段':<18}{'n':>5}" + "".join(f"{'p' + str(p):>10}" for p in PERCENTILES))
+    for phase in phases:
+        values = samples.get(phase) or []
+        if not values:
+            continue
+        cells = "".join(f"{percentile(values, p):>10.1f}" for p in PERCENTILES)
+        print(f"  {phase:<20}{len(values):>5}{cells}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="interactive_feedback 端到端耗时测试")
+    parser.add_argument("--iterations", type=int, default=20, help="每个场景计入统计的调用次数")
+    parser.add_argument("--warmup", type=int, default=1, help="每个场景开头不计入统计的调用次数")
+    parser.add_argument("--mode", nargs="+", default=["daemon", "spawn"], choices=["daemon", "spawn"])
+    parser.add_argument("--scenario", nargs="+", default=["text", "options", "images"], choices=["text", "options", "images"])
+    parser.add_argument("--ui", action="store_true", help="只测试界面的构建、首次绘制和添加附件")
+    parser.add_argument("--attachments", type=int, default=20, help="--ui 模式下每个窗口添加的附件数")
+    parser.add_argument("--json", help="把原始样本写入该JSON文件")
+    args = parser.parse_args()
+
+    report: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory(prefix="feedback_bench_") as workdir:
+        if args.ui:
+            samples = run_ui_benchmark(args.iterations, args.attachments, workdir)
+            print_report("ui", "window", samples, UI_PHASES)
+            report["ui/window"] = samples
+            args.mode = []
+        fixtures = make_fixture_images(workdir) if "images" in args.scenario else []
+        all_scenarios = scenarios(fixtures)
+        for mode in args.mode:
+            for name in args.scenario:
+                samples = await run_scenario(mode, name, all_scenarios[name], args.iterations, args.warmup, workdir)
+                print_report(mode, name, samples)
+                report[f"{mode}/{name}"] = samples
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,84 @@
+# 多个客户端共用一个界面宿主时的公平排队
+# 同时显示的窗口数有上限；有空位时按客户端轮转分配，每个客户端内部先到先得，
+# 某个客户端一次提出很多问题也不会挡住其他客户端。
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Tuple
+
+
+class FairQueue:
+    """按客户端轮转分配窗口名额，max_active 不大于 0 表示不限制"""
+
+    def __init__(self, max_active: int):
+        self.max_active = max_active
+        self.active: Dict[int, Tuple[str, float]] = {}  # 占用名额的请求 -> (客户端, 开始显示的时间)
+        # 有请求在等待的客户端按轮转顺序排列，每个客户端一个先进先出队列
+        self.waiting: "OrderedDict[str, Deque[Tuple[asyncio.Future, float]]]" = OrderedDict()
+        self.granted = 0
+        # 已经分配给等待者、但对应的任务还没有恢复运行的名额；分配时就占用，
+        # 否则一次释放会唤醒所有等待者，恢复前到来的新请求也会被放行
+        self.reserved = 0
+
+    def _has_room(self) -> bool:
+        return self.max_active <= 0 or len(self.active) + self.reserved < self.max_active
+
+    def _grant_next(self):
+        while self.waiting and self._has_room():
+            client, queue = next(iter(self.waiting.items()))
+            future, _ = queue.popleft()
+            # 该客户端排到轮转队尾，没有剩余请求时移出
+            del self.waiting[client]
+            if queue:
+                self.waiting[client] = queue
+            if not future.done():
+                self.reserved += 1
+                future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, client: str) -> AsyncIterator[None]:
+        """等待轮到该客户端，退出时释放名额（包括被取消的情况）"""
+        key = id(asyncio.current_task())
+        if self.waiting or not self._has_room():
+            future = asyncio.get_running_loop().create_future()
+            self.waiting.setdefault(client, deque()).append((future, time.time()))
+            try:
+                await future
+            except asyncio.CancelledError:
+                self._withdraw(client, future)
+                raise
+            self.reserved -= 1
+        self.active[key] = (client, time.time())
+        self.granted += 1
+        try:
+            yield
+        finally:
+            self.active.pop(key, None)
+            self._grant_next()
+
+    def _withdraw(self, client: str, future: asyncio.Future):
+        queue = self.waiting.get(client)
+        if queue is not None:
+            for item in queue:
+                if item[0] is future:
+                    queue.remove(item)
+                    break
+            if not queue:
+                del self.waiting[client]
+        if future.done() and not future.cancelled():
+            # 名额已经分配给了这个请求，转给下一个
+            self.reserved -= 1
+            self._grant_next()
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "max_active": self.max_active,
+            "granted": self.granted,
+            "active": [{"client": client, "shown_seconds": round(now - since, 1)} for client, since in self.active.values()],
+            "waiting": {
+                client: [round(now - queued, 1) for _, queued in queue]
+                for client, queue in self.waiting.items()
+            },
+        }
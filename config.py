@@ -0,0 +1,118 @@
+# 运行时配置，统一从环境变量读取（可在MCP客户端配置的 env 中设置）
+import os
+
+_SIZE_UNITS = {"": 1, "B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4}
+
+
+def parse_size(value: str) -> int:
+    """解析 "500MB"、"2GB"、"1048576" 这类大小写法，返回字节数"""
+    text = value.strip().upper().replace(" ", "")
+    number = text.rstrip("KMGTB")
+    unit = text[len(number):]
+    if unit and not unit.endswith("B"):
+        unit += "B"
+    if unit not in _SIZE_UNITS:
+        raise ValueError(f"无法识别的大小单位: {value}")
+    return int(float(number) * _SIZE_UNITS[unit])
+
+
+def env_str(name: str, default: str) -> str:
+    return os.environ.get(name, default)
+
+
+def env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ[name])
+    except (KeyError, ValueError):
+        return default
+
+
+def env_size(name: str, default: str) -> int:
+    try:
+        return parse_size(os.environ.get(name, default))
+    except ValueError:
+        return parse_size(default)
+
+
+# 剪贴板图片等临时文件所在目录（界面进程与服务端共用）
+TEMP_DIR = os.path.join(os.path.expanduser("~"), ".interactive_feedback_temp")
+# 附件库目录，以及记录新建文件的回收日志（界面进程创建临时文件时也会写入）
+ATTACHMENTS_DIR = env_str(
+    "INTERACTIVE_FEEDBACK_ATTACHMENTS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "attachments"),
+)
+GC_JOURNAL = os.path.join(ATTACHMENTS_DIR, "gc_journal.jsonl")
+
+# 附件库与临时目录的垃圾回收
+# 超过最长保留时间（按最后访问时间）的条目会被删除
+GC_MAX_AGE_DAYS = env_float("INTERACTIVE_FEEDBACK_GC_MAX_AGE_DAYS", 7)
+# 总占用超过上限时按最近最少使用的顺序淘汰
+GC_MAX_SIZE = env_size("INTERACTIVE_FEEDBACK_GC_MAX_SIZE", "2GB")
+# 两次回收步骤之间的间隔（多个服务端进程之间共享），每一步只处理有限数量的条目
+GC_INTERVAL_SECONDS = env_float("INTERACTIVE_FEEDBACK_GC_INTERVAL", 60)
+GC_BATCH_SIZE = int(env_float("INTERACTIVE_FEEDBACK_GC_BATCH_SIZE", 200))
+# 服务端开始处理请求后延迟多久才启动回收，避免与握手争抢资源
+GC_STARTUP_DELAY_SECONDS = env_float("INTERACTIVE_FEEDBACK_GC_STARTUP_DELAY", 30)
+
+# 返回给模型的图片：最大边长、编码格式（jpeg/webp/png）、质量（1-100），以及单次反馈所有图片的总字节预算
+IMAGE_MAX_DIMENSION = int(env_float("INTERACTIVE_FEEDBACK_IMAGE_MAX_DIMENSION", 1568))
+IMAGE_FORMAT = env_str("INTERACTIVE_FEEDBACK_IMAGE_FORMAT", "jpeg").lower()
+IMAGE_QUALITY = int(env_float("INTERACTIVE_FEEDBACK_IMAGE_QUALITY", 85))
+IMAGE_BUDGET = env_size("INTERACTIVE_FEEDBACK_IMAGE_BUDGET", "1MB")
+# 关闭后图片也只以 attachment:// 资源的形式返回，由客户端按需读取
+INLINE_IMAGES = env_str("INTERACTIVE_FEEDBACK_INLINE_IMAGES", "1").lower() not in ("0", "false", "no", "off")
+
+# 界面进程的运行方式：daemon 复用一个常驻进程，spawn 每次调用都启动新进程
+UI_MODE = env_str("INTERACTIVE_FEEDBACK_UI_MODE", "daemon").lower()
+
+# MCP 传输方式：stdio 由每个客户端各自启动一个服务端进程；streamable-http / sse 以常驻服务运行，
+# 多个客户端共用一个服务端进程和一个界面进程（命令行参数 --transport/--host/--port 优先）
+TRANSPORT = env_str("INTERACTIVE_FEEDBACK_TRANSPORT", "stdio").lower()
+HTTP_HOST = env_str("INTERACTIVE_FEEDBACK_HOST", "127.0.0.1")
+HTTP_PORT = int(env_float("INTERACTIVE_FEEDBACK_PORT", 8765))
+# 同时交给界面的请求数上限，超出的请求按客户端轮流排队（0 表示不限制）；
+# 未设置时只有 spawn 模式的 HTTP 传输一次只弹出一个窗口，常驻界面进程自己在同一个窗口中排队
+MAX_WINDOWS = int(env_float("INTERACTIVE_FEEDBACK_MAX_WINDOWS", -1))
+
+# 性能测试用：打点日志路径，以及自动应答配置（JSON字符串或JSON文件路径），
+# 设置后界面在首次绘制后自动填写并提交，无需人工操作
+TIMING_LOG = env_str("INTERACTIVE_FEEDBACK_TIMING_LOG", "")
+AUTO_RESPOND = env_str("INTERACTIVE_FEEDBACK_AUTO_RESPOND", "")
+
+# 脚本化应答：设置为规则文件(.json)或回放日志(.jsonl)后，服务端不再启动界面，直接按脚本应答；
+# RECORD_LOG 用于把每轮真实反馈记录成回放日志
+RESPONDER = env_str("INTERACTIVE_FEEDBACK_RESPONDER", "")
+RECORD_LOG = env_str("INTERACTIVE_FEEDBACK_RECORD_LOG", "")
+
+# 每轮反馈各阶段耗时的可选输出：JSONL 文件（每轮一行）和 Prometheus textfile（路径中的 {pid} 会替换为进程号）
+METRICS_JSONL = env_str("INTERACTIVE_FEEDBACK_METRICS_JSONL", "")
+METRICS_TEXTFILE = env_str("INTERACTIVE_FEEDBACK_METRICS_TEXTFILE", "")
+
+# 自动应答缓存文件（设为空字符串关闭），以及界面上"总是这样回答"记住的回答的有效期（秒，不大于0表示永不过期）
+ANSWER_CACHE = env_str(
+    "INTERACTIVE_FEEDBACK_ANSWER_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "answer_cache.json"),
+)
+ANSWER_CACHE_TTL_SECONDS = env_float("INTERACTIVE_FEEDBACK_ANSWER_CACHE_TTL", 7 * 86400)
+
+# 反馈历史数据库（SQLite，设为空字符串关闭）：记录每轮的提示、回答和附件清单，供界面的历史面板和
+# search_feedback_history 工具检索
+HISTORY_DB = env_str(
+    "INTERACTIVE_FEEDBACK_HISTORY_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.sqlite3"),
+)
+
+# 默认的等待时限（秒，不大于0表示不限时，可被工具参数 timeout_seconds 覆盖）和超时后返回的默认回答
+TIMEOUT_SECONDS = env_float("INTERACTIVE_FEEDBACK_TIMEOUT", 0)
+TIMEOUT_ANSWER = env_str("INTERACTIVE_FEEDBACK_TIMEOUT_ANSWER", "用户未在限定时间内回复，请根据已有信息自行判断如何继续。")
+
+
+def image_options() -> dict:
+    """下发给界面进程的图片编码配置"""
+    return {
+        "max_dimension": IMAGE_MAX_DIMENSION,
+        "format": IMAGE_FORMAT,
+        "quality": IMAGE_QUALITY,
+        "budget_bytes": IMAGE_BUDGET,
+        "inline": INLINE_IMAGES,
+    }
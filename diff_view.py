@@ -0,0 +1,394 @@
+# 反馈窗口中的补丁查看器：统一/并排两种视图，每块可以折叠、接受或拒绝
+# 行数据不预先展开：模型只保存每个文件和块在列表中的起始行，取数据时二分查找；
+# 并排视图的左右配对在某块第一次显示时才计算并缓存。列表用单列的 QTableView 显示：
+# 固定行高时表头不需要逐行布局（QListView 即使行高统一也会逐行取索引），只绘制可见的行，
+# 上万行的补丁也能立即打开。
+import bisect
+from typing import Any, Dict, List, Optional, Tuple
+
+from PySide6.QtWidgets import (
+    QApplication, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QButtonGroup,
+    QTableView, QHeaderView, QStyledItemDelegate, QAbstractItemView, QFrame
+)
+from PySide6.QtCore import Qt, Signal, QAbstractListModel, QModelIndex, QRect, QSize, QEvent
+from PySide6.QtGui import QColor, QFont, QFontDatabase, QFontMetrics
+
+from unified_diff import ACCEPTED, REJECTED, UNDECIDED, DiffFile, DiffLine, Hunk, parse_diff
+
+# 列表中的行类型
+FILE_ROW = 0
+HUNK_ROW = 1
+LINE_ROW = 2
+
+# 补丁区域最多占屏幕可用高度的比例
+MAX_HEIGHT_RATIO = 0.5
+
+_LINE_BACKGROUND = {"+": QColor("#1e3a24"), "-": QColor("#45232a")}
+_LINE_FOREGROUND = {"+": QColor("#b5e8b0"), "-": QColor("#f2b8b5"), " ": QColor("#d4d4d4"), "\\": QColor("#8a8a8a")}
+_DECISION_COLOR = {ACCEPTED: QColor("#2e7d32"), REJECTED: QColor("#b3261e")}
+
+
+def pair_lines(hunk: Hunk) -> List[Tuple[Optional[DiffLine], Optional[DiffLine]]]:
+    """并排视图的行：连续的删除和新增逐行对齐，上下文两侧相同"""
+    rows: List[Tuple[Optional[DiffLine], Optional[DiffLine]]] = []
+    removed: List[DiffLine] = []
+    added: List[DiffLine] = []
+
+    def flush():
+        for i in range(max(len(removed), len(added))):
+            rows.append((removed[i] if i < len(removed) else None, added[i] if i < len(added) else None))
+        removed.clear()
+        added.clear()
+
+    for line in hunk.lines:
+        if line.kind == "-":
+            if added:
+                flush()
+            removed.append(line)
+        elif line.kind == "+":
+            added.append(line)
+        else:
+            flush()
+            rows.append((line, line))
+    flush()
+    return rows
+
+
+class DiffModel(QAbstractListModel):
+    """补丁的行模型；_starts[i] 是第 i 段（文件头或块）在列表中的起始行"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.files: List[DiffFile] = []
+        self.segments: List[Tuple[int, DiffFile, Optional[Hunk], int]] = []  # (类型, 文件, 块, 块序号)
+        self.hunks: List[Hunk] = []
+        self._hunk_segments: List[int] = []  # 每块在 segments 中的位置
+        self.decisions: List[str] = []
+        self.collapsed: List[bool] = []
+        self.split = False
+        self._pairs: Dict[int, List[Tuple[Optional[DiffLine], Optional[DiffLine]]]] = {}
+        self._starts: List[int] = []
+        self._rows = 0
+
+    def set_files(self, files: List[DiffFile]):
+        self.beginResetModel()
+        self.files = files
+        self.segments = []
+        self.hunks = []
+        self._hunk_segments = []
+        for file in files:
+            self.segments.append((FILE_ROW, file, None, -1))
+            for hunk in file.hunks:
+                self._hunk_segments.append(len(self.segments))
+                self.segments.append((HUNK_ROW, file, hunk, len(self.hunks)))
+                self.hunks.append(hunk)
+        self.decisions = [UNDECIDED] * len(self.hunks)
+        self.collapsed = [False] * len(self.hunks)
+        self._pairs.clear()
+        self._relayout()
+        self.endResetModel()
+
+    def _hunk_rows(self, number: int) -> int:
+        if self.collapsed[number]:
+            return 0
+        return len(self._pairs_of(number)) if self.split else len(self.hunks[number].lines)
+
+    def _pairs_of(self, number: int):
+        pairs = self._pairs.get(number)
+        if pairs is None:
+            pairs = self._pairs[number] = pair_lines(self.hunks[number])
+        return pairs
+
+    def _relayout(self):
+        """重新计算各段的起始行，只遍历文件和块，不遍历补丁中的行"""
+        self._starts = []
+        row = 0
+        for kind, _, _, number in self.segments:
+            self._starts.append(row)
+            row += 1 if kind == FILE_ROW else 1 + self._hunk_rows(number)
+        self._rows = row
+
+    def _reset(self):
+        self.beginResetModel()
+        self._relayout()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._rows
+
+    def row_at(self, row: int) -> Tuple[int, DiffFile, Optional[Hunk], int, Any]:
+        """返回 (类型, 文件, 块, 块序号, 行)；统一视图的行为 DiffLine，并排视图为 (左, 右)"""
+        segment = bisect.bisect_right(self._starts, row) - 1
+        kind, file, hunk, number = self.segments[segment]
+        offset = row - self._starts[segment]
+        if offset == 0:
+            return kind, file, hunk, number, None
+        line = self._pairs_of(number)[offset - 1] if self.split else hunk.lines[offset - 1]
+        return LINE_ROW, file, hunk, number, line
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= self._rows:
+            return None
+        if role == Qt.ToolTipRole:
+            kind, file, hunk, _, line = self.row_at(index.row())
+            if kind == FILE_ROW:
+                return "\n".join([file.path, *file.meta])
+            if kind == LINE_ROW:
+                lines = [part for part in line if part is not None] if self.split else [line]
+                return "\n".join(dict.fromkeys(part.text for part in lines))
+        return None
+
+    def set_split(self, split: bool):
+        if split != self.split:
+            self.split = split
+            self._reset()
+
+    def toggle_collapsed(self, number: int):
+        self.collapsed[number] = not self.collapsed[number]
+        self._reset()
+
+    def set_all_collapsed(self, collapsed: bool):
+        self.collapsed = [collapsed] * len(self.hunks)
+        self._reset()
+
+    def set_decision(self, number: int, decision: str):
+        self.decisions[number] = decision
+        # 块内的行按决定淡化，整块一起刷新
+        first = self._starts[self._hunk_segments[number]]
+        last = first + self._hunk_rows(number)
+        self.dataChanged.emit(self.index(first), self.index(last))
+
+    def set_all_decisions(self, decision: str):
+        self.decisions = [decision] * len(self.hunks)
+        if self._rows:
+            self.dataChanged.emit(self.index(0), self.index(self._rows - 1))
+
+
+class DiffDelegate(QStyledItemDelegate):
+    """绘制文件头、块头（折叠箭头、接受/拒绝按钮）和补丁行，所有行等高"""
+
+    decision_clicked = Signal(int, str)
+    collapse_clicked = Signal(int)
+
+    PADDING = 6
+    BUTTON_WIDTH = 48
+
+    def __init__(self, font: QFont, parent=None):
+        super().__init__(parent)
+        self.font = font
+        self.metrics = QFontMetrics(font)
+        self.row_height = self.metrics.height() + 4
+        self.number_width = self.metrics.horizontalAdvance("00000") + self.PADDING
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), self.row_height)
+
+    def _button_rects(self, rect: QRect) -> Dict[str, QRect]:
+        reject = QRect(rect.right() - self.PADDING - self.BUTTON_WIDTH, rect.top() + 2, self.BUTTON_WIDTH, rect.height() - 4)
+        accept = reject.translated(-self.BUTTON_WIDTH - self.PADDING, 0)
+        return {ACCEPTED: accept, REJECTED: reject}
+
+    def paint(self, painter, option, index):
+        model = index.model()
+        kind, file, hunk, number, line = model.row_at(index.row())
+        rect = option.rect
+        painter.save()
+        painter.setFont(self.font)
+        if kind == FILE_ROW:
+            painter.fillRect(rect, QColor("#3a3a3e"))
+            stats = f"+{file.added} −{file.removed}"
+            stats_width = self.metrics.horizontalAdvance(stats) + 2 * self.PADDING
+            text_rect = rect.adjusted(self.PADDING, 0, -stats_width, 0)
+            bold = QFont(self.font)
+            bold.setBold(True)
+            painter.setFont(bold)
+            painter.setPen(QColor("#e1e1e1"))
+            painter.drawText(text_rect, Qt.AlignLeft | Qt.AlignVCenter,
+                             QFontMetrics(bold).elidedText(file.path, Qt.ElideMiddle, text_rect.width()))
+            painter.setFont(self.font)
+            painter.setPen(QColor("#9a9a9a"))
+            painter.drawText(rect.adjusted(0, 0, -self.PADDING, 0), Qt.AlignRight | Qt.AlignVCenter, stats)
+        elif kind == HUNK_ROW:
+            decision = model.decisions[number]
+            painter.fillRect(rect, QColor("#2b3442"))
+            buttons = self._button_rects(rect)
+            arrow = "▸" if model.collapsed[number] else "▾"
+            text_rect = rect.adjusted(self.PADDING, 0, -(2 * self.BUTTON_WIDTH + 3 * self.PADDING), 0)
+            painter.setPen(QColor("#9cdcfe"))
+            painter.drawText(text_rect, Qt.AlignLeft | Qt.AlignVCenter,
+                             self.metrics.elidedText(f"{arrow} {hunk.header}", Qt.ElideRight, text_rect.width()))
+            for value, label in ((ACCEPTED, "接受"), (REJECTED, "拒绝")):
+                button = buttons[value]
+                painter.setPen(Qt.NoPen)
+                painter.setBrush(_DECISION_COLOR[value] if decision == value else QColor("#444"))
+                painter.drawRoundedRect(button, 3, 3)
+                painter.setPen(QColor("#ffffff" if decision == value else "#c8c8c8"))
+                painter.drawText(button, Qt.AlignCenter, label)
+        else:
+            rejected = model.decisions[number] == REJECTED
+            if rejected:
+                # 被拒绝的块淡化显示
+                painter.setOpacity(0.45)
+            if model.split:
+                half = rect.width() // 2
+                self._paint_line(painter, QRect(rect.left(), rect.top(), half, rect.height()), line[0], "old")
+                self._paint_line(painter, QRect(rect.left() + half, rect.top(), rect.width() - half, rect.height()), line[1], "new")
+                painter.setPen(QColor("#555"))
+                painter.drawLine(rect.left() + half, rect.top(), rect.left() + half, rect.bottom())
+            else:
+                self._paint_line(painter, rect, line, "both")
+        painter.restore()
+
+    def _paint_line(self, painter, rect: QRect, line: Optional[DiffLine], side: str):
+        if line is None:
+            painter.fillRect(rect, QColor("#262629"))
+            return
+        background = _LINE_BACKGROUND.get(line.kind)
+        if background is not None:
+            painter.fillRect(rect, background)
+        painter.setPen(QColor("#7a7a7a"))
+        x = rect.left()
+        numbers = {"old": (line.old_no,), "new": (line.new_no,), "both": (line.old_no, line.new_no)}[side]
+        for number in numbers:
+            painter.drawText(QRect(x, rect.top(), self.number_width - self.PADDING, rect.height()),
+                             Qt.AlignRight | Qt.AlignVCenter, "" if number is None else str(number))
+            x += self.number_width
+        sign = line.kind if line.kind in "+-" and side == "both" else ""
+        text = f"{sign or ' '} {line.text}" if line.kind != "\\" else f"\\ {line.text}"
+        painter.setPen(_LINE_FOREGROUND.get(line.kind, _LINE_FOREGROUND[" "]))
+        text_rect = QRect(x, rect.top(), rect.right() - x - self.PADDING, rect.height())
+        painter.drawText(text_rect, Qt.AlignLeft | Qt.AlignVCenter,
+                         self.metrics.elidedText(text.expandtabs(4), Qt.ElideRight, text_rect.width()))
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            kind, _, _, number, _ = model.row_at(index.row())
+            if kind == HUNK_ROW:
+                position = event.position().toPoint()
+                for value, rect in self._button_rects(option.rect).items():
+                    if rect.contains(position):
+                        # 再次点击已选中的按钮取消决定
+                        self.decision_clicked.emit(number, UNDECIDED if model.decisions[number] == value else value)
+                        return True
+                self.collapse_clicked.emit(number)
+                return True
+        return super().editorEvent(event, model, option, index)
+
+
+class DiffView(QFrame):
+    """补丁查看器：工具栏（统计、视图切换、全部接受/拒绝、全部折叠）和补丁列表"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setObjectName("diffView")
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(6)
+
+        toolbar = QHBoxLayout()
+        toolbar.setSpacing(6)
+        self.summary_label = QLabel()
+        self.summary_label.setObjectName("diffSummary")
+        toolbar.addWidget(self.summary_label, 1)
+        self.unified_button = QPushButton("统一")
+        self.split_button = QPushButton("并排")
+        mode_group = QButtonGroup(self)
+        for button in (self.unified_button, self.split_button):
+            button.setCheckable(True)
+            button.setObjectName("diffToolButton")
+            mode_group.addButton(button)
+            toolbar.addWidget(button)
+        self.unified_button.setChecked(True)
+        self.split_button.toggled.connect(self._set_split)
+        self.collapse_button = QPushButton("全部折叠")
+        accept_button = QPushButton("全部接受")
+        reject_button = QPushButton("全部拒绝")
+        for button in (self.collapse_button, accept_button, reject_button):
+            button.setObjectName("diffToolButton")
+            toolbar.addWidget(button)
+        self.collapse_button.clicked.connect(self._toggle_all_collapsed)
+        accept_button.clicked.connect(self._accept_all)
+        reject_button.clicked.connect(self._reject_all)
+        layout.addLayout(toolbar)
+
+        font = QFontDatabase.systemFont(QFontDatabase.FixedFont)
+        font.setPointSizeF(max(self.font().pointSizeF() - 1, 8))
+        self.model = DiffModel(self)
+        self.delegate = DiffDelegate(font, self)
+        self.delegate.decision_clicked.connect(self.model.set_decision)
+        self.delegate.collapse_clicked.connect(self._toggle_collapsed)
+        self.lines_view = QTableView()
+        self.lines_view.setObjectName("diffList")
+        self.lines_view.setModel(self.model)
+        self.lines_view.setItemDelegate(self.delegate)
+        self.lines_view.horizontalHeader().hide()
+        self.lines_view.horizontalHeader().setStretchLastSection(True)
+        self.lines_view.verticalHeader().hide()
+        # 固定行高，视图不必逐行询问高度
+        self.lines_view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.lines_view.verticalHeader().setMinimumSectionSize(self.delegate.row_height)
+        self.lines_view.verticalHeader().setDefaultSectionSize(self.delegate.row_height)
+        self.lines_view.setShowGrid(False)
+        self.lines_view.setSelectionMode(QAbstractItemView.NoSelection)
+        self.lines_view.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.lines_view.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.lines_view.setMouseTracking(True)
+        layout.addWidget(self.lines_view)
+
+    def set_diff(self, diff: Optional[str]):
+        """显示补丁；为空或无法解析时隐藏整个查看器"""
+        files = parse_diff(diff) if diff else []
+        self.model.set_files(files)
+        self.split_button.setChecked(False)
+        self.collapse_button.setText("全部折叠")
+        self.lines_view.scrollToTop()
+        hunks = len(self.model.hunks)
+        self.summary_label.setText(
+            f"{len(files)} 个文件，{hunks} 处修改（+{sum(f.added for f in files)} −{sum(f.removed for f in files)}）"
+        )
+        self.setVisible(bool(hunks))
+        self._update_height()
+
+    def has_diff(self) -> bool:
+        return bool(self.model.hunks)
+
+    def decisions(self) -> List[str]:
+        """按块的顺序返回每块的决定（accepted / rejected / undecided）"""
+        return list(self.model.decisions)
+
+    def set_decisions(self, decisions: Any):
+        """自动应答用：单个字符串对所有块生效，列表按块的顺序"""
+        if isinstance(decisions, str):
+            self.model.set_all_decisions(decisions)
+        elif isinstance(decisions, list):
+            for number, decision in enumerate(decisions[:len(self.model.hunks)]):
+                self.model.decisions[number] = decision
+            self.lines_view.viewport().update()
+
+    def _accept_all(self):
+        self.model.set_all_decisions(ACCEPTED)
+
+    def _reject_all(self):
+        self.model.set_all_decisions(REJECTED)
+
+    def _set_split(self, split: bool):
+        self.model.set_split(split)
+        self._update_height()
+
+    def _toggle_collapsed(self, number: int):
+        self.model.toggle_collapsed(number)
+        self._update_height()
+
+    def _toggle_all_collapsed(self):
+        collapse = not all(self.model.collapsed)
+        self.model.set_all_collapsed(collapse)
+        self.collapse_button.setText("全部展开" if collapse else "全部折叠")
+        self._update_height()
+
+    def _update_height(self):
+        """列表高度随行数增长，超过屏幕可用高度的一半后在列表内滚动"""
+        screen = QApplication.primaryScreen()
+        cap = int(screen.availableGeometry().height() * MAX_HEIGHT_RATIO) if screen else 400
+        rows = self.model.rowCount()
+        height = min(rows * self.delegate.row_height, cap) + 2 * self.lines_view.frameWidth()
+        self.lines_view.setFixedHeight(max(height, self.delegate.row_height))
@@ -7,22 +7,40 @@ import sys
 import json
 import argparse
 import base64
+import time
 import uuid
+import zlib
+import struct
+from collections import OrderedDict
 from pathlib import Path
 from typing import Optional, TypedDict, List, Dict, Any
 
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QLabel, QLineEdit, QPushButton, QCheckBox, QTextEdit, QGroupBox,
+    QLabel, QLineEdit, QPushButton, QCheckBox, QRadioButton, QButtonGroup, QTextEdit, QGroupBox,
     QFrame, QScrollArea, QGraphicsDropShadowEffect, QSizePolicy,
-    QFileDialog, QListWidget, QListWidgetItem, QMenu, QToolButton
+    QFileDialog, QListView, QListWidget, QListWidgetItem, QStackedWidget, QStyledItemDelegate, QStyle, QMenu, QToolButton
 )
-from PySide6.QtCore import Qt, Signal, QObject, QTimer, QSettings, QPoint, QRect, QEvent, QMimeData, QByteArray, QBuffer, QIODevice
-from PySide6.QtGui import QTextCursor, QIcon, QKeyEvent, QPalette, QColor, QFont, QFontDatabase, QPainter, QPen, QPainterPath, QMouseEvent, QPixmap, QImage, QClipboard, QDrag
+from PySide6.QtCore import Qt, Signal, QObject, QAbstractListModel, QModelIndex, QThread, QThreadPool, QRunnable, QSize, QTimer, QSettings, QPoint, QRect, QEvent, QMimeData, QByteArray, QBuffer, QIODevice
+from PySide6.QtGui import QTextCursor, QIcon, QKeyEvent, QPalette, QColor, QFont, QFontDatabase, QFontMetrics, QPainter, QPen, QPainterPath, QMouseEvent, QPixmap, QImage, QImageReader, QImageWriter, QImageIOHandler, QClipboard, QDrag
 
-class FeedbackResult(TypedDict):
+import ipc
+import config
+import timing
+from responder import IMAGE_EXTENSIONS, ScriptedResponder, compose_feedback, serve as serve_scripted
+from storage_gc import record_temp_file
+from prompt_view import PromptView
+from diff_view import DiffView
+
+class FeedbackResult(TypedDict, total=False):
     interactive_feedback: str
     attachments: Optional[List[Dict[str, Any]]]
+    # 用户点击了"总是这样回答"，服务端记住本次回答
+    remember: bool
+    # 批量提问时每个问题的回答，顺序与请求中的 questions 一致
+    answers: List[Dict[str, Any]]
+    # 请求带有补丁时每块的决定（accepted/rejected/undecided），按块的顺序
+    hunks: List[str]
 
 def get_dark_mode_palette(app: QApplication):
     darkPalette = app.palette()
@@ -50,18 +68,284 @@ def get_dark_mode_palette(app: QApplication):
     darkPalette.setColor(QPalette.PlaceholderText, QColor(150, 150, 150))
     return darkPalette
 
+# 应用级样式表：控件通过 objectName 区分，不在各个控件上单独调用 setStyleSheet
+APP_STYLESHEET = """
+QMainWindow {
+    background: transparent;
+}
+QWidget#centralWidget, QWidget#contentWrapper, QWidget#contentWidget {
+    border: none;
+    background-color: transparent;
+}
+QGroupBox {
+    border: 1px solid #444;
+    border-radius: 6px;
+    margin-top: 12px;
+    font-weight: bold;
+    padding: 10px;
+}
+QGroupBox::title {
+    subcontrol-origin: margin;
+    subcontrol-position: top left;
+    left: 10px;
+    padding: 0 5px;
+    color: #e1e1e1;
+}
+QLabel {
+    color: #e1e1e1;
+    font-size: 13px;
+}
+QLabel#windowTitle {
+    font-size: 18px;
+    font-weight: bold;
+    color: #ffffff;
+    margin-bottom: 0px;
+}
+QListWidget#queueList {
+    background-color: #252526;
+    border: 1px solid #3f3f46;
+    border-radius: 4px;
+    color: #e1e1e1;
+    outline: none;
+}
+QListWidget#queueList::item {
+    padding: 6px;
+    border-bottom: 1px solid #333337;
+}
+QListWidget#queueList::item:selected {
+    background-color: #094771;
+}
+QLabel#queueTitle {
+    font-weight: bold;
+}
+QLabel#countdownLabel {
+    color: #f0ad4e;
+}
+QLabel#clientLabel {
+    color: #9a9a9a;
+    font-size: 12px;
+}
+#promptView {
+    background: transparent;
+}
+QLabel#attachmentsTitle {
+    font-weight: bold;
+}
+QPushButton {
+    background-color: #0078d7;
+    color: white;
+    border: none;
+    border-radius: 4px;
+    padding: 8px 16px;
+    font-weight: bold;
+}
+QPushButton:hover {
+    background-color: #1a88e1;
+}
+QPushButton:pressed {
+    background-color: #0067b8;
+}
+QPushButton#resolvedButton {
+    background-color: #28a745;
+}
+QPushButton#resolvedButton:hover {
+    background-color: #34b754;
+}
+QPushButton#resolvedButton:pressed {
+    background-color: #218838;
+}
+QPushButton#rememberButton {
+    background-color: #3a3a3a;
+    border: 1px solid #555;
+}
+QPushButton#rememberButton:hover {
+    background-color: #454545;
+}
+QPushButton#rememberButton:pressed {
+    background-color: #303030;
+}
+QPushButton#historyButton {
+    background-color: transparent;
+    color: #9a9a9a;
+    border: none;
+    padding: 2px 6px;
+}
+QPushButton#historyButton:hover {
+    color: #e1e1e1;
+}
+QPushButton#historyButton:checked {
+    color: #4ea1f3;
+}
+QFrame#historyPanel {
+    border: 1px solid #3a3a3a;
+    border-radius: 6px;
+}
+QLineEdit#historySearch {
+    border: 1px solid #555;
+    border-radius: 4px;
+    padding: 4px 6px;
+    background-color: #2d2d30;
+    color: #e1e1e1;
+}
+QListWidget#historyList {
+    background-color: #1e1e1e;
+    border: 1px solid #3f3f46;
+    color: #e1e1e1;
+}
+QListWidget#historyList::item {
+    padding: 4px;
+    border-bottom: 1px solid #333337;
+}
+QListWidget#historyList::item:selected {
+    background-color: #094771;
+}
+QLabel#historyStatus {
+    color: #9a9a9a;
+}
+QPushButton#diffToolButton {
+    background-color: #3a3a3a;
+    border: 1px solid #555;
+    padding: 3px 10px;
+    font-weight: normal;
+}
+QPushButton#diffToolButton:hover {
+    background-color: #454545;
+}
+QPushButton#diffToolButton:checked {
+    background-color: #0078d7;
+    border-color: #0078d7;
+}
+QTableView#diffList {
+    background-color: #1e1e1e;
+    border: 1px solid #3f3f46;
+    border-radius: 4px;
+}
+QLabel#diffSummary {
+    color: #9a9a9a;
+    font-size: 12px;
+}
+QToolButton#uploadButton {
+    background-color: #2d2d30;
+    color: #e1e1e1;
+    border: 1px solid #555;
+    border-radius: 3px;
+    padding: 3px 10px;
+}
+QToolButton#uploadButton:hover {
+    background-color: #3e3e42;
+}
+QToolButton#uploadButton::menu-indicator {
+    image: none;
+}
+QMenu {
+    background-color: #252526;
+    color: #e1e1e1;
+    border: 1px solid #555;
+}
+QMenu::item {
+    padding: 5px 20px;
+}
+QMenu::item:selected {
+    background-color: #3e3e42;
+}
+QCheckBox {
+    color: #e1e1e1;
+    padding: 5px;
+}
+QCheckBox::indicator {
+    width: 18px;
+    height: 18px;
+    border: 1px solid #777;
+    background-color: #3a3a3e;
+    border-radius: 3px;
+}
+QCheckBox::indicator:unchecked {
+    background-color: #3a3a3e;
+}
+QCheckBox::indicator:checked {
+    background-color: #0078d7;
+}
+QCheckBox::indicator:hover {
+    border: 1px solid #999;
+}
+QRadioButton {
+    color: #e1e1e1;
+    padding: 5px;
+}
+QRadioButton::indicator {
+    width: 16px;
+    height: 16px;
+    border: 1px solid #777;
+    background-color: #3a3a3e;
+    border-radius: 9px;
+}
+QRadioButton::indicator:checked {
+    background-color: #0078d7;
+}
+QRadioButton::indicator:hover {
+    border: 1px solid #999;
+}
+QFrame#questionSection {
+    border: 1px solid #3a3a3a;
+    border-radius: 6px;
+    padding: 6px;
+}
+QLabel#questionTitle {
+    font-weight: bold;
+}
+QFrame[frameShape="4"] { /* HLine */
+    color: #555;
+    margin: 5px 0;
+}
+QFrame#sectionSeparator {
+    color: #3a3a3a;
+    background-color: #3a3a3a;
+    border: none;
+    height: 1px;
+    margin: 0px 0;
+}
+QTextEdit#feedbackText {
+    border: 1px solid #555;
+    border-radius: 5px;
+    padding: 8px;
+    background-color: #2d2d30;
+    color: #e1e1e1;
+}
+QScrollArea {
+    background-color: transparent;
+    border: none;
+}
+QScrollBar:vertical {
+    background: #2d2d30;
+    width: 10px;
+    margin: 0px;
+}
+QScrollBar::handle:vertical {
+    background: #666;
+    min-height: 20px;
+    border-radius: 5px;
+}
+QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical {
+    height: 0px;
+}
+QListView#attachmentsList {
+    background-color: #1e1e1e;
+    border: 1px solid #444;
+    border-radius: 4px;
+}
+QListView#attachmentsList::item {
+    padding: 5px;
+    border-bottom: 1px solid #333;
+}
+QListView#attachmentsList::item:selected {
+    background-color: #0078d7;
+}
+"""
+
 class FeedbackTextEdit(QTextEdit):
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.setStyleSheet("""
-            QTextEdit {
-                border: 1px solid #555;
-                border-radius: 5px;
-                padding: 8px;
-                background-color: #2d2d30;
-                color: #e1e1e1;
-            }
-        """)
+        self.setObjectName("feedbackText")
         self.setAcceptDrops(True)
         # 跟踪附件
         self.attachments = []
@@ -164,13 +448,491 @@ class FeedbackTextEdit(QTextEdit):
         
         super().dropEvent(event)
 
+THUMBNAIL_WIDTH = 100
+# 附件列表最多缓存的缩略图数量
+THUMBNAIL_CACHE_SIZE = 256
+# 剪贴板图片临时文件的 zlib 压缩级别，文件略大但编码快得多，仍是无损PNG
+CLIPBOARD_PNG_LEVEL = 1
+
+# 返回给模型的图片默认编码参数，服务端会在请求中下发实际配置
+DEFAULT_IMAGE_OPTIONS = {
+    "max_dimension": 1568,
+    "format": "jpeg",
+    "quality": 85,
+    "budget_bytes": 1024 * 1024,
+    "inline": True,
+}
+# 超出预算时逐步降低质量，降到下限后再缩小尺寸
+_MIN_QUALITY = 40
+_MIN_DIMENSION = 64
+
+def read_scaled_image(file_path: str, max_width: Optional[int] = None, max_dimension: Optional[int] = None) -> QImage:
+    """按目标尺寸解码图片（JPEG等格式可跳过全尺寸解码），失败时返回空图片"""
+    reader = QImageReader(file_path)
+    reader.setAutoTransform(True)
+    size = reader.size()
+    if size.isValid() and size.width() > 0 and size.height() > 0:
+        rotated = bool(reader.transformation() & QImageIOHandler.TransformationRotate90)
+        if rotated:
+            size.transpose()
+        scale = 1.0
+        if max_width:
+            scale = max_width / size.width()
+        if max_dimension:
+            scale = min(scale, max_dimension / max(size.width(), size.height()))
+        if scale < 1.0 or max_width:
+            scaled = QSize(max(1, round(size.width() * scale)), max(1, round(size.height() * scale)))
+            if rotated:
+                scaled.transpose()
+            reader.setScaledSize(scaled)
+    image = reader.read()
+    if not image.isNull() and max_width and image.width() != max_width:
+        image = image.scaledToWidth(max_width, Qt.SmoothTransformation)
+    return image
+
+def encode_image(image: QImage, image_format: str, quality: int) -> bytes:
+    """把图片编码为指定格式，JPEG不支持透明通道，先铺白色背景"""
+    if image_format == "jpeg" and image.hasAlphaChannel():
+        flattened = QImage(image.size(), QImage.Format_RGB32)
+        flattened.fill(QColor("white"))
+        painter = QPainter(flattened)
+        painter.drawImage(0, 0, image)
+        painter.end()
+        image = flattened
+    byte_array = QByteArray()
+    buffer = QBuffer(byte_array)
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, image_format.upper(), -1 if image_format == "png" else quality)
+    return byte_array.data()
+
+def encode_png_fast(image: QImage, level: int = CLIPBOARD_PNG_LEVEL) -> bytes:
+    """不做行过滤、以较低压缩级别直接用 zlib 编码PNG
+
+    Qt 自带的PNG编码无论压缩级别都要逐行做过滤，大截图需要半秒以上；
+    截图大多是大块纯色，不过滤、低级别压缩的体积也可以接受。
+    """
+    if image.hasAlphaChannel():
+        image = image.convertToFormat(QImage.Format_RGBA8888)
+        color_type, channels = 6, 4
+    else:
+        image = image.convertToFormat(QImage.Format_RGB888)
+        color_type, channels = 2, 3
+    width, height, stride = image.width(), image.height(), image.bytesPerLine()
+    bits = memoryview(image.constBits()).cast("B")
+    row_size = width * channels
+    # 每行前加一个字节的过滤类型 0（不过滤）
+    raw = b"".join(b"\0" + bits[y * stride:y * stride + row_size] for y in range(height))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw, level)) + chunk(b"IEND", b"")
+
+def fit_image_to_budget(image: QImage, image_format: str, quality: int, limit: int) -> Optional[bytes]:
+    """降低质量、缩小尺寸直到编码结果不超过 limit 字节，无法满足时返回 None"""
+    while True:
+        data = encode_image(image, image_format, quality)
+        if len(data) <= limit:
+            return data
+        if image_format != "png" and quality > _MIN_QUALITY:
+            quality = max(_MIN_QUALITY, quality - 15)
+            continue
+        if max(image.width(), image.height()) * 3 // 4 < _MIN_DIMENSION:
+            return None
+        image = image.scaled(image.width() * 3 // 4, image.height() * 3 // 4, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+class _TaskSignals(QObject):
+    finished = Signal(str)
+
+class ThumbnailTask(QRunnable):
+    """在线程池中按缩略图尺寸解码图片，仅用于界面预览"""
+
+    def __init__(self, attachment_id: str, file_path: str):
+        super().__init__()
+        # 结果由管理器在主线程中取用，不能让线程池提前释放
+        self.setAutoDelete(False)
+        self.attachment_id = attachment_id
+        self.file_path = file_path
+        self.image: Optional[QImage] = None
+        self.signals = _TaskSignals()
+
+    def run(self):
+        try:
+            image = read_scaled_image(self.file_path, max_width=THUMBNAIL_WIDTH)
+            if not image.isNull():
+                self.image = image
+        except Exception as e:
+            print(f"图片预览生成失败: {e}")
+        self.signals.finished.emit(self.attachment_id)
+
+
+class ClipboardImageTask(QRunnable):
+    """在线程池中把剪贴板图片保存为临时文件，并用内存中已解码的图片生成缩略图"""
+
+    def __init__(self, attachment_id: str, image: QImage, file_path: str):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.attachment_id = attachment_id
+        self.image = image
+        self.file_path = file_path
+        self.size: Optional[int] = None
+        self.thumbnail: Optional[QImage] = None
+        self.signals = _TaskSignals()
+
+    def run(self):
+        try:
+            data = encode_png_fast(self.image)
+            with open(self.file_path, "wb") as f:
+                f.write(data)
+            self.size = len(data)
+            record_temp_file(config.GC_JOURNAL, self.file_path)
+            self.thumbnail = self.image.scaledToWidth(THUMBNAIL_WIDTH, Qt.SmoothTransformation)
+        except Exception as e:
+            print(f"保存剪贴板图片失败: {e}")
+        # 保存完成后不再需要原图，尽早释放
+        self.image = QImage()
+        self.signals.finished.emit(self.attachment_id)
+
+
+class ImageEncodeTask(QRunnable):
+    """在线程池中按配置的最大边长解码图片并编码，生成返回给模型的图片"""
+
+    def __init__(self, attachment: Dict[str, Any], options: Dict[str, Any]):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.attachment = attachment
+        self.options = options
+        self.image: Optional[QImage] = None
+        self.data: Optional[bytes] = None
+
+    def run(self):
+        try:
+            image = read_scaled_image(self.attachment['path'], max_dimension=self.options["max_dimension"])
+            if not image.isNull():
+                self.image = image
+                self.data = encode_image(image, self.options["format"], self.options["quality"])
+        except Exception as e:
+            print(f"图片编码失败: {e}")
+
+
+def format_size(size_bytes):
+    """格式化文件大小显示"""
+    if size_bytes < 1024:
+        return f"{size_bytes} B"
+    elif size_bytes < 1024 * 1024:
+        return f"{size_bytes / 1024:.1f} KB"
+    elif size_bytes < 1024 * 1024 * 1024:
+        return f"{size_bytes / (1024 * 1024):.1f} MB"
+    else:
+        return f"{size_bytes / (1024 * 1024 * 1024):.1f} GB"
+
+
+class AttachmentListModel(QAbstractListModel):
+    """附件列表的数据模型
+
+    附件按加入顺序存放在槽位中，删除时只把槽位置空（墓碑），空槽超过一半时才整体压缩；
+    槽位与行号之间用树状数组（Fenwick）换算，删除和按行取数据都是 O(log n)，
+    从头部连续删除也不会移动整个列表。缩略图在视图绘制到该行时才请求生成，
+    最多缓存 THUMBNAIL_CACHE_SIZE 张，滚出缓存的行再次可见时重新生成。
+    """
+
+    # 某个可见的图片行还没有缩略图，需要生成
+    thumbnail_requested = Signal(str)
+    # 空槽少于这个数时不压缩
+    COMPACT_MIN_TOMBSTONES = 32
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._slots: List[Optional[Dict[str, Any]]] = []
+        self._slot_of: Dict[str, int] = {}  # 附件ID -> 槽位
+        self._tree: List[int] = [0]  # 树状数组（下标从 1 开始），记录每个槽位是否有附件
+        self._thumbnails: "OrderedDict[str, QPixmap]" = OrderedDict()
+        self._failed: set = set()
+        self._requested: set = set()
+
+    # ---- 槽位与行号的换算 ----
+
+    def _prefix(self, count: int) -> int:
+        """前 count 个槽位中的附件数"""
+        total = 0
+        while count > 0:
+            total += self._tree[count]
+            count &= count - 1
+        return total
+
+    def _add(self, slot: int, delta: int):
+        position = slot + 1
+        while position < len(self._tree):
+            self._tree[position] += delta
+            position += position & -position
+
+    def _slot_at(self, row: int) -> int:
+        """第 row 行（从 0 开始）所在的槽位"""
+        position, remaining = 0, row + 1
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            following = position + step
+            if following < len(self._tree) and self._tree[following] < remaining:
+                position = following
+                remaining -= self._tree[following]
+            step >>= 1
+        return position
+
+    def _rebuild(self, items: List[Dict[str, Any]]):
+        self._slots = list(items)
+        self._slot_of = {item['id']: slot for slot, item in enumerate(items)}
+        self._tree = [0] + [1] * len(items)
+        for position in range(1, len(self._tree)):
+            parent = position + (position & -position)
+            if parent < len(self._tree):
+                self._tree[parent] += self._tree[position]
+
+    def attachments(self) -> List[Dict[str, Any]]:
+        return [item for item in self._slots if item is not None]
+
+    # ---- Qt 模型接口 ----
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._slot_of)
+
+    def _item(self, row: int) -> Optional[Dict[str, Any]]:
+        if row < 0 or row >= len(self._slot_of):
+            return None
+        return self._slots[self._slot_at(row)]
+
+    def data(self, index, role=Qt.DisplayRole):
+        attachment = self._item(index.row()) if index.isValid() else None
+        if attachment is None:
+            return None
+        if role == Qt.DisplayRole:
+            return attachment['name']
+        if role == Qt.ToolTipRole:
+            return attachment['path']
+        return None
+
+    # 委托直接通过下面两个方法取数据，不经过 data()，避免字典和 QPixmap 反复转换成 QVariant
+    def attachment_at(self, index: QModelIndex) -> Optional[Dict[str, Any]]:
+        return self._item(index.row()) if index.isValid() else None
+
+    def thumbnail_at(self, index: QModelIndex):
+        """返回缩略图；生成中返回 None，无法生成时返回 False"""
+        attachment_id = self._item(index.row())['id']
+        pixmap = self._thumbnails.get(attachment_id)
+        if pixmap is not None:
+            self._thumbnails.move_to_end(attachment_id)
+            return pixmap
+        if attachment_id in self._failed:
+            return False
+        if attachment_id not in self._requested:
+            self._requested.add(attachment_id)
+            self.thumbnail_requested.emit(attachment_id)
+        return None
+
+    def row_of(self, attachment_id: str) -> Optional[int]:
+        slot = self._slot_of.get(attachment_id)
+        return None if slot is None else self._prefix(slot)
+
+    def get(self, attachment_id: str) -> Optional[Dict[str, Any]]:
+        slot = self._slot_of.get(attachment_id)
+        return None if slot is None else self._slots[slot]
+
+    def append(self, attachment: Dict[str, Any]):
+        row = len(self._slot_of)
+        self.beginInsertRows(QModelIndex(), row, row)
+        slot = len(self._slots)
+        self._slots.append(attachment)
+        self._slot_of[attachment['id']] = slot
+        # 新节点覆盖 (position - lowbit, position] 这一段槽位
+        position = slot + 1
+        self._tree.append(1 + self._prefix(slot) - self._prefix(position - (position & -position)))
+        self.endInsertRows()
+
+    def remove(self, attachment_id: str) -> Optional[Dict[str, Any]]:
+        slot = self._slot_of.get(attachment_id)
+        if slot is None:
+            return None
+        row = self._prefix(slot)
+        self.beginRemoveRows(QModelIndex(), row, row)
+        attachment = self._slots[slot]
+        self._slots[slot] = None
+        del self._slot_of[attachment_id]
+        self._add(slot, -1)
+        tombstones = len(self._slots) - len(self._slot_of)
+        if tombstones >= self.COMPACT_MIN_TOMBSTONES and tombstones > len(self._slot_of):
+            # 压缩不改变行号，不需要通知视图；代价均摊到之前的删除上
+            self._rebuild(self.attachments())
+        self.endRemoveRows()
+        self._forget_thumbnail(attachment_id)
+        return attachment
+
+    def clear(self):
+        self.beginResetModel()
+        self._rebuild([])
+        self._thumbnails.clear()
+        self._failed.clear()
+        self._requested.clear()
+        self.endResetModel()
+
+    def set_thumbnail(self, attachment_id: str, image: Optional[QImage]):
+        """填入生成好的缩略图（image 为 None 表示无法生成），只刷新对应的一行"""
+        row = self.row_of(attachment_id)
+        if row is None:
+            return
+        if image is None or image.isNull():
+            self._failed.add(attachment_id)
+        else:
+            self._thumbnails[attachment_id] = QPixmap.fromImage(image)
+            while len(self._thumbnails) > THUMBNAIL_CACHE_SIZE:
+                evicted, _ = self._thumbnails.popitem(last=False)
+                self._requested.discard(evicted)
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def _forget_thumbnail(self, attachment_id: str):
+        self._thumbnails.pop(attachment_id, None)
+        self._failed.discard(attachment_id)
+        self._requested.discard(attachment_id)
+
+
+class AttachmentDelegate(QStyledItemDelegate):
+    """绘制附件行（预览或文件图标、文件名、大小、删除按钮），只有可见的行才会被绘制"""
+
+    delete_requested = Signal(str)
+
+    PADDING = 10
+    SPACING = 8
+    ICON_WIDTH = 30
+    DELETE_SIZE = 24
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._hovered_delete: Optional[str] = None
+
+    def _fonts(self, option):
+        name_font = QFont(option.font)
+        name_font.setPixelSize(13)
+        name_font.setBold(True)
+        size_font = QFont(option.font)
+        size_font.setPixelSize(13)
+        return name_font, size_font
+
+    def sizeHint(self, option, index):
+        attachment = index.model().attachment_at(index)
+        name_font, size_font = self._fonts(option)
+        text_height = QFontMetrics(name_font).height() + QFontMetrics(size_font).height() + 4
+        content_height = THUMBNAIL_WIDTH if attachment['type'] == 'image' else max(text_height, self.DELETE_SIZE)
+        return QSize(option.rect.width(), content_height + 2 * self.PADDING)
+
+    def _delete_rect(self, rect: QRect) -> QRect:
+        return QRect(
+            rect.right() - self.PADDING - self.DELETE_SIZE,
+            rect.center().y() - self.DELETE_SIZE // 2,
+            self.DELETE_SIZE,
+            self.DELETE_SIZE,
+        )
+
+    def paint(self, painter, option, index):
+        attachment = index.model().attachment_at(index)
+        widget = option.widget
+        style = widget.style() if widget else QApplication.style()
+        # 背景、选中状态和分隔线沿用样式表中 ::item 的设置
+        style.drawPrimitive(QStyle.PE_PanelItemViewItem, option, painter, widget)
+
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(QColor('#e1e1e1'))
+        content = option.rect.adjusted(self.PADDING, self.PADDING, -self.PADDING, -self.PADDING)
+
+        if attachment['type'] == 'image':
+            preview_rect = QRect(content.left(), content.top(), THUMBNAIL_WIDTH, THUMBNAIL_WIDTH)
+            thumbnail = index.model().thumbnail_at(index)
+            if thumbnail:
+                scaled = thumbnail.size().scaled(preview_rect.size(), Qt.KeepAspectRatio)
+                target = QRect(0, 0, scaled.width(), scaled.height())
+                target.moveCenter(preview_rect.center())
+                painter.drawPixmap(target, thumbnail)
+            else:
+                # 生成中显示占位符，无法生成时显示文件图标
+                painter.drawText(preview_rect, Qt.AlignCenter, "⏳" if thumbnail is None else "📄")
+            text_left = preview_rect.right() + self.SPACING
+        else:
+            icon_font = QFont(option.font)
+            icon_font.setPixelSize(24)
+            painter.setFont(icon_font)
+            icon_rect = QRect(content.left(), content.top(), self.ICON_WIDTH, content.height())
+            painter.drawText(icon_rect, Qt.AlignLeft | Qt.AlignVCenter, "📄")
+            text_left = icon_rect.right() + self.SPACING
+
+        delete_rect = self._delete_rect(option.rect)
+        text_rect = QRect(text_left, content.top(), delete_rect.left() - self.SPACING - text_left, content.height())
+        name_font, size_font = self._fonts(option)
+        name_metrics = QFontMetrics(name_font)
+        painter.setFont(name_font)
+        painter.drawText(
+            QRect(text_rect.left(), text_rect.top(), text_rect.width(), name_metrics.height()),
+            Qt.AlignLeft | Qt.AlignVCenter,
+            name_metrics.elidedText(attachment['name'], Qt.ElideMiddle, text_rect.width()),
+        )
+        painter.setFont(size_font)
+        painter.drawText(
+            QRect(text_rect.left(), text_rect.top() + name_metrics.height() + 4, text_rect.width(), QFontMetrics(size_font).height()),
+            Qt.AlignLeft | Qt.AlignVCenter,
+            "保存中…" if attachment['size'] is None else f"大小: {format_size(attachment['size'])}",
+        )
+
+        # 删除按钮
+        hovered = self._hovered_delete == attachment['id']
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor('#c42b1c' if hovered else '#444'))
+        painter.drawEllipse(delete_rect)
+        delete_font = QFont(option.font)
+        delete_font.setPixelSize(14)
+        delete_font.setBold(True)
+        painter.setFont(delete_font)
+        painter.setPen(QColor('#e1e1e1'))
+        painter.drawText(delete_rect, Qt.AlignCenter, "×")
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        attachment = index.model().attachment_at(index)
+        if attachment is None:
+            return False
+        if event.type() in (QEvent.MouseMove, QEvent.MouseButtonRelease):
+            over_delete = self._delete_rect(option.rect).contains(event.position().toPoint())
+            hovered = attachment['id'] if over_delete else None
+            if hovered != self._hovered_delete:
+                self._hovered_delete = hovered
+                if option.widget:
+                    option.widget.viewport().update()
+            if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton and over_delete:
+                self.delete_requested.emit(attachment['id'])
+                return True
+        return super().editorEvent(event, model, option, index)
+
+    def clear_hover(self):
+        self._hovered_delete = None
+
+
 class AttachmentsManager(QWidget):
     """附件管理器组件，显示和管理上传的文件和图片"""
     
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.attachments = []  # 存储附件数据
+        self.model = AttachmentListModel(self)  # 存储附件数据
+        self.model.thumbnail_requested.connect(self._start_thumbnail)
+        self.thread_pool = QThreadPool(self)
+        # 任务在完成前必须保持引用，即使对应的附件已被删除
+        self._pending_thumbnails: Dict[str, ThumbnailTask] = {}
+        self._pending_saves: Dict[str, ClipboardImageTask] = {}
+        # 剪贴板图片的保存目录；服务端为每个请求单独指定，结束或取消时整个删除
+        self.temp_dir = config.TEMP_DIR
+        self.image_options = dict(DEFAULT_IMAGE_OPTIONS)
         self._setup_ui()
+
+    @property
+    def attachments(self) -> List[Dict[str, Any]]:
+        return self.model.attachments()
     
     def _setup_ui(self):
         # 主布局
@@ -184,7 +946,7 @@ class AttachmentsManager(QWidget):
         
         # 标题
         title_label = QLabel("附件")
-        title_label.setStyleSheet("font-weight: bold;")
+        title_label.setObjectName("attachmentsTitle")
         header_layout.addWidget(title_label)
         
         header_layout.addStretch(1)
@@ -193,37 +955,10 @@ class AttachmentsManager(QWidget):
         self.upload_button = QToolButton()
         self.upload_button.setText("添加")
         self.upload_button.setPopupMode(QToolButton.InstantPopup)
-        self.upload_button.setStyleSheet("""
-            QToolButton {
-                background-color: #2d2d30;
-                color: #e1e1e1;
-                border: 1px solid #555;
-                border-radius: 3px;
-                padding: 3px 10px;
-            }
-            QToolButton:hover {
-                background-color: #3e3e42;
-            }
-            QToolButton::menu-indicator {
-                image: none;
-            }
-        """)
+        self.upload_button.setObjectName("uploadButton")
         
         # 创建上下文菜单
         upload_menu = QMenu(self)
-        upload_menu.setStyleSheet("""
-            QMenu {
-                background-color: #252526;
-                color: #e1e1e1;
-                border: 1px solid #555;
-            }
-            QMenu::item {
-                padding: 5px 20px;
-            }
-            QMenu::item:selected {
-                background-color: #3e3e42;
-            }
-        """)
         
         # 添加文件选项
         action_file = upload_menu.addAction("选择文件")
@@ -242,24 +977,19 @@ class AttachmentsManager(QWidget):
         
         layout.addLayout(header_layout)
         
-        # 创建附件列表
-        self.attachments_list = QListWidget()
+        # 创建附件列表：模型 + 委托绘制，不为每一行创建控件
+        self.attachments_list = QListView()
         self.attachments_list.setMinimumHeight(100)
         self.attachments_list.setMaximumHeight(200)
-        self.attachments_list.setStyleSheet("""
-            QListWidget {
-                background-color: #1e1e1e;
-                border: 1px solid #444;
-                border-radius: 4px;
-            }
-            QListWidget::item {
-                padding: 5px;
-                border-bottom: 1px solid #333;
-            }
-            QListWidget::item:selected {
-                background-color: #0078d7;
-            }
-        """)
+        self.attachments_list.setObjectName("attachmentsList")
+        self.attachments_list.setModel(self.model)
+        self.attachments_delegate = AttachmentDelegate(self.attachments_list)
+        # 删除会修改模型，排队到当前鼠标事件处理完之后执行
+        self.attachments_delegate.delete_requested.connect(self.remove_attachment, Qt.QueuedConnection)
+        self.attachments_list.setItemDelegate(self.attachments_delegate)
+        self.attachments_list.setMouseTracking(True)
+        self.attachments_list.setVerticalScrollMode(QListView.ScrollPerPixel)
+        self.attachments_list.setSelectionMode(QListView.SingleSelection)
         
         # 右键菜单
         self.attachments_list.setContextMenuPolicy(Qt.CustomContextMenu)
@@ -329,7 +1059,7 @@ class AttachmentsManager(QWidget):
         
         # 如果未指定是否为图片，则根据扩展名判断
         if is_image is None:
-            is_image = file_ext in ['.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp']
+            is_image = file_ext in IMAGE_EXTENSIONS
         
         # 创建唯一ID
         attachment_id = str(uuid.uuid4())
@@ -343,42 +1073,44 @@ class AttachmentsManager(QWidget):
             'size': os.path.getsize(file_path)
         }
         
-        # 为图片创建预览
-        preview = None
-        if is_image:
-            try:
-                pixmap = QPixmap(file_path)
-                if not pixmap.isNull():
-                    # 图片缩放处理
-                    pixmap = pixmap.scaledToWidth(100, Qt.SmoothTransformation)
-                    preview = pixmap
-                    
-                    # 生成base64数据
-                    byte_array = QByteArray()
-                    buffer = QBuffer(byte_array)
-                    buffer.open(QIODevice.WriteOnly)
-                    pixmap.save(buffer, "PNG")
-                    attachment_data['data'] = f"data:image/png;base64,{base64.b64encode(byte_array.data()).decode('utf-8')}"
-            except Exception as e:
-                print(f"图片预览生成失败: {e}")
-        
-        # 添加到附件列表
-        self.attachments.append(attachment_data)
-        
-        # 创建列表项
-        item = QListWidgetItem()
-        self.attachments_list.addItem(item)
-        
-        # 创建附件项UI
-        attachment_widget = self._create_attachment_item_widget(attachment_data, preview)
-        item.setSizeHint(attachment_widget.sizeHint())
-        self.attachments_list.setItemWidget(item, attachment_widget)
+        # 添加到附件列表，图片的缩略图等到该行可见时才在线程池中生成
+        self.model.append(attachment_data)
         
         # 确保附件管理器可见
         self.setVisible(True)
+
+    def _start_thumbnail(self, attachment_id):
+        attachment = self.model.get(attachment_id)
+        if attachment is None or attachment_id in self._pending_thumbnails or attachment_id in self._pending_saves:
+            # 剪贴板图片的缩略图在保存完成时一并填入
+            return
+        task = ThumbnailTask(attachment_id, attachment['path'])
+        task.signals.finished.connect(self._on_thumbnail_finished)
+        self._pending_thumbnails[attachment_id] = task
+        self.thread_pool.start(task)
+    
+    def _on_thumbnail_finished(self, attachment_id):
+        task = self._pending_thumbnails.pop(attachment_id, None)
+        if task is not None:
+            self._apply_thumbnail(task)
+
+    def _apply_thumbnail(self, task: ThumbnailTask):
+        """在主线程中把生成好的缩略图填入模型，只刷新对应的一行"""
+        self.model.set_thumbnail(task.attachment_id, task.image)
+
+    def wait_for_tasks(self):
+        """等待缩略图生成和剪贴板图片保存全部完成（提交前调用，保证数据完整）"""
+        if not self._pending_thumbnails and not self._pending_saves:
+            return
+        self.thread_pool.waitForDone()
+        for task in list(self._pending_thumbnails.values()):
+            self._apply_thumbnail(task)
+        self._pending_thumbnails.clear()
+        for attachment_id in list(self._pending_saves):
+            self._on_clipboard_saved(attachment_id)
     
     def add_image_from_clipboard(self, image):
-        """从剪贴板添加图片"""
+        """从剪贴板添加图片，编码和写盘在线程池中进行，不阻塞输入"""
         if image.isNull():
             return
         
@@ -387,174 +1119,79 @@ class AttachmentsManager(QWidget):
         file_name = f"clipboard_image_{attachment_id[:8]}.png"
         
         # 创建临时目录以保存剪贴板图片
-        temp_dir = os.path.join(os.path.expanduser("~"), ".interactive_feedback_temp")
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        # 保存图片到临时文件
-        file_path = os.path.join(temp_dir, file_name)
-        image.save(file_path, "PNG")
+        os.makedirs(self.temp_dir, exist_ok=True)
+        file_path = os.path.join(self.temp_dir, file_name)
         
-        # 创建QPixmap用于预览
-        pixmap = QPixmap.fromImage(image)
-        pixmap = pixmap.scaledToWidth(100, Qt.SmoothTransformation)
-        
-        # 生成base64数据
-        byte_array = QByteArray()
-        buffer = QBuffer(byte_array)
-        buffer.open(QIODevice.WriteOnly)
-        pixmap.save(buffer, "PNG")
-        
-        # 准备附件数据
+        # 准备附件数据，大小在保存完成后填入
         attachment_data = {
             'id': attachment_id,
             'name': file_name,
             'path': file_path,
             'type': 'image',
-            'size': os.path.getsize(file_path),
-            'data': f"data:image/png;base64,{base64.b64encode(byte_array.data()).decode('utf-8')}"
+            'size': None
         }
         
-        # 添加到附件列表
-        self.attachments.append(attachment_data)
-        
-        # 创建列表项
-        item = QListWidgetItem()
-        self.attachments_list.addItem(item)
-        
-        # 创建附件项UI
-        attachment_widget = self._create_attachment_item_widget(attachment_data, pixmap)
-        item.setSizeHint(attachment_widget.sizeHint())
-        self.attachments_list.setItemWidget(item, attachment_widget)
+        task = ClipboardImageTask(attachment_id, image, file_path)
+        task.signals.finished.connect(self._on_clipboard_saved)
+        self._pending_saves[attachment_id] = task
+        self.model.append(attachment_data)
+        self.thread_pool.start(task)
         
         # 确保附件管理器可见
         self.setVisible(True)
-    
-    def _create_attachment_item_widget(self, attachment_data, preview=None):
-        """创建附件项UI组件"""
-        widget = QWidget()
-        layout = QHBoxLayout(widget)
-        layout.setContentsMargins(5, 5, 5, 5)
-        
-        # 显示预览或图标
-        if preview and not preview.isNull():
-            # 图片预览
-            preview_label = QLabel()
-            preview_label.setPixmap(preview)
-            preview_label.setFixedSize(100, 100)
-            preview_label.setScaledContents(True)
-            layout.addWidget(preview_label)
-        else:
-            # 文件图标
-            icon_label = QLabel()
-            icon_label.setText("📄")
-            icon_label.setStyleSheet("font-size: 24px;")
-            icon_label.setFixedWidth(30)
-            layout.addWidget(icon_label)
-        
-        # 文件信息
-        info_layout = QVBoxLayout()
-        
-        # 文件名
-        name_label = QLabel(attachment_data['name'])
-        name_label.setStyleSheet("font-weight: bold;")
-        info_layout.addWidget(name_label)
-        
-        # 文件大小
-        size_str = self._format_size(attachment_data['size'])
-        size_label = QLabel(f"大小: {size_str}")
-        info_layout.addWidget(size_label)
-        
-        info_layout.addStretch(1)
-        layout.addLayout(info_layout, stretch=1)
-        
-        # 删除按钮
-        delete_button = QPushButton("×")
-        delete_button.setFixedSize(24, 24)
-        delete_button.setStyleSheet("""
-            QPushButton {
-                background-color: #444;
-                color: #e1e1e1;
-                border-radius: 12px;
-                font-weight: bold;
-                font-size: 14px;
-            }
-            QPushButton:hover {
-                background-color: #c42b1c;
-            }
-        """)
-        delete_button.clicked.connect(lambda: self.remove_attachment(attachment_data['id']))
-        layout.addWidget(delete_button)
-        
-        return widget
-    
-    def _format_size(self, size_bytes):
-        """格式化文件大小显示"""
-        if size_bytes < 1024:
-            return f"{size_bytes} B"
-        elif size_bytes < 1024 * 1024:
-            return f"{size_bytes / 1024:.1f} KB"
-        elif size_bytes < 1024 * 1024 * 1024:
-            return f"{size_bytes / (1024 * 1024):.1f} MB"
-        else:
-            return f"{size_bytes / (1024 * 1024 * 1024):.1f} GB"
+
+    def _on_clipboard_saved(self, attachment_id):
+        task = self._pending_saves.pop(attachment_id, None)
+        if task is None:
+            return
+        attachment = self.model.get(attachment_id)
+        if attachment is None:
+            # 保存期间附件已被删除
+            if task.size is not None:
+                self._remove_temp_file(task.file_path)
+            return
+        if task.size is None:
+            self.remove_attachment(attachment_id)
+            return
+        attachment['size'] = task.size
+        self.model.set_thumbnail(attachment_id, task.thumbnail)
     
     def remove_attachment(self, attachment_id):
         """删除指定的附件"""
-        # 查找附件索引
-        index_to_remove = None
-        for i, attachment in enumerate(self.attachments):
-            if attachment['id'] == attachment_id:
-                index_to_remove = i
-                break
+        # 按 id→行号 索引直接定位并从模型中删除
+        removed_attachment = self.model.remove(attachment_id)
+        self.attachments_delegate.clear_hover()
         
-        if index_to_remove is not None:
-            # 从数据列表中删除
-            removed_attachment = self.attachments.pop(index_to_remove)
-            
-            # 从UI列表中删除
-            self.attachments_list.takeItem(index_to_remove)
-            
+        if removed_attachment is not None:
             # 如果是剪贴板图片，删除临时文件
-            if 'clipboard_image_' in removed_attachment['name']:
-                try:
-                    os.remove(removed_attachment['path'])
-                except Exception as e:
-                    print(f"删除临时文件失败: {e}")
+            # 仍在保存中的由保存完成时删除
+            if 'clipboard_image_' in removed_attachment['name'] and attachment_id not in self._pending_saves:
+                self._remove_temp_file(removed_attachment['path'])
             
             # 如果没有附件了，隐藏附件管理器
-            if not self.attachments:
+            if self.model.rowCount() == 0:
                 self.setVisible(False)
     
+    @staticmethod
+    def _remove_temp_file(path):
+        try:
+            os.remove(path)
+        except Exception as e:
+            print(f"删除临时文件失败: {e}")
+    
     def show_context_menu(self, position):
         """显示右键菜单"""
-        if self.attachments_list.count() == 0:
+        index = self.attachments_list.indexAt(position)
+        if not index.isValid():
             return
         
-        item = self.attachments_list.itemAt(position)
-        if not item:
-            return
-        
-        index = self.attachments_list.row(item)
-        attachment = self.attachments[index]
+        attachment = index.model().attachment_at(index)
         
         # 创建上下文菜单
         context_menu = QMenu(self)
-        context_menu.setStyleSheet("""
-            QMenu {
-                background-color: #252526;
-                color: #e1e1e1;
-                border: 1px solid #555;
-            }
-            QMenu::item {
-                padding: 5px 20px;
-            }
-            QMenu::item:selected {
-                background-color: #3e3e42;
-            }
-        """)
-        
-        # 预览选项（仅适用于图片）
-        if attachment['type'] == 'image':
+        
+        # 预览选项（仅适用于已保存完成的图片）
+        if attachment['type'] == 'image' and attachment['id'] not in self._pending_saves:
             preview_action = context_menu.addAction("预览")
             preview_action.triggered.connect(lambda: self.preview_image(attachment))
         
@@ -582,140 +1219,278 @@ class AttachmentsManager(QWidget):
         except Exception as e:
             print(f"打开预览失败: {e}")
     
+    def clear(self):
+        """清空所有附件（窗口复用时调用）"""
+        self.model.clear()
+        self.setVisible(False)
+    
+    def set_image_options(self, options: Optional[Dict[str, Any]]):
+        """更新图片编码配置，未指定的字段使用默认值"""
+        self.image_options = {**DEFAULT_IMAGE_OPTIONS, **(options or {})}
+        image_format = str(self.image_options["format"]).lower()
+        if image_format == "jpg":
+            image_format = "jpeg"
+        supported = {bytes(f).decode() for f in QImageWriter.supportedImageFormats()}
+        if image_format not in supported:
+            image_format = "jpeg"
+        self.image_options["format"] = image_format
+
+    def encode_images(self):
+        """按 image_options 为图片附件生成返回给模型的编码图片，总大小不超过预算
+
+        先在线程池中并行按配置编码，超出预算时再从小到大依次分配剩余预算，
+        放不下的图片降低质量或缩小尺寸，仍然放不下的不再内联。
+        """
+        options = self.image_options
+        if not options.get("inline", True):
+            return
+        tasks = [ImageEncodeTask(a, options) for a in self.attachments if a['type'] == 'image']
+        for task in tasks:
+            self.thread_pool.start(task)
+        self.thread_pool.waitForDone()
+
+        remaining = options["budget_bytes"]
+        encoded = sorted((t for t in tasks if t.data), key=lambda t: len(t.data))
+        for index, task in enumerate(encoded):
+            share = remaining // (len(encoded) - index)
+            data = task.data
+            if len(data) > share:
+                data = fit_image_to_budget(task.image, options["format"], options["quality"], share)
+            task.attachment.pop('rendition', None)
+            if data:
+                task.attachment['rendition'] = data
+                task.attachment['rendition_format'] = options["format"]
+                remaining -= len(data)
+    
     def get_attachments_data(self):
         """获取所有附件数据用于提交"""
+        self.wait_for_tasks()
+        self.encode_images()
         return self.attachments
 
+class QuestionSection(QFrame):
+    """批量提问中的一个问题：问题文字、单选或多选的预定义选项，以及可选的文字回答"""
+
+    def __init__(self, index: int, question: Dict[str, Any], parent=None):
+        super().__init__(parent)
+        self.setObjectName("questionSection")
+        self.question = question
+        self.options: List[str] = question.get("predefined_options") or []
+        layout = QVBoxLayout(self)
+        layout.setSpacing(6)
+
+        title = QLabel(f"{index + 1}. {question.get('question', '')}")
+        title.setObjectName("questionTitle")
+        title.setWordWrap(True)
+        layout.addWidget(title)
+
+        # 单选用互斥的单选按钮，多选用复选框
+        self.buttons: List[Any] = []
+        self.button_group = QButtonGroup(self)
+        # 默认单选，与服务端 normalize_questions 的默认值一致
+        multi_select = question.get("multi_select", False)
+        self.button_group.setExclusive(not multi_select)
+        for option in self.options:
+            button = QCheckBox(option) if multi_select else QRadioButton(option)
+            self.button_group.addButton(button)
+            self.buttons.append(button)
+            layout.addWidget(button)
+
+        self.text_edit: Optional[FeedbackTextEdit] = None
+        if question.get("allow_text", True):
+            self.text_edit = FeedbackTextEdit()
+            self.text_edit.setPlaceholderText("回答（可选）")
+            self.text_edit.setFixedHeight(3 * self.text_edit.fontMetrics().height() + 16)
+            layout.addWidget(self.text_edit)
+
+    def fill(self, options: Any, text: str):
+        """自动应答用：勾选指定序号的选项（或 "all"）并填写文字"""
+        for index, button in enumerate(self.buttons):
+            button.setChecked(options == "all" or index in options)
+        if self.text_edit is not None:
+            self.text_edit.setPlainText(text)
+
+    def answer(self) -> Dict[str, Any]:
+        selected = [option for option, button in zip(self.options, self.buttons) if button.isChecked()]
+        text = self.text_edit.toPlainText().strip() if self.text_edit is not None else ""
+        return {
+            "question": self.question.get("question", ""),
+            "selected_options": selected,
+            "text": text,
+            "interactive_feedback": compose_feedback(selected, text),
+        }
+
+class HistoryPanel(QFrame):
+    """历史回答：边输入边检索以往各轮的提示和回答，选中一条把它的回答填入反馈框"""
+
+    answer_chosen = Signal(str)
+
+    # 每次检索最多显示的条数
+    RESULT_LIMIT = 30
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setObjectName("historyPanel")
+        self.conn = None  # 只读连接在第一次打开面板时建立，常驻进程中一直复用
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(8, 8, 8, 8)
+        layout.setSpacing(6)
+
+        self.search_edit = QLineEdit()
+        self.search_edit.setObjectName("historySearch")
+        self.search_edit.setPlaceholderText("搜索以往的提问和回答（空格分隔多个关键词）")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.textChanged.connect(self.search)
+        self.search_edit.returnPressed.connect(self._choose_current)
+        layout.addWidget(self.search_edit)
+
+        self.result_list = QListWidget()
+        self.result_list.setObjectName("historyList")
+        self.result_list.setWordWrap(True)
+        self.result_list.setFixedHeight(12 * self.result_list.fontMetrics().height())
+        self.result_list.itemActivated.connect(self._choose)
+        self.result_list.itemDoubleClicked.connect(self._choose)
+        layout.addWidget(self.result_list)
+
+        self.status_label = QLabel()
+        self.status_label.setObjectName("historyStatus")
+        layout.addWidget(self.status_label)
+
+    def open(self):
+        if self.conn is None:
+            # 只在打开面板时才加载 sqlite3，不增加界面进程的启动时间
+            import sqlite3
+            import history
+            try:
+                self.conn = history.connect(config.HISTORY_DB, readonly=True)
+            except sqlite3.Error as e:
+                print(f"打开反馈历史失败: {e}", file=sys.stderr)
+        self.search()
+        self.search_edit.setFocus()
+
+    def reset(self):
+        self.search_edit.clear()
+        self.result_list.clear()
+
+    def search(self):
+        """在界面线程中同步检索：FTS 索引按时间倒序取前几十条，大库中也只需几毫秒"""
+        self.result_list.clear()
+        if self.conn is None:
+            self.status_label.setText("还没有历史记录")
+            return
+        import sqlite3
+        import history
+        start = time.perf_counter()
+        try:
+            rounds = history.search(self.conn, self.search_edit.text(), limit=self.RESULT_LIMIT)
+        except sqlite3.Error as e:
+            self.status_label.setText(f"检索失败: {e}")
+            return
+        elapsed = (time.perf_counter() - start) * 1000
+        for record in rounds:
+            prompt = record["prompt"].strip().splitlines()
+            answer = record["answer"].strip().splitlines()
+            when = time.strftime("%m-%d %H:%M", time.localtime(record["created"]))
+            project = os.path.basename((record["project"] or "").rstrip("/\\"))
+            item = QListWidgetItem(
+                f"{prompt[0] if prompt else '(无提示)'}\n→ {answer[0] if answer else '(空回答)'}\n{' · '.join(p for p in (when, project) if p)}"
+            )
+            item.setData(Qt.UserRole, record["answer"])
+            item.setToolTip(f"{record['prompt']}\n\n→ {record['answer']}")
+            self.result_list.addItem(item)
+        self.status_label.setText(f"{len(rounds)} 条结果 · {elapsed:.1f} ms")
+        if rounds:
+            self.result_list.setCurrentRow(0)
+
+    def _choose_current(self):
+        item = self.result_list.currentItem()
+        if item is not None:
+            self._choose(item)
+
+    def _choose(self, item: QListWidgetItem):
+        self.answer_chosen.emit(item.data(Qt.UserRole))
+
 # 移除了标题栏类
 
+def paint_window_frame(window: QWidget, border_radius: int):
+    """绘制无边框窗口的圆角背景和边框"""
+    painter = QPainter(window)
+    painter.setRenderHint(QPainter.Antialiasing)
+    
+    # 定义绘制区域
+    rect = window.rect()
+    path = QPainterPath()
+    path.addRoundedRect(rect, border_radius, border_radius)
+    
+    # 设置画笔（边框）
+    border_pen = QPen(QColor('#555555'))
+    border_pen.setWidth(1)
+    painter.setPen(border_pen)
+    
+    # 填充背景
+    painter.fillPath(path, QColor('#2d2d30'))
+    
+    # 绘制边框
+    painter.drawPath(path)
+
+def add_window_shadow(widget: QWidget):
+    shadow = QGraphicsDropShadowEffect(widget)
+    shadow.setBlurRadius(20)
+    shadow.setColor(QColor(0, 0, 0, 80))
+    shadow.setOffset(0, 2)
+    widget.setGraphicsEffect(shadow)
+
 class FeedbackUI(QMainWindow):
-    def __init__(self, prompt: str, predefined_options: Optional[List[str]] = None):
-        super().__init__(None, Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint)
+    # 窗口关闭时发出（无论是否已提交），携带最终的反馈结果
+    feedback_finished = Signal(dict)
+
+    def __init__(self, prompt: str = "", predefined_options: Optional[List[str]] = None, parent: Optional[QWidget] = None):
+        # 有父控件时作为 FeedbackQueueWindow 中的一页嵌入，由它负责窗口的显示、边框和阴影
+        super().__init__(parent, Qt.Widget if parent is not None else Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint)
         self.prompt = prompt
         self.predefined_options = predefined_options or []
 
         self.feedback_result = None
+        self.request_id = None  # 常驻模式下当前处理的请求ID
+        self.deadline: Optional[float] = None  # 服务端自动回复的时刻（墙上时间），None 表示不限时
+        self.spans = timing.SpanRecorder()  # 本轮反馈各阶段耗时，随结果回传给服务端
         self.border_radius = 8  # 窗口圆角半径
         self.old_pos = None  # 用于实现窗口拖动
         
-        # 设置透明背景以便应用圆角
-        self.setAttribute(Qt.WA_TranslucentBackground)
-        
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        icon_path = os.path.join(script_dir, "images", "feedback.png")
-        self.setWindowIcon(QIcon(icon_path))
-        
         self.settings = QSettings("InteractiveFeedbackMCP", "InteractiveFeedbackMCP")
         
         # 设置窗口初始大小（宽度设置稍大一些，高度设置合理值但会在显示后自动调整）
         self.resize(650, 750)
         self.setMinimumSize(500, 400)  # 设置最小尺寸以确保UI元素可见
         
-        # 仅恢复窗口大小而非位置
-        self.settings.beginGroup("MainWindow_General")
-        geometry = self.settings.value("geometry")
-        if geometry:
-            # 仅恢复尺寸，不恢复位置
-            self.restoreGeometry(geometry)
-            # 重新定位到屏幕中心
-            self.center_on_screen()
-        state = self.settings.value("windowState")
-        if state:
-            self.restoreState(state)
-        self.settings.endGroup() # 结束 "MainWindow_General" 组
-
-        # 设置全局样式
-        self.setup_fonts()
-        self.setStyleSheet("""
-            QMainWindow {
-                background: transparent;
-            }
-            QGroupBox {
-                border: 1px solid #444;
-                border-radius: 6px;
-                margin-top: 12px;
-                font-weight: bold;
-                padding: 10px;
-            }
-            QGroupBox::title {
-                subcontrol-origin: margin;
-                subcontrol-position: top left;
-                left: 10px;
-                padding: 0 5px;
-                color: #e1e1e1;
-            }
-            QLabel {
-                color: #e1e1e1;
-                font-size: 13px;
-            }
-            QPushButton {
-                background-color: #0078d7;
-                color: white;
-                border: none;
-                border-radius: 4px;
-                padding: 8px 16px;
-                font-weight: bold;
-            }
-            QPushButton:hover {
-                background-color: #1a88e1;
-            }
-            QPushButton:pressed {
-                background-color: #0067b8;
-            }
-            QCheckBox {
-                color: #e1e1e1;
-                padding: 5px;
-            }
-            QCheckBox::indicator {
-                width: 18px;
-                height: 18px;
-                border: 1px solid #777; /* Slightly lighter border for contrast */
-                background-color: #3a3a3e; /* Background for the checkbox indicator */
-                border-radius: 3px;
-            }
-            QCheckBox::indicator:unchecked {
-                background-color: #3a3a3e;
-            }
-            QCheckBox::indicator:checked {
-                background-color: #0078d7; /* Highlight color for checked state */
-                /* Optionally, you can add a check mark image here if needed */
-                /* image: url(:/qt-project.org/styles/commonstyle/images/standardbutton-apply-16.png); */
-            }
-            QCheckBox::indicator:hover {
-                border: 1px solid #999;
-            }
-            QFrame[frameShape="4"] { /* HLine */
-                color: #555;
-                margin: 5px 0;
-            }
-            QScrollArea, QWidget#centralWidget {
-                border: none;
-                background-color: transparent;
-            }
-        """)
-
-        self._create_ui()
-        # 添加窗口阴影
-        self.shadow = QGraphicsDropShadowEffect(self)
-        self.shadow.setBlurRadius(20)
-        self.shadow.setColor(QColor(0, 0, 0, 80))
-        self.shadow.setOffset(0, 2)
-        self.centralWidget().setGraphicsEffect(self.shadow)
-        
-        # 安装事件过滤器以处理鼠标拖动
-        self.installEventFilter(self)
+        if parent is None:
+            # 设置透明背景以便应用圆角
+            self.setAttribute(Qt.WA_TranslucentBackground)
+            script_dir = os.path.dirname(os.path.abspath(__file__))
+            icon_path = os.path.join(script_dir, "images", "feedback.png")
+            self.setWindowIcon(QIcon(icon_path))
 
-    def setup_fonts(self):
-        # 设置中文友好的字体
-        font_id = QFontDatabase.addApplicationFont("Microsoft YaHei")
-        if font_id != -1:
-            font_family = QFontDatabase.applicationFontFamilies(font_id)[0]
-        else:
-            # 回退使用系统默认字体
-            font_family = "微软雅黑, Microsoft YaHei, 宋体, SimSun, sans-serif"
+            # 仅恢复窗口大小而非位置
+            self.settings.beginGroup("MainWindow_General")
+            geometry = self.settings.value("geometry")
+            if geometry:
+                # 仅恢复尺寸，不恢复位置
+                self.restoreGeometry(geometry)
+                # 重新定位到屏幕中心
+                self.center_on_screen()
+            state = self.settings.value("windowState")
+            if state:
+                self.restoreState(state)
+            self.settings.endGroup() # 结束 "MainWindow_General" 组
+
+        with self.spans.span("create_ui"):
+            self._create_ui()
+        if parent is None:
+            # 添加窗口阴影
+            add_window_shadow(self.centralWidget())
         
-        font = QFont(font_family, 10)
-        QApplication.setFont(font)
+        # 安装事件过滤器以处理鼠标拖动（嵌入时拖动的是所在的窗口）
+        self.installEventFilter(self)
 
     def _create_ui(self):
         central_widget = QWidget()
@@ -727,12 +1502,7 @@ class FeedbackUI(QMainWindow):
         
         # 标题部分
         title_label = QLabel("请提供您的反馈")
-        title_label.setStyleSheet("""
-            font-size: 18px;
-            font-weight: bold;
-            color: #ffffff;
-            margin-bottom: 0px;
-        """)
+        title_label.setObjectName("windowTitle")
         title_container_layout = QHBoxLayout()
         title_container_layout.setContentsMargins(0, 0, 0, 0)
         title_container_layout.addStretch(1)
@@ -741,57 +1511,46 @@ class FeedbackUI(QMainWindow):
         
         main_layout.addLayout(title_container_layout)
 
+        # 限时请求的倒计时，到期后由服务端返回默认回答
+        self.countdown_label = QLabel()
+        self.countdown_label.setObjectName("countdownLabel")
+        self.countdown_label.setAlignment(Qt.AlignCenter)
+        self.countdown_label.setVisible(False)
+        main_layout.addWidget(self.countdown_label)
+        # 多个客户端共用界面时显示提问的客户端和工作区
+        self.client_label = QLabel()
+        self.client_label.setObjectName("clientLabel")
+        self.client_label.setAlignment(Qt.AlignCenter)
+        self.client_label.setVisible(False)
+        main_layout.addWidget(self.client_label)
+        self.countdown_timer = QTimer(self)
+        self.countdown_timer.setInterval(1000)
+        self.countdown_timer.timeout.connect(self._update_countdown)
+
         # 添加标题与内容之间的分界线
         header_separator = QFrame()
         header_separator.setFrameShape(QFrame.HLine)
         header_separator.setFrameShadow(QFrame.Sunken)
-        header_separator.setStyleSheet("""
-            QFrame[frameShape="4"] {
-                color: #3a3a3a;
-                background-color: #3a3a3a;
-                border: none;
-                height: 1px;
-                margin: 0px 0;
-            }
-        """)
+        header_separator.setObjectName("sectionSeparator")
         main_layout.addWidget(header_separator)
 
         # 创建反馈主内容容器（非滚动区域）
         content_wrapper = QWidget()
-        content_wrapper.setStyleSheet("background-color: transparent;")
+        content_wrapper.setObjectName("contentWrapper")
         content_wrapper_layout = QVBoxLayout(content_wrapper)
         content_wrapper_layout.setContentsMargins(0, 0, 0, 0)
         content_wrapper_layout.setSpacing(15)
         
         # 创建可滚动区域（只有在需要时才会滚动）
-        scroll_area = QScrollArea()
+        self.scroll_area = scroll_area = QScrollArea()
         scroll_area.setWidgetResizable(True)
         scroll_area.setFrameShape(QFrame.NoFrame)
         scroll_area.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
-        scroll_area.setStyleSheet("""
-            QScrollArea {
-                background-color: transparent;
-                border: none;
-            }
-            QScrollBar:vertical {
-                background: #2d2d30;
-                width: 10px;
-                margin: 0px;
-            }
-            QScrollBar::handle:vertical {
-                background: #666;
-                min-height: 20px;
-                border-radius: 5px;
-            }
-            QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical {
-                height: 0px;
-            }
-        """)
         
         # 创建内容容器小部件
-        content_widget = QWidget()
+        self.content_widget = content_widget = QWidget()
         content_widget.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Preferred)
-        content_widget.setStyleSheet("background-color: transparent;")
+        content_widget.setObjectName("contentWidget")
         content_layout = QVBoxLayout(content_widget)
         content_layout.setContentsMargins(0, 0, 0, 0)
         content_layout.setSpacing(15)
@@ -802,36 +1561,60 @@ class FeedbackUI(QMainWindow):
         feedback_layout = QVBoxLayout(self.feedback_group)
         feedback_layout.setSpacing(15)
 
-        # 描述标签 (来自 self.prompt) - 支持多行
-        self.description_label = QLabel(self.prompt)
-        self.description_label.setWordWrap(True)
-        self.description_label.setStyleSheet("padding: 5px 0;")
-        feedback_layout.addWidget(self.description_label)
+        # 提示内容 (来自 self.prompt)，按 Markdown 渲染，只排版可见部分，很长时在区域内滚动
+        self.prompt_view = PromptView()
+        self.prompt_view.set_text(self.prompt)
+        feedback_layout.addWidget(self.prompt_view)
 
-        # 添加预定义选项（如果有）
+        # 请求附带的补丁（内容由 load_request 填充），没有补丁时隐藏
+        self.diff_view = DiffView()
+        self.diff_view.setVisible(False)
+        feedback_layout.addWidget(self.diff_view)
+
+        # 预定义选项区域（内容由 _populate_options 填充，便于窗口复用）
         self.option_checkboxes = []
-        if self.predefined_options and len(self.predefined_options) > 0:
-            options_frame = QFrame()
-            options_layout = QVBoxLayout(options_frame)
-            options_layout.setContentsMargins(0, 10, 0, 10)
-            options_layout.setSpacing(8)
-            
-            for option in self.predefined_options:
-                checkbox = QCheckBox(option)
-                self.option_checkboxes.append(checkbox)
-                options_layout.addWidget(checkbox)
-            
-            feedback_layout.addWidget(options_frame)
-            
-            # 添加分隔线
-            separator = QFrame()
-            separator.setFrameShape(QFrame.HLine)
-            separator.setFrameShadow(QFrame.Sunken)
-            feedback_layout.addWidget(separator)
+        self.options_frame = QFrame()
+        self.options_layout = QVBoxLayout(self.options_frame)
+        self.options_layout.setContentsMargins(0, 10, 0, 10)
+        self.options_layout.setSpacing(8)
+        feedback_layout.addWidget(self.options_frame)
+
+        # 添加分隔线
+        self.options_separator = QFrame()
+        self.options_separator.setFrameShape(QFrame.HLine)
+        self.options_separator.setFrameShadow(QFrame.Sunken)
+        self.options_separator.setObjectName("sectionSeparator")
+        feedback_layout.addWidget(self.options_separator)
+        self._populate_options()
+
+        # 批量提问时每个问题一节（内容由 _populate_questions 填充）
+        self.questions: List[Dict[str, Any]] = []
+        self.question_sections: List[QuestionSection] = []
+        self.questions_frame = QWidget()
+        self.questions_layout = QVBoxLayout(self.questions_frame)
+        self.questions_layout.setContentsMargins(0, 0, 0, 0)
+        self.questions_layout.setSpacing(10)
+        self.questions_frame.setVisible(False)
+        feedback_layout.addWidget(self.questions_frame)
 
         # 自由文本反馈
-        feedback_label = QLabel("详细反馈:")
-        feedback_layout.addWidget(feedback_label)
+        feedback_label_layout = QHBoxLayout()
+        self.feedback_label = QLabel("详细反馈:")
+        feedback_label_layout.addWidget(self.feedback_label)
+        feedback_label_layout.addStretch(1)
+        self.history_button = QPushButton("历史回答")
+        self.history_button.setObjectName("historyButton")
+        self.history_button.setCheckable(True)
+        self.history_button.setToolTip("检索以往的提问和回答，选中后把回答填入反馈框")
+        self.history_button.toggled.connect(self._toggle_history)
+        self.history_button.setVisible(bool(config.HISTORY_DB))
+        feedback_label_layout.addWidget(self.history_button)
+        feedback_layout.addLayout(feedback_label_layout)
+
+        self.history_panel = HistoryPanel()
+        self.history_panel.setVisible(False)
+        self.history_panel.answer_chosen.connect(self._use_history_answer)
+        feedback_layout.addWidget(self.history_panel)
         
         self.feedback_text = FeedbackTextEdit()
         font_metrics = self.feedback_text.fontMetrics()
@@ -865,15 +1648,7 @@ class FeedbackUI(QMainWindow):
         separator = QFrame()
         separator.setFrameShape(QFrame.HLine)
         separator.setFrameShadow(QFrame.Sunken)
-        separator.setStyleSheet("""
-            QFrame[frameShape="4"] {
-                color: #3a3a3a;
-                background-color: #3a3a3a;
-                border: none;
-                height: 1px;
-                margin: 0px 0;
-            }
-        """)
+        separator.setObjectName("sectionSeparator")
         content_wrapper_layout.addWidget(separator)
         
         # 按钮部分（放在主容器中，不在滚动区域内）
@@ -884,44 +1659,21 @@ class FeedbackUI(QMainWindow):
         # 添加"无需反馈已解决了"按钮
         resolved_button = QPushButton("已解决！")
         resolved_button.clicked.connect(self._submit_resolved)
-        resolved_button.setStyleSheet("""
-            QPushButton {
-                background-color: #28a745;
-                color: white;
-                border: none;
-                border-radius: 4px;
-                padding: 8px 16px;
-                font-weight: bold;
-            }
-            QPushButton:hover {
-                background-color: #34b754;
-            }
-            QPushButton:pressed {
-                background-color: #218838;
-            }
-        """)
+        resolved_button.setObjectName("resolvedButton")
+        
+        # 提交并记住本次回答，之后同一项目中相同的问题和选项不再弹窗
+        remember_button = QPushButton("总是这样回答")
+        remember_button.setToolTip("以后在同一项目中遇到相同的问题和选项时直接返回本次的回答（不含附件）")
+        remember_button.clicked.connect(lambda: self._submit_feedback(remember=True))
+        remember_button.setObjectName("rememberButton")
         
         # 提交按钮
         submit_button = QPushButton("发送反馈")
-        submit_button.clicked.connect(self._submit_feedback)
-        submit_button.setStyleSheet("""
-            QPushButton {
-                background-color: #0078d7;
-                color: white;
-                border: none;
-                border-radius: 4px;
-                padding: 8px 16px;
-                font-weight: bold;
-            }
-            QPushButton:hover {
-                background-color: #1a88e1;
-            }
-            QPushButton:pressed {
-                background-color: #0067b8;
-            }
-        """)
+        submit_button.clicked.connect(lambda: self._submit_feedback())
         
+        self.remember_button = remember_button
         button_layout.addWidget(resolved_button)
+        button_layout.addWidget(remember_button)
         button_layout.addWidget(submit_button)
         button_layout.addStretch(1)
         
@@ -937,7 +1689,113 @@ class FeedbackUI(QMainWindow):
         # 设置一个合理的初始尺寸
         self.setMinimumWidth(500)
 
-    def _submit_feedback(self):
+    def _populate_options(self):
+        """根据 self.predefined_options 重建选项复选框"""
+        for checkbox in self.option_checkboxes:
+            self.options_layout.removeWidget(checkbox)
+            checkbox.deleteLater()
+        self.option_checkboxes = []
+
+        for option in self.predefined_options:
+            checkbox = QCheckBox(option)
+            self.option_checkboxes.append(checkbox)
+            self.options_layout.addWidget(checkbox)
+
+        has_options = bool(self.option_checkboxes)
+        self.options_frame.setVisible(has_options)
+        self.options_separator.setVisible(has_options)
+
+    def _populate_questions(self, questions: Optional[List[Dict[str, Any]]]):
+        """重建批量提问的各个问题；不是批量提问时隐藏该区域"""
+        for section in self.question_sections:
+            self.questions_layout.removeWidget(section)
+            section.deleteLater()
+        self.questions = questions or []
+        self.question_sections = [QuestionSection(i, q) for i, q in enumerate(self.questions)]
+        for section in self.question_sections:
+            self.questions_layout.addWidget(section)
+
+        batch = bool(self.question_sections)
+        self.questions_frame.setVisible(batch)
+        self.feedback_label.setText("补充说明:" if batch else "详细反馈:")
+        # 记住的回答按单个问题匹配，批量提问和审阅补丁（diff 已由 load_request 载入）不支持
+        self.remember_button.setVisible(not batch and not self.diff_view.has_diff())
+
+    def load_request(self, prompt: str, predefined_options: Optional[List[str]] = None, image_options: Optional[Dict[str, Any]] = None,
+                     deadline: Optional[float] = None, temp_dir: Optional[str] = None, questions: Optional[List[Dict[str, Any]]] = None,
+                     client: Optional[Dict[str, Any]] = None, diff: Optional[str] = None):
+        """用新的提示和选项重新填充已构建好的窗口（供常驻进程复用）"""
+        self.prompt = prompt
+        self.predefined_options = predefined_options or []
+        self.feedback_result = None
+        self.deadline = deadline
+        self.attachments_manager.temp_dir = temp_dir or config.TEMP_DIR
+        with self.spans.span("prompt_parse"):
+            self.prompt_view.set_text(prompt)
+        self.prompt_view.setVisible(bool(prompt) or not (questions or diff))
+        with self.spans.span("diff_parse"):
+            self.diff_view.set_diff(diff)
+        self._show_client(client)
+        self._populate_options()
+        self._populate_questions(questions)
+        self.feedback_text.clear()
+        self.history_button.setChecked(False)
+        self.history_panel.reset()
+        self.attachments_manager.clear()
+        self.attachments_manager.set_image_options(image_options)
+
+    def _toggle_history(self, checked: bool):
+        self.history_panel.setVisible(checked)
+        if checked:
+            self.history_panel.open()
+        else:
+            self.feedback_text.setFocus()
+
+    def _use_history_answer(self, answer: str):
+        self.feedback_text.setPlainText(answer)
+        self.feedback_text.moveCursor(QTextCursor.End)
+        self.history_button.setChecked(False)
+
+    def _show_client(self, client: Optional[Dict[str, Any]]):
+        if not client:
+            self.client_label.setVisible(False)
+            return
+        workspace = client.get("workspace") or ""
+        self.client_label.setText(" · ".join(part for part in (client.get("name"), os.path.basename(workspace.rstrip("/\\"))) if part))
+        self.client_label.setToolTip(workspace)
+        self.client_label.setVisible(True)
+
+    def present(self):
+        """调整尺寸并居中显示窗口"""
+        timing.mark("ui_present")
+        self.spans.begin("first_show")
+        auto_responder = get_auto_responder()
+        if auto_responder:
+            auto_responder.watch(self)
+        if not self.isWindow():
+            # 嵌入的页由 FeedbackQueueWindow 决定何时显示，首次绘制时才算显示出来
+            self._update_countdown()
+            return
+
+        # 先调用limitMaxHeight计算适当的窗口大小
+        self.limitMaxHeight()
+        
+        # 显示窗口前确保它居中
+        self.center_on_screen()
+        
+        # 显示窗口
+        self.show()
+        self.raise_()
+        self.activateWindow()
+        self.feedback_text.setFocus()
+        self._update_countdown()
+        
+        # 再次调整窗口大小和位置，确保UI元素完全加载后的尺寸正确
+        QTimer.singleShot(100, lambda: (self.limitMaxHeight(), self.center_on_screen()))
+
+    def _submit_feedback(self, remember: bool = False):
+        self.spans.end("dwell")
+        self.spans.begin("submit")
         feedback_text = self.feedback_text.toPlainText().strip()
         selected_options = []
         
@@ -948,18 +1806,7 @@ class FeedbackUI(QMainWindow):
                     selected_options.append(self.predefined_options[i])
         
         # 组合选中的选项和反馈文本
-        final_feedback_parts = []
-        
-        # 添加选中的选项
-        if selected_options:
-            final_feedback_parts.append("选中选项: " + "; ".join(selected_options))
-        
-        # 添加用户的文本反馈
-        if feedback_text:
-            final_feedback_parts.append(feedback_text)
-            
-        # 如果两部分都存在，用换行符连接
-        final_feedback = "\n\n".join(final_feedback_parts)
+        final_feedback = compose_feedback(selected_options, feedback_text)
         
         # 获取附件数据
         attachments = []
@@ -969,29 +1816,63 @@ class FeedbackUI(QMainWindow):
         self.feedback_result = FeedbackResult(
             interactive_feedback=final_feedback,
             attachments=attachments,
+            remember=remember,
         )
+        if self.question_sections:
+            self.feedback_result["answers"] = [section.answer() for section in self.question_sections]
+        if self.diff_view.has_diff():
+            self.feedback_result["hunks"] = self.diff_view.decisions()
+        self.spans.end("submit")
         self.close()
 
     def _submit_resolved(self):
         """提交'问题已解决'的反馈"""
+        self.spans.end("dwell")
         self.feedback_result = FeedbackResult(
             interactive_feedback="问题已解决",
             attachments=[],
         )
         self.close()
 
+    def _update_countdown(self):
+        if self.deadline is None:
+            self.countdown_timer.stop()
+            self.countdown_label.setVisible(False)
+            return
+        remaining = int(self.deadline - time.time() + 0.5)
+        if remaining > 0:
+            self.countdown_label.setText(f"{remaining} 秒后将自动回复")
+        else:
+            # 到期后由服务端返回默认回答并关闭窗口，这里只更新提示
+            self.countdown_label.setText("已超时，正在自动回复…")
+            self.countdown_timer.stop()
+        self.countdown_label.setVisible(True)
+        if remaining > 0 and not self.countdown_timer.isActive():
+            self.countdown_timer.start()
+
     def closeEvent(self, event):
-        # 保存主窗口的通用UI设置(几何尺寸、状态)
+        self.countdown_timer.stop()
+        self.spans.end("dwell")
+        # 保存主窗口的通用UI设置(几何尺寸、状态)，嵌入的页没有自己的窗口几何
         try:
-            self.settings.beginGroup("MainWindow_General")
-            self.settings.setValue("geometry", self.saveGeometry())
-            self.settings.setValue("windowState", self.saveState())
-            self.settings.endGroup()
-            self.settings.sync()  # 确保设置立即保存
+            if self.isWindow():
+                self.settings.beginGroup("MainWindow_General")
+                self.settings.setValue("geometry", self.saveGeometry())
+                self.settings.setValue("windowState", self.saveState())
+                self.settings.endGroup()
+                self.settings.sync()  # 确保设置立即保存
         except Exception as e:
             print(f"保存窗口设置时出错: {str(e)}")
 
         super().closeEvent(event)
+        self.feedback_finished.emit(self.feedback_result or FeedbackResult(
+            interactive_feedback="",
+            attachments=[],
+        ))
+
+    def collect_spans(self) -> List[Dict[str, Any]]:
+        """取出本轮的阶段耗时（进程的第一轮还包括进程启动和 QApplication 初始化）"""
+        return timing.startup.drain() + self.spans.drain()
 
     def center_on_screen(self):
         """将窗口居中显示在屏幕上"""
@@ -1002,18 +1883,7 @@ class FeedbackUI(QMainWindow):
         self.move(x, y)
 
     def run(self) -> FeedbackResult:
-        # 先调用limitMaxHeight计算适当的窗口大小
-        self.limitMaxHeight()
-        
-        # 显示窗口前确保它居中
-        self.center_on_screen()
-        
-        # 显示窗口
-        self.show()
-        
-        # 再次调整窗口大小和位置，确保UI元素完全加载后的尺寸正确
-        QTimer.singleShot(100, lambda: (self.limitMaxHeight(), self.center_on_screen()))
-        
+        self.present()
         QApplication.instance().exec()
 
         if not self.feedback_result:
@@ -1025,60 +1895,22 @@ class FeedbackUI(QMainWindow):
         return self.feedback_result
 
     def limitMaxHeight(self):
-        """根据内容调整窗口大小，最大高度为900像素"""
-        # 获取屏幕尺寸
-        screen = QApplication.primaryScreen().geometry()
-        # 定义窗口最大高度（900像素或屏幕高度的80%，取较小值）
-        max_allowed_height = min(700, int(screen.height() * 0.7))
-        
-        # 直接设置一个固定的高度，确保所有元素都可见
-        # 此高度应该足够显示标题、反馈组和按钮，但不超过最大允许高度
-        base_height = 700  # 基础高度，根据实际内容调整
-        
-        # 添加预定义选项的额外高度
-        option_height = len(self.option_checkboxes) * 30 if self.option_checkboxes else 0
-        
-        # 根据提示文本长度估计额外高度
-        prompt_lines = len(self.prompt.split('\n'))
-        prompt_height = prompt_lines * 20  # 每行约20像素
-        
-        # 计算目标高度
-        target_height = base_height + option_height + prompt_height
-        
-        # 确保不超过最大允许高度
-        if target_height > max_allowed_height:
-            target_height = max_allowed_height
-        
-        # 确保至少有最小高度
-        min_height = 500
-        target_height = max(target_height, min_height)
-        
-        # 保持窗口宽度不变，只调整高度
-        self.resize(self.width(), target_height)
-        
-        # 打印调试信息
-        print(f"窗口调整高度: {target_height}px (基础:{base_height}, 选项:{option_height}, 提示:{prompt_height})")
+        """按内容的实际布局高度调整窗口，最高为屏幕可用高度的85%，超出部分在滚动区域内滚动"""
+        screen = QApplication.primaryScreen().availableGeometry()
+        # 滚动区域以外的部分（标题栏、按钮等）加上滚动内容的完整高度
+        chrome = self.centralWidget().sizeHint().height() - self.scroll_area.sizeHint().height()
+        target_height = chrome + self.content_widget.sizeHint().height() + 2 * self.scroll_area.frameWidth()
+        target_height = min(max(target_height, self.minimumHeight()), int(screen.height() * 0.85))
+        # 保持窗口宽度不变，只调整高度（嵌入时调整所在的窗口）
+        self.window().resize(self.window().width(), target_height)
 
     def paintEvent(self, event):
         """绘制自定义边框和圆角"""
-        painter = QPainter(self)
-        painter.setRenderHint(QPainter.Antialiasing)
-        
-        # 定义绘制区域
-        rect = self.rect()
-        path = QPainterPath()
-        path.addRoundedRect(rect, self.border_radius, self.border_radius)
-        
-        # 设置画笔（边框）
-        border_pen = QPen(QColor('#555555'))
-        border_pen.setWidth(1)
-        painter.setPen(border_pen)
-        
-        # 填充背景
-        painter.fillPath(path, QColor('#2d2d30'))
-        
-        # 绘制边框
-        painter.drawPath(path)
+        if self.spans.is_open("first_show"):
+            self.spans.end("first_show")
+            self.spans.begin("dwell")
+        if self.isWindow():
+            paint_window_frame(self, self.border_radius)
         
     def eventFilter(self, obj, event):
         """处理鼠标事件以实现窗口拖动"""
@@ -1090,7 +1922,8 @@ class FeedbackUI(QMainWindow):
             elif event.type() == QEvent.MouseMove:
                 if self.old_pos:
                     delta = QPoint(event.globalPosition().toPoint() - self.old_pos)
-                    self.move(self.pos() + delta)
+                    window = self.window()
+                    window.move(window.pos() + delta)
                     self.old_pos = event.globalPosition().toPoint()
                     return True
             elif event.type() == QEvent.MouseButtonRelease:
@@ -1099,34 +1932,453 @@ class FeedbackUI(QMainWindow):
                     return True
         return super().eventFilter(obj, event)
 
-def feedback_ui(prompt: str, predefined_options: Optional[List[str]] = None, output_file: Optional[str] = None) -> Optional[FeedbackResult]:
-    app = QApplication.instance() or QApplication()
+def format_wait(seconds: float) -> str:
+    seconds = max(0, int(seconds))
+    if seconds < 60:
+        return f"{seconds} 秒"
+    if seconds < 3600:
+        return f"{seconds // 60} 分 {seconds % 60} 秒"
+    return f"{seconds // 3600} 小时 {seconds % 3600 // 60} 分"
+
+class FeedbackQueueWindow(QMainWindow):
+    """常驻模式下唯一的反馈窗口：每个请求是一页 FeedbackUI，同时有多个请求时左侧列出
+    提问的客户端和已等待的时间，可以按任意顺序回答，回答后自动切换到下一个请求"""
+
+    SIDEBAR_WIDTH = 220
+
+    def __init__(self):
+        super().__init__(None, Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint)
+        self.setAttribute(Qt.WA_TranslucentBackground)
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        self.setWindowIcon(QIcon(os.path.join(script_dir, "images", "feedback.png")))
+        self.border_radius = 8
+        self.resize(650, 750)
+        self.setMinimumSize(500, 400)
+        # 请求ID -> {"page", "client", "asked_at", "summary"}，按到达顺序排列
+        self.entries: Dict[str, Dict[str, Any]] = {}
+
+        central_widget = QWidget()
+        central_widget.setObjectName("centralWidget")
+        self.setCentralWidget(central_widget)
+        layout = QHBoxLayout(central_widget)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(0)
+
+        self.sidebar = QWidget()
+        self.sidebar.setFixedWidth(self.SIDEBAR_WIDTH)
+        sidebar_layout = QVBoxLayout(self.sidebar)
+        sidebar_layout.setContentsMargins(12, 16, 0, 16)
+        sidebar_layout.setSpacing(8)
+        self.queue_title = QLabel()
+        self.queue_title.setObjectName("queueTitle")
+        sidebar_layout.addWidget(self.queue_title)
+        self.queue_list = QListWidget()
+        self.queue_list.setObjectName("queueList")
+        self.queue_list.setWordWrap(True)
+        self.queue_list.currentItemChanged.connect(self._on_current_changed)
+        sidebar_layout.addWidget(self.queue_list)
+        self.sidebar.setVisible(False)
+        layout.addWidget(self.sidebar)
+
+        self.stack = QStackedWidget()
+        layout.addWidget(self.stack, 1)
+        add_window_shadow(central_widget)
+
+        # 侧栏可见时每秒刷新等待时间
+        self.wait_timer = QTimer(self)
+        self.wait_timer.setInterval(1000)
+        self.wait_timer.timeout.connect(self._refresh_items)
+
+    def add_request(self, page: "FeedbackUI", request: Dict[str, Any]):
+        """加入一个请求；窗口中没有其他请求时直接显示，否则排在侧栏中，不打断正在回答的请求"""
+        prompt = request.get("prompt") or next((q.get("question", "") for q in request.get("questions") or []), "")
+        if not prompt and request.get("diff"):
+            prompt = "审阅补丁"
+        self.entries[page.request_id] = {
+            "page": page,
+            "client": request.get("client") or {},
+            "asked_at": request.get("asked_at") or time.time(),
+            "summary": prompt,
+        }
+        self.stack.addWidget(page)
+        item = QListWidgetItem()
+        item.setData(Qt.UserRole, page.request_id)
+        self.queue_list.addItem(item)
+        if len(self.entries) == 1:
+            self.queue_list.setCurrentItem(item)
+            self._present(page)
+        self._update_sidebar()
+
+    def remove_request(self, request_id: str):
+        """请求已回答或被取消；当前页被移除时切换到下一个客户端等待最久的请求"""
+        entry = self.entries.pop(request_id, None)
+        if entry is None:
+            return
+        was_current = self.stack.currentWidget() is entry["page"]
+        self.stack.removeWidget(entry["page"])
+        for row in range(self.queue_list.count()):
+            if self.queue_list.item(row).data(Qt.UserRole) == request_id:
+                self.queue_list.takeItem(row)
+                break
+        if not self.entries:
+            self.wait_timer.stop()
+            self.hide()
+            return
+        if was_current:
+            self._select(self._next_request(entry["client"]))
+        self._update_sidebar()
+
+    def _next_request(self, answered_client: Dict[str, Any]) -> str:
+        """轮到其他客户端：优先选择与刚回答的请求不同的客户端中等待最久的请求"""
+        ordered = sorted(self.entries, key=lambda request_id: self.entries[request_id]["asked_at"])
+        for request_id in ordered:
+            if self.entries[request_id]["client"] != answered_client:
+                return request_id
+        return ordered[0]
+
+    def _select(self, request_id: str):
+        for row in range(self.queue_list.count()):
+            if self.queue_list.item(row).data(Qt.UserRole) == request_id:
+                self.queue_list.setCurrentRow(row)
+                return
+
+    def _on_current_changed(self, current: Optional[QListWidgetItem], previous: Optional[QListWidgetItem]):
+        entry = self.entries.get(current.data(Qt.UserRole)) if current is not None else None
+        if entry is None:
+            return
+        self.stack.setCurrentWidget(entry["page"])
+        entry["page"].feedback_text.setFocus()
+
+    def _update_sidebar(self):
+        show = len(self.entries) > 1
+        if show != self.sidebar.isVisibleTo(self):
+            # 侧栏出现或收起时只改变宽度，回答区域大小不变
+            self.sidebar.setVisible(show)
+            delta = self.SIDEBAR_WIDTH if show else -self.SIDEBAR_WIDTH
+            self.setMinimumWidth(500 + (self.SIDEBAR_WIDTH if show else 0))
+            self.resize(self.width() + delta, self.height())
+        if show:
+            self.queue_title.setText(f"待回答 ({len(self.entries)})")
+            self._refresh_items()
+            if not self.wait_timer.isActive():
+                self.wait_timer.start()
+        else:
+            self.wait_timer.stop()
+
+    def _refresh_items(self):
+        now = time.time()
+        for row in range(self.queue_list.count()):
+            item = self.queue_list.item(row)
+            entry = self.entries[item.data(Qt.UserRole)]
+            client = entry["client"]
+            workspace = os.path.basename((client.get("workspace") or "").rstrip("/\\"))
+            source = " · ".join(part for part in (client.get("name"), workspace) if part) or "本地"
+            summary = entry["summary"].strip().split("\n", 1)[0]
+            if len(summary) > 40:
+                summary = summary[:40] + "…"
+            item.setText(f"{source}\n{summary}\n已等待 {format_wait(now - entry['asked_at'])}")
+            item.setToolTip(entry["summary"][:500])
+
+    def _present(self, page: "FeedbackUI"):
+        page.limitMaxHeight()
+        self.center_on_screen()
+        self.show()
+        self.raise_()
+        self.activateWindow()
+        page.feedback_text.setFocus()
+
+    def center_on_screen(self):
+        screen = QApplication.primaryScreen().geometry()
+        self.move((screen.width() - self.width()) // 2, (screen.height() - self.height()) // 2)
+
+    def closeEvent(self, event):
+        """关闭宿主窗口（Alt+F4 等）等同于关闭其中每个请求：各页回传空结果，不让请求一直等待"""
+        for entry in list(self.entries.values()):
+            entry["page"].close()
+        super().closeEvent(event)
+
+    def paintEvent(self, event):
+        paint_window_frame(self, self.border_radius)
+
+class AutoResponder(QObject):
+    """性能测试用的自动应答：窗口首次绘制后按配置填写反馈、勾选选项、添加附件并提交
+
+    配置示例：{"text": "好的", "options": [0], "attachments": ["a.png"], "delay_ms": 0, "remember": false, "hunks": "accepted"}，
+    options 为要勾选的选项序号，也可以是 "all"；remember 为 true 时相当于点击"总是这样回答"；
+    hunks 为补丁每块的决定，单个字符串对所有块生效。
+    """
+
+    def __init__(self, spec: Dict[str, Any]):
+        super().__init__()
+        self.spec = spec
+        self._waiting: set = set()
+
+    @classmethod
+    def from_config(cls, value: str) -> "AutoResponder":
+        if os.path.isfile(value):
+            with open(value, "r", encoding="utf-8") as f:
+                return cls(json.load(f))
+        return cls(json.loads(value))
+
+    def watch(self, window: "FeedbackUI"):
+        if window not in self._waiting:
+            self._waiting.add(window)
+            window.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and obj in self._waiting:
+            self._waiting.discard(obj)
+            obj.removeEventFilter(self)
+            timing.mark("ui_first_paint")
+            request_id = obj.request_id
+            QTimer.singleShot(int(self.spec.get("delay_ms", 0)), lambda: self._respond(obj, request_id))
+        return False
+
+    def _respond(self, window: "FeedbackUI", request_id: Optional[str]):
+        # 等待期间请求被取消、窗口已被复用于下一个请求时不再应答
+        if window.request_id != request_id or not window.isVisible():
+            return
+        window.feedback_text.setPlainText(self.spec.get("text", ""))
+        options = self.spec.get("options", [])
+        for index, checkbox in enumerate(window.option_checkboxes):
+            checkbox.setChecked(options == "all" or index in options)
+        for section in window.question_sections:
+            section.fill(options, self.spec.get("text", ""))
+        for path in self.spec.get("attachments", []):
+            window.attachments_manager.add_file(path)
+        if "hunks" in self.spec:
+            window.diff_view.set_decisions(self.spec["hunks"])
+        timing.mark("ui_submit")
+        window._submit_feedback(remember=bool(self.spec.get("remember")))
+
+_auto_responder: Optional[AutoResponder] = None
+
+def get_auto_responder() -> Optional[AutoResponder]:
+    """未配置 INTERACTIVE_FEEDBACK_AUTO_RESPOND 时返回 None"""
+    global _auto_responder
+    if _auto_responder is None and config.AUTO_RESPOND:
+        _auto_responder = AutoResponder.from_config(config.AUTO_RESPOND)
+    return _auto_responder
+
+def setup_fonts():
+    # 设置中文友好的字体
+    font_id = QFontDatabase.addApplicationFont("Microsoft YaHei")
+    if font_id != -1:
+        font_family = QFontDatabase.applicationFontFamilies(font_id)[0]
+    else:
+        # 回退使用系统默认字体
+        font_family = "微软雅黑, Microsoft YaHei, 宋体, SimSun, sans-serif"
+    
+    font = QFont(font_family, 10)
+    QApplication.setFont(font)
+
+def _init_application() -> QApplication:
+    app = QApplication.instance()
+    if app is None:
+        with timing.startup.span("qapplication_init"):
+            app = QApplication()
     app.setPalette(get_dark_mode_palette(app))
     app.setStyle("Fusion")
+    setup_fonts()
+    # 所有窗口共用一份样式表，只在这里解析一次，构建控件时不再单独设置样式
+    if app.styleSheet() != APP_STYLESHEET:
+        app.setStyleSheet(APP_STYLESHEET)
+    return app
+
+def feedback_ui(prompt: str, predefined_options: Optional[List[str]] = None, output_file: Optional[str] = None, image_options: Optional[Dict[str, Any]] = None,
+                deadline: Optional[float] = None, temp_dir: Optional[str] = None, questions: Optional[List[Dict[str, Any]]] = None,
+                client: Optional[Dict[str, Any]] = None, diff: Optional[str] = None) -> Optional[FeedbackResult]:
+    _init_application()
     ui = FeedbackUI(prompt, predefined_options)
+    ui.load_request(prompt, predefined_options, image_options, deadline, temp_dir, questions, client, diff)
     result = ui.run()
+    result["spans"] = ui.collect_spans()
+    # 立即销毁窗口：留到解释器退出时才回收，可能晚于 QApplication 被销毁而导致进程崩溃，
+    # 服务端会把非0的退出码当作失败
+    ui.deleteLater()
+    QApplication.sendPostedEvents(None, QEvent.DeferredDelete)
 
     if output_file and result:
-        # 确保目录存在
-        os.makedirs(os.path.dirname(output_file) if os.path.dirname(output_file) else ".", exist_ok=True)
-        # 将结果保存到输出文件
-        with open(output_file, "w") as f:
-            json.dump(result, f)
+        _write_output_file(output_file, result)
         return None
 
     return result
 
+def _write_output_file(output_file: str, result: FeedbackResult):
+    # 确保目录存在
+    os.makedirs(os.path.dirname(output_file) if os.path.dirname(output_file) else ".", exist_ok=True)
+    # 将结果保存到输出文件
+    with open(output_file, "w") as f:
+        json.dump(_to_json_result(result), f)
+
+def _to_json_result(result: FeedbackResult) -> Dict[str, Any]:
+    """转换为可写入JSON文件的格式（图片编码为base64数据URL）"""
+    attachments = []
+    for attachment in result.get("attachments") or []:
+        attachment = dict(attachment)
+        rendition = attachment.pop("rendition", None)
+        image_format = attachment.pop("rendition_format", "png")
+        if rendition:
+            attachment["data"] = f"data:image/{image_format};base64,{base64.b64encode(rendition).decode('utf-8')}"
+        attachments.append(attachment)
+    return {**result, "attachments": attachments}
+
+def _claim_protocol_output():
+    """独占原始标准输出用于协议帧，其余打印信息改写到标准错误"""
+    output = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+    return output
+
+class _RequestReader(QThread):
+    """在后台线程中读取标准输入上的请求帧"""
+    request_received = Signal(dict)
+
+    def __init__(self, stream, parent=None):
+        super().__init__(parent)
+        self.stream = stream
+
+    def run(self):
+        try:
+            while (message := ipc.read_message(self.stream)) is not None:
+                self.request_received.emit(message)
+        except (ipc.ProtocolError, ValueError) as e:
+            print(f"无效的请求: {e}", file=sys.stderr)
+
+class FeedbackDaemon(QObject):
+    """常驻的界面宿主：保持QApplication和唯一的反馈窗口，每个请求是其中的一页，页面预先构建并按请求复用"""
+
+    def __init__(self, app: QApplication, output):
+        super().__init__()
+        self.app = app
+        self.output = output
+        self.host = FeedbackQueueWindow()
+        self.idle_windows: List[FeedbackUI] = [self._build_window()]
+        self.active_windows: Dict[str, FeedbackUI] = {}
+
+        self.reader = _RequestReader(sys.stdin.buffer, self)
+        self.reader.request_received.connect(self._handle_request)
+        # 服务端关闭管道即表示退出
+        self.reader.finished.connect(self.app.quit)
+        self.reader.start()
+
+    def _build_window(self) -> FeedbackUI:
+        window = FeedbackUI(parent=self.host)
+        window.hide()
+        window.feedback_finished.connect(
+            lambda result, window=window: self._on_finished(window, result)
+        )
+        return window
+
+    def _handle_request(self, request: dict):
+        request_id = request.get("id")
+        if request.get("type") == "cancel":
+            self._cancel(request_id)
+            return
+
+        window = self.idle_windows.pop() if self.idle_windows else self._build_window()
+        window.request_id = request_id
+        self.active_windows[request_id] = window
+        window.load_request(
+            request.get("prompt", ""),
+            request.get("predefined_options"),
+            request.get("image_options"),
+            request.get("deadline"),
+            request.get("temp_dir"),
+            request.get("questions"),
+            request.get("client"),
+            request.get("diff"),
+        )
+        self.host.add_request(window, request)
+        window.present()
+
+    def _cancel(self, request_id: str):
+        """服务端取消了请求：关闭窗口且不回传结果"""
+        window = self.active_windows.pop(request_id, None)
+        if window is None:
+            return
+        window.close()
+        self.host.remove_request(request_id)
+        self._release(window)
+
+    def _on_finished(self, window: FeedbackUI, result: dict):
+        request_id = window.request_id
+        if self.active_windows.pop(request_id, None) is None:
+            return
+        ipc.write_result(self.output, request_id, {**result, "spans": window.collect_spans()})
+        timing.mark("ui_result_sent")
+        self.host.remove_request(request_id)
+        self._release(window)
+
+    def _release(self, window: FeedbackUI):
+        # 只保留一个空闲窗口，多余的释放掉
+        if self.idle_windows:
+            window.deleteLater()
+        else:
+            self.idle_windows.append(window)
+
+def run_daemon():
+    """以常驻模式运行：标准输入接收请求帧，标准输出返回结果帧"""
+    output = _claim_protocol_output()
+    app = _init_application()
+    app.setQuitOnLastWindowClosed(False)
+    daemon = FeedbackDaemon(app, output)
+    app.exec()
+    daemon.reader.wait(1000)
+
 if __name__ == "__main__":
+    timing.mark("ui_started")
+    # 从服务端创建进程到开始执行脚本（解释器启动和模块导入）
+    timing.record_process_launch()
     parser = argparse.ArgumentParser(description="运行反馈界面")
     parser.add_argument("--prompt", default="我已实现您请求的更改。", help="向用户展示的提示信息")
     parser.add_argument("--predefined-options", default="", help="预定义选项的管道分隔列表 (|||)")
-    parser.add_argument("--output-file", help="保存反馈结果为JSON的路径")
+    parser.add_argument("--output-file", help="保存反馈结果为JSON的路径（兼容旧版服务端）")
+    parser.add_argument("--stream-output", action="store_true", help="将反馈结果和附件内容以协议帧写到标准输出")
+    parser.add_argument("--request-stdin", action="store_true", help="从标准输入读取请求帧（提示和选项），不受命令行长度限制")
+    parser.add_argument("--daemon", action="store_true", help="以常驻进程模式运行，通过标准输入输出交换请求和结果")
+    parser.add_argument("--responder", help="按规则文件(.json)或回放日志(.jsonl)自动应答，不创建任何窗口")
     args = parser.parse_args()
 
-    predefined_options = [opt for opt in args.predefined_options.split("|||") if opt] if args.predefined_options else None
+    if args.daemon:
+        if args.responder:
+            serve_scripted(ScriptedResponder(args.responder), sys.stdin.buffer, _claim_protocol_output())
+        else:
+            run_daemon()
+        sys.exit(0)
+
+    protocol_output = _claim_protocol_output() if args.stream_output else None
+
+    if args.request_stdin:
+        request = ipc.read_message(sys.stdin.buffer) or {}
+        prompt = request.get("prompt", args.prompt)
+        predefined_options = request.get("predefined_options") or None
+        image_options = request.get("image_options")
+        deadline = request.get("deadline")
+        temp_dir = request.get("temp_dir")
+        questions = request.get("questions")
+        client = request.get("client")
+        diff = request.get("diff")
+    else:
+        prompt = args.prompt
+        predefined_options = [opt for opt in args.predefined_options.split("|||") if opt] if args.predefined_options else None
+        image_options = None
+        deadline = temp_dir = questions = client = diff = None
     
-    result = feedback_ui(args.prompt, predefined_options, args.output_file)
-    if result:
+    if args.responder:
+        responder = ScriptedResponder(args.responder)
+        result = responder.respond(prompt, predefined_options)
+        if questions:
+            result["answers"] = responder.respond_batch(questions)
+        if args.output_file:
+            _write_output_file(args.output_file, result)
+            result = None
+    else:
+        result = feedback_ui(prompt, predefined_options, args.output_file, image_options, deadline, temp_dir, questions, client, diff)
+    if result and protocol_output:
+        ipc.write_result(protocol_output, None, result)
+        timing.mark("ui_result_sent")
+    elif result:
         print(f"\n收到反馈:\n{result['interactive_feedback']}")
         if result.get('attachments') and len(result['attachments']) > 0:
             print(f"附件数量: {len(result['attachments'])}")
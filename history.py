@@ -0,0 +1,204 @@
+# 反馈历史：每轮的提示、回答和附件清单保存在本地 SQLite 数据库中，用 FTS5 全文索引检索
+# 服务端把记录放入队列后立即返回，后台线程攒成一批在一个事务中写入，提交耗时与历史大小无关；
+# 界面进程和 MCP 工具以只读方式查询。索引使用 trigram 分词，中文和代码片段都能按子串检索，
+# 不足三个字符的词改为在最近的记录中按 LIKE 匹配。
+import os
+import sys
+import json
+import time
+import queue
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+# 攒批：最多等待的时间（秒）和每批的最大条数
+FLUSH_INTERVAL_SECONDS = 0.5
+BATCH_SIZE = 200
+# 短词（少于三个字符，无法使用 trigram 索引）只在最近这么多条记录中查找，保证查询耗时有上限
+SHORT_TERM_WINDOW = 5000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rounds (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    project TEXT,
+    client TEXT,
+    mode TEXT,
+    prompt TEXT NOT NULL,
+    predefined_options TEXT,
+    answer TEXT NOT NULL,
+    attachments TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS rounds_project ON rounds(project, id);
+CREATE INDEX IF NOT EXISTS rounds_client ON rounds(client, id);
+CREATE VIRTUAL TABLE IF NOT EXISTS rounds_fts USING fts5(
+    prompt, answer, content='rounds', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS rounds_fts_insert AFTER INSERT ON rounds BEGIN
+    INSERT INTO rounds_fts(rowid, prompt, answer) VALUES (new.id, new.prompt, new.answer);
+END;
+CREATE TRIGGER IF NOT EXISTS rounds_fts_delete AFTER DELETE ON rounds BEGIN
+    INSERT INTO rounds_fts(rounds_fts, rowid, prompt, answer) VALUES ('delete', old.id, old.prompt, old.answer);
+END;
+"""
+
+_COLUMNS = "id, created, project, client, mode, prompt, predefined_options, answer, attachments, extra"
+
+
+def connect(path: str, readonly: bool = False) -> Optional[sqlite3.Connection]:
+    """打开历史数据库；只读打开时数据库还不存在则返回 None"""
+    if readonly:
+        if not os.path.exists(path):
+            return None
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+    # 多个服务端进程共用一个数据库，写入冲突时等待而不是报错
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+def _row(row: tuple) -> Dict[str, Any]:
+    record = dict(zip(_COLUMNS.split(", "), row))
+    for key in ("predefined_options", "attachments"):
+        record[key] = json.loads(record[key]) if record[key] else []
+    extra = record.pop("extra")
+    if extra:
+        record.update(json.loads(extra))
+    return record
+
+
+def _like(term: str) -> str:
+    return "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def search(conn: sqlite3.Connection, query: str = "", project: Optional[str] = None, limit: int = 20,
+           client: Optional[str] = None) -> List[Dict[str, Any]]:
+    """按空白分隔的关键词检索（所有词都要出现在提示或回答中），没有关键词时返回最近的记录；
+    project、client 不为空时只返回该项目、该客户端的记录"""
+    terms = query.split()
+    phrases = ['"' + term.replace('"', '""') + '"' for term in terms if len(term) >= 3]
+    short = [term for term in terms if len(term) < 3]
+    conditions: List[str] = []
+    params: List[Any] = []
+    if project:
+        conditions.append("r.project = ?")
+        params.append(project)
+    if client:
+        conditions.append("r.client = ?")
+        params.append(client)
+    for term in short:
+        conditions.append("(r.prompt LIKE ? ESCAPE '\\' OR r.answer LIKE ? ESCAPE '\\')")
+        params += [_like(term), _like(term)]
+    if phrases:
+        sql = (f"SELECT {', '.join('r.' + c for c in _COLUMNS.split(', '))} FROM rounds_fts "
+               "JOIN rounds r ON r.id = rounds_fts.rowid WHERE rounds_fts MATCH ?")
+        params.insert(0, " ".join(phrases))
+        # 按时间倒序，FTS5 可以按 rowid 倒序逐条产生匹配并在凑够 limit 条后停止；
+        # 按相关度（bm25）排序需要先为全部匹配打分，常见词在大库中要上百毫秒
+        order = "rounds_fts.rowid DESC"
+    else:
+        sql = f"SELECT {_COLUMNS} FROM rounds r WHERE 1"
+        order = "r.id DESC"
+        if short:
+            conditions.append("r.id > (SELECT coalesce(max(id), 0) FROM rounds) - ?")
+            params.append(SHORT_TERM_WINDOW)
+    for condition in conditions:
+        sql += " AND " + condition
+    sql += f" ORDER BY {order} LIMIT ?"
+    params.append(limit)
+    return [_row(row) for row in conn.execute(sql, params)]
+
+
+def count(conn: sqlite3.Connection) -> int:
+    return conn.execute("SELECT count(*) FROM rounds").fetchone()[0]
+
+
+class HistoryWriter:
+    """后台线程批量写入历史记录；record() 只把记录放入队列，不访问数据库"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.queue: "queue.Queue[Any]" = queue.Queue()
+        self.counters = {"recorded": 0, "written": 0, "batches": 0, "errors": 0}
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def record(self, prompt: str, answer: str, project: Optional[str] = None, client: Optional[str] = None,
+               mode: Optional[str] = None, predefined_options: Optional[List[str]] = None,
+               attachments: Optional[List[Dict[str, Any]]] = None, extra: Optional[Dict[str, Any]] = None):
+        self.counters["recorded"] += 1
+        self.queue.put((
+            time.time(), project, client, mode, prompt,
+            json.dumps(predefined_options or [], ensure_ascii=False), answer,
+            json.dumps(attachments or [], ensure_ascii=False),
+            json.dumps(extra, ensure_ascii=False) if extra else None,
+        ))
+        self.start()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+                self._thread.start()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待已放入队列的记录全部写入（查询前调用，保证能查到刚结束的一轮）"""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self.queue.put(None)
+            thread.join(timeout=5)
+
+    def _run(self):
+        conn = None
+        stopping = False
+        while not stopping:
+            item = self.queue.get()
+            batch, waiters = [], []
+            deadline = time.monotonic() + FLUSH_INTERVAL_SECONDS
+            while True:
+                if item is None:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                # 队列先进先出，等待者之前放入的记录都已在本批中：有人等待或攒够一批时立即写入，
+                # 否则等到攒批时间结束
+                if stopping or waiters or len(batch) >= BATCH_SIZE:
+                    break
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    if conn is None:
+                        conn = connect(self.path)
+                    with conn:
+                        conn.executemany(
+                            "INSERT INTO rounds (created, project, client, mode, prompt, predefined_options, answer, attachments, extra) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", batch,
+                        )
+                    self.counters["written"] += len(batch)
+                    self.counters["batches"] += 1
+                except sqlite3.Error as e:
+                    self.counters["errors"] += 1
+                    print(f"写入反馈历史失败: {e}", file=sys.stderr)
+            for waiter in waiters:
+                waiter.set()
+        if conn is not None:
+            conn.close()
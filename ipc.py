@@ -0,0 +1,220 @@
+# 界面进程与服务端之间的管道通信协议
+# 每一帧由 1 字节类型 + 4 字节大端长度 + 负载组成：
+#   J 帧：UTF-8 编码的 JSON 消息
+#   B 帧：附件的二进制数据块，长度为 0 的 B 帧表示该数据流结束
+#
+# 一次反馈结果按如下顺序发送，附件内容直接从磁盘分块写入管道，不经过临时文件：
+#   J {"type": "result", "id": ..., "interactive_feedback": ..., "attachment_count": N, "spans": [...],
+#      "remember": 用户是否点击了"总是这样回答", "answers": 批量提问时每个问题的回答或 null,
+#      "hunks": 请求带有补丁时每块的决定或 null}
+#   重复 N 次：
+#     J {"type": "attachment", "name": ..., "file_type": "image"|"file", "size": ...,
+#        "rendition_format": "jpeg"|"webp"|"png"|null}
+#     B ... B(空)        附件文件内容
+#     B ... B(空)        返回给模型的编码图片（仅当 rendition_format 不为空）
+import asyncio
+import contextlib
+import json
+import struct
+from typing import Any, AsyncIterator, BinaryIO, Callable, Dict, Optional, Tuple
+
+FRAME_HEADER = struct.Struct(">cI")
+MESSAGE = b"J"
+CHUNK = b"B"
+CHUNK_SIZE = 256 * 1024
+
+
+class ProtocolError(Exception):
+    """收到了不符合协议的帧"""
+
+
+class AttachmentStorageError(Exception):
+    """附件写入本地存储失败（如磁盘已满）；数据流已完整读完，只影响这一次请求"""
+
+
+def write_frame(stream: BinaryIO, kind: bytes, payload: bytes = b""):
+    stream.write(FRAME_HEADER.pack(kind, len(payload)))
+    if payload:
+        stream.write(payload)
+
+
+def write_message(stream: BinaryIO, message: Dict[str, Any]):
+    write_frame(stream, MESSAGE, json.dumps(message).encode("utf-8"))
+
+
+def write_bytes(stream: BinaryIO, data: bytes):
+    """以数据块形式写出一段内存数据，并写出结束帧"""
+    for offset in range(0, len(data), CHUNK_SIZE):
+        write_frame(stream, CHUNK, data[offset:offset + CHUNK_SIZE])
+    write_frame(stream, CHUNK)
+
+
+def write_file(stream: BinaryIO, path: str):
+    """分块读取文件写入管道，并写出结束帧"""
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            write_frame(stream, CHUNK, chunk)
+    write_frame(stream, CHUNK)
+
+
+def write_result(stream: BinaryIO, request_id: Optional[str], result: Dict[str, Any]):
+    """写出一次完整的反馈结果（包括附件内容）"""
+    attachments = result.get("attachments") or []
+    write_message(stream, {
+        "type": "result",
+        "id": request_id,
+        "interactive_feedback": result.get("interactive_feedback", ""),
+        "attachment_count": len(attachments),
+        "spans": result.get("spans") or [],
+        "remember": bool(result.get("remember")),
+        "answers": result.get("answers"),
+        "hunks": result.get("hunks"),
+    })
+    for attachment in attachments:
+        rendition = attachment.get("rendition")
+        write_message(stream, {
+            "type": "attachment",
+            "name": attachment["name"],
+            "file_type": attachment["type"],
+            "size": attachment["size"],
+            "rendition_format": attachment.get("rendition_format") if rendition else None,
+        })
+        try:
+            write_file(stream, attachment["path"])
+        except OSError:
+            # 文件在提交前被删除或无法读取，只发送一个空数据流
+            write_frame(stream, CHUNK)
+        if rendition:
+            write_bytes(stream, rendition)
+    stream.flush()
+
+
+def read_frame(stream: BinaryIO) -> Optional[Tuple[bytes, bytes]]:
+    """读取一帧，流结束时返回 None"""
+    header = stream.read(FRAME_HEADER.size)
+    if not header:
+        return None
+    if len(header) < FRAME_HEADER.size:
+        raise ProtocolError("帧头不完整")
+    kind, length = FRAME_HEADER.unpack(header)
+    payload = stream.read(length) if length else b""
+    if len(payload) < length:
+        raise ProtocolError("帧数据不完整")
+    return kind, payload
+
+
+def read_message(stream: BinaryIO) -> Optional[Dict[str, Any]]:
+    frame = read_frame(stream)
+    if frame is None:
+        return None
+    kind, payload = frame
+    if kind != MESSAGE:
+        raise ProtocolError(f"期望消息帧，收到 {kind!r}")
+    return json.loads(payload)
+
+
+async def read_frame_async(reader) -> Optional[Tuple[bytes, bytes]]:
+    """从 asyncio.StreamReader 读取一帧，流结束时返回 None"""
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise ProtocolError("帧头不完整") from e
+    kind, length = FRAME_HEADER.unpack(header)
+    try:
+        payload = await reader.readexactly(length) if length else b""
+    except asyncio.IncompleteReadError as e:
+        raise ProtocolError("帧数据不完整") from e
+    return kind, payload
+
+
+async def read_message_async(reader) -> Optional[Dict[str, Any]]:
+    frame = await read_frame_async(reader)
+    if frame is None:
+        return None
+    kind, payload = frame
+    if kind != MESSAGE:
+        raise ProtocolError(f"期望消息帧，收到 {kind!r}")
+    return json.loads(payload)
+
+
+async def read_chunks_async(reader) -> AsyncIterator[bytes]:
+    """逐块产出一段数据流，直到遇到结束帧"""
+    while True:
+        frame = await read_frame_async(reader)
+        if frame is None:
+            raise ProtocolError("数据流意外结束")
+        kind, payload = frame
+        if kind != CHUNK:
+            raise ProtocolError(f"期望数据帧，收到 {kind!r}")
+        if not payload:
+            return
+        yield payload
+
+
+async def _store_chunks(reader, open_attachment: Callable[[Dict[str, Any]], BinaryIO], meta: Dict[str, Any]) -> Optional[OSError]:
+    """把一个附件的数据流写入 open_attachment(meta)；写入失败时丢弃其余数据但仍读到数据流结束，
+    保持后续帧同步，返回写入时的错误"""
+    try:
+        writer = open_attachment(meta)
+    except OSError as e:
+        writer, error = None, e
+    else:
+        error = None
+    async for chunk in read_chunks_async(reader):
+        if writer is None:
+            continue
+        try:
+            writer.write(chunk)
+        except OSError as e:
+            error = e
+            with contextlib.suppress(OSError):
+                writer.__exit__(type(e), e, e.__traceback__)
+            writer = None
+    if writer is not None:
+        try:
+            writer.__exit__(None, None, None)
+        except OSError as e:
+            error = e
+    return error
+
+
+async def read_result_async(
+    reader,
+    header: Dict[str, Any],
+    open_attachment: Callable[[Dict[str, Any]], BinaryIO],
+) -> Dict[str, Any]:
+    """读取 result 消息之后的附件数据。
+
+    附件内容逐块写入 open_attachment(meta) 返回的文件对象，编码后的图片以 bytes 形式
+    放在附件信息的 rendition 字段中。
+    """
+    attachments = []
+    storage_error: Optional[OSError] = None
+    for _ in range(header.get("attachment_count", 0)):
+        meta = await read_message_async(reader)
+        if meta is None or meta.get("type") != "attachment":
+            raise ProtocolError("缺少附件信息")
+        storage_error = await _store_chunks(reader, open_attachment, meta) or storage_error
+        attachment = {
+            "name": meta["name"],
+            "type": meta["file_type"],
+            "size": meta["size"],
+        }
+        if meta.get("rendition_format"):
+            attachment["rendition"] = b"".join([chunk async for chunk in read_chunks_async(reader)])
+            attachment["rendition_format"] = meta["rendition_format"]
+        attachments.append(attachment)
+    if storage_error is not None:
+        raise AttachmentStorageError(f"保存附件失败: {storage_error}") from storage_error
+    result = {
+        "interactive_feedback": header.get("interactive_feedback", ""),
+        "attachments": attachments,
+        "remember": bool(header.get("remember")),
+    }
+    if header.get("answers") is not None:
+        result["answers"] = header["answers"]
+    if header.get("hunks") is not None:
+        result["hunks"] = header["hunks"]
+    return result
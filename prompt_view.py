@@ -0,0 +1,391 @@
+# 提示文本的按需渲染
+# Markdown 按行切分成块（围栏代码块、以空行分隔的段落/列表/标题等），只解析一次：
+# 首次显示只解析开头一段，其余在空闲时分批解析。每块单独用 QTextDocument 排版，
+# 只有滚动到可见区域的块才排版和绘制，排好版（含代码高亮）的块缓存在 LRU 中，
+# 未排版的块和尚未解析的部分按字符数/行数估计高度。
+import re
+import bisect
+import itertools
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from PySide6.QtWidgets import QAbstractScrollArea, QApplication, QFrame
+from PySide6.QtCore import Qt, QTimer, QRectF
+from PySide6.QtGui import (
+    QAbstractTextDocumentLayout, QColor, QFontDatabase, QFontMetricsF, QPainter,
+    QPalette, QSyntaxHighlighter, QTextCharFormat, QTextDocument, QTextOption
+)
+
+# 首次显示和之后每次空闲时解析的行数
+PARSE_CHUNK_LINES = 2000
+# 单个块的最大行数，超长的段落或代码块拆成多块，保证每次排版的量有上限
+MAX_BLOCK_LINES = 200
+# 缓存排好版的块数
+DOCUMENT_CACHE_SIZE = 256
+# 块之间的间距和代码块的内边距（像素）
+BLOCK_SPACING = 8
+CODE_PADDING = 8
+# 提示区域最多占屏幕可用高度的比例，更长的内容在区域内滚动
+MAX_HEIGHT_RATIO = 0.4
+
+CODE_BACKGROUND = QColor("#1e1e1e")
+CODE_FOREGROUND = QColor("#d4d4d4")
+
+_FENCE = re.compile(r"^ {0,3}(`{3,}|~{3,})\s*([\w#+.-]*)")
+
+
+class PromptBlock:
+    """一个渲染单位；continued 表示接着上一块（被拆开的长代码块），中间不留间距"""
+
+    __slots__ = ("kind", "text", "language", "continued", "lines", "chars")
+
+    def __init__(self, kind: str, lines: List[str], language: str = "", continued: bool = False):
+        self.kind = kind  # "code" 或 "markdown"
+        self.text = "\n".join(lines)
+        self.language = language
+        self.continued = continued
+        self.lines = len(lines)
+        self.chars = len(self.text)
+
+
+def parse_blocks(lines: List[str], start: int, stop: int, state: Dict) -> Iterator[PromptBlock]:
+    """解析 lines[start:stop]，未结束的块留在 state 中，下一批接着解析；stop 为 len(lines) 时输出全部剩余内容"""
+    buffer: List[str] = state.setdefault("buffer", [])
+    for line in itertools.islice(lines, start, stop):
+        fence = state.get("fence")
+        if fence is not None:
+            stripped = line.strip()
+            if stripped.startswith(fence) and stripped.strip(fence[0]) == "":
+                yield from _flush(state, "code")
+                state["fence"] = None
+                state["continued"] = False
+                continue
+            buffer.append(line)
+            if len(buffer) >= MAX_BLOCK_LINES:
+                yield from _flush(state, "code")
+                state["continued"] = True
+            continue
+        match = _FENCE.match(line)
+        if match:
+            yield from _flush(state, "markdown")
+            state["fence"] = match.group(1)
+            state["language"] = match.group(2).lower()
+            state["continued"] = False
+            continue
+        if not line.strip():
+            yield from _flush(state, "markdown")
+            continue
+        buffer.append(line)
+        if len(buffer) >= MAX_BLOCK_LINES:
+            yield from _flush(state, "markdown")
+    if stop >= len(lines):
+        # 没有闭合的代码块按代码显示到末尾
+        yield from _flush(state, "code" if state.get("fence") is not None else "markdown")
+
+
+def _flush(state: Dict, kind: str) -> Iterator[PromptBlock]:
+    buffer = state["buffer"]
+    if buffer:
+        if kind == "code":
+            yield PromptBlock("code", buffer, state.get("language", ""), state.get("continued", False))
+        else:
+            yield PromptBlock("markdown", buffer)
+        buffer.clear()
+
+
+# 代码高亮：按语言族选择关键字和注释写法，未知语言使用通用规则
+_KEYWORDS = {
+    "python": "and as assert async await break class continue def del elif else except False finally for from global "
+              "if import in is lambda None nonlocal not or pass raise return self True try while with yield",
+    "javascript": "as async await break case catch class const continue default delete do else enum export extends "
+                  "false finally for from function if implements import in instanceof interface let new null of "
+                  "private protected public return static super switch this throw true try type typeof undefined "
+                  "var void while yield",
+    "go": "break case chan const continue default defer else fallthrough false for func go goto if import interface "
+          "map nil package range return select struct switch true type var",
+    "rust": "as async await break const continue crate dyn else enum extern false fn for if impl in let loop match "
+            "mod move mut pub ref return self Self static struct super trait true type unsafe use where while",
+    "c": "auto bool break case catch char class const constexpr continue default delete do double else enum "
+         "explicit extends extern false final float for goto if implements import int interface long namespace new "
+         "null nullptr override package private protected public register return short signed sizeof static struct "
+         "super switch template this throw throws true try typedef typename union unsigned using var virtual void "
+         "volatile while",
+    "shell": "case do done elif else esac export fi for function if in local return select then until while",
+    "sql": "add all alter and as asc between by case create delete desc distinct drop else end exists from group "
+           "having in index inner insert into is join key left like limit not null on or order outer primary "
+           "references right select set table then union unique update values when where with",
+}
+_LANGUAGE_ALIASES = {
+    "py": "python", "python3": "python", "js": "javascript", "jsx": "javascript", "ts": "javascript",
+    "tsx": "javascript", "typescript": "javascript", "json": "javascript", "golang": "go", "rs": "rust",
+    "cpp": "c", "c++": "c", "cc": "c", "h": "c", "hpp": "c", "cs": "c", "csharp": "c", "java": "c",
+    "kotlin": "c", "kt": "c", "swift": "c", "scala": "c", "sh": "shell", "bash": "shell", "zsh": "shell",
+    "console": "shell", "ps1": "shell", "powershell": "shell",
+}
+_HASH_COMMENT_LANGUAGES = {"python", "shell", "yaml", "yml", "toml", "ruby", "rb", "perl", "r", "dockerfile", "makefile"}
+
+
+def _format(color: str, italic: bool = False) -> QTextCharFormat:
+    fmt = QTextCharFormat()
+    fmt.setForeground(QColor(color))
+    fmt.setFontItalic(italic)
+    return fmt
+
+
+class CodeHighlighter(QSyntaxHighlighter):
+    """基于正则的轻量代码高亮（关键字、字符串、数字、注释）"""
+
+    _rules_cache: Dict[str, List[Tuple["re.Pattern", QTextCharFormat]]] = {}
+
+    def __init__(self, document: QTextDocument, language: str):
+        self.language = _LANGUAGE_ALIASES.get(language, language)
+        self.rules = self._rules(self.language)
+        self.block_comment = self.language not in _HASH_COMMENT_LANGUAGES and self.language != "sql"
+        self.comment_format = _format("#6a9955", italic=True)
+        super().__init__(document)
+
+    @classmethod
+    def _rules(cls, language: str) -> List[Tuple["re.Pattern", QTextCharFormat]]:
+        if language not in cls._rules_cache:
+            words = _KEYWORDS.get(language) or " ".join(_KEYWORDS.values())
+            flags = re.IGNORECASE if language == "sql" else 0
+            if language in _HASH_COMMENT_LANGUAGES:
+                comment = r"#.*$"
+            elif language == "sql":
+                comment = r"--.*$"
+            else:
+                comment = r"//.*$"
+            cls._rules_cache[language] = [
+                (re.compile(r"\b(?:" + "|".join(sorted(set(words.split()))) + r")\b", flags), _format("#569cd6")),
+                (re.compile(r"\b(?:0[xX][0-9a-fA-F]+|\d+(?:\.\d+)?)\b"), _format("#b5cea8")),
+                (re.compile(r"\"(?:[^\"\\]|\\.)*\"|'(?:[^'\\]|\\.)*'|`(?:[^`\\]|\\.)*`"), _format("#ce9178")),
+                (re.compile(comment), _format("#6a9955", italic=True)),
+            ]
+        return cls._rules_cache[language]
+
+    def highlightBlock(self, text: str):
+        # 后面的规则覆盖前面的：字符串中的关键字按字符串着色，注释覆盖一切
+        for pattern, fmt in self.rules:
+            for match in pattern.finditer(text):
+                self.setFormat(match.start(), match.end() - match.start(), fmt)
+        if not self.block_comment:
+            return
+        # /* ... */ 可以跨行，用块状态记录是否仍在注释中
+        self.setCurrentBlockState(0)
+        continued = self.previousBlockState() == 1
+        start = 0 if continued else text.find("/*")
+        search = 0 if continued else start + 2
+        while start >= 0:
+            end = text.find("*/", search)
+            if end < 0:
+                self.setCurrentBlockState(1)
+                self.setFormat(start, len(text) - start, self.comment_format)
+                break
+            self.setFormat(start, end + 2 - start, self.comment_format)
+            start = text.find("/*", end + 2)
+            search = start + 2
+
+
+class PromptView(QAbstractScrollArea):
+    """只排版和绘制可见块的 Markdown 提示区域，高度随内容增长，超过上限后在区域内滚动"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setObjectName("promptView")
+        self.setFrameShape(QFrame.NoFrame)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.viewport().setAutoFillBackground(False)
+        self.code_font = QFontDatabase.systemFont(QFontDatabase.FixedFont)
+        self.code_font.setPointSizeF(max(self.font().pointSizeF() - 1, 8))
+
+        self.text = ""
+        self.blocks: List[PromptBlock] = []
+        self.heights: List[float] = []  # 每块的高度（含间距），未排版的块为估计值
+        self.exact: List[bool] = []
+        self._offsets: Optional[List[float]] = None  # 各块顶部的位置，heights 变化后重新累加
+        self._documents: "OrderedDict[int, QTextDocument]" = OrderedDict()
+        # 增量解析的进度
+        self._lines: List[str] = []
+        self._parsed_lines = 0
+        self._parse_state: Dict = {}
+        self._parse_timer = QTimer(self)
+        self._parse_timer.setInterval(0)
+        self._parse_timer.timeout.connect(self._parse_more)
+
+    def set_text(self, text: str):
+        """显示新的提示：丢弃旧的块和缓存，只同步解析开头一段"""
+        self.verticalScrollBar().setValue(0)
+        if text is self.text:
+            return
+        self._parse_timer.stop()
+        self.text = text
+        self.blocks, self.heights, self.exact = [], [], []
+        self._offsets = None
+        self._documents.clear()
+        self._lines = text.splitlines()
+        self._parsed_lines = 0
+        self._parse_state = {}
+        self._parse_more()
+
+    def _parse_more(self):
+        stop = min(self._parsed_lines + PARSE_CHUNK_LINES, len(self._lines))
+        width = self._text_width()
+        for block in parse_blocks(self._lines, self._parsed_lines, stop, self._parse_state):
+            self.blocks.append(block)
+            self.heights.append(self._estimate(len(self.blocks) - 1, width))
+            self.exact.append(False)
+        self._parsed_lines = stop
+        self._offsets = None
+        if stop < len(self._lines):
+            self._parse_timer.start()
+        else:
+            self._parse_timer.stop()
+            self._lines = []
+        self._update_geometry()
+        self.viewport().update()
+
+    def parsing(self) -> bool:
+        return self._parse_timer.isActive()
+
+    # ---- 高度 ----
+
+    def _text_width(self) -> float:
+        return max(float(self.viewport().width() - 2), 50.0)
+
+    def _estimate(self, index: int, width: float) -> float:
+        """按行数和字符数估计块的高度，不需要排版"""
+        block = self.blocks[index]
+        if block.kind == "code":
+            metrics = QFontMetricsF(self.code_font)
+            wrapped = block.chars * metrics.averageCharWidth() / max(width - 2 * CODE_PADDING, 1)
+            body = max(block.lines, wrapped) * metrics.lineSpacing() + 2 * CODE_PADDING
+        else:
+            metrics = QFontMetricsF(self.font())
+            wrapped = block.chars * metrics.averageCharWidth() / width
+            body = (block.lines + int(wrapped)) * metrics.lineSpacing()
+        return self._spacing(index) + body
+
+    def _spacing(self, index: int) -> float:
+        return 0 if index == 0 or self.blocks[index].continued else BLOCK_SPACING
+
+    def offsets(self) -> List[float]:
+        if self._offsets is None:
+            self._offsets = [0.0, *itertools.accumulate(self.heights)]
+        return self._offsets
+
+    def content_height(self) -> float:
+        """已解析部分的高度加上尚未解析的行的估计高度"""
+        pending = len(self._lines) - self._parsed_lines if self._lines else 0
+        return self.offsets()[-1] + pending * QFontMetricsF(self.font()).lineSpacing()
+
+    def _update_geometry(self):
+        screen = QApplication.primaryScreen()
+        cap = screen.availableGeometry().height() * MAX_HEIGHT_RATIO if screen else 400
+        total = self.content_height()
+        height = int(min(total, cap)) + 2 * self.frameWidth()
+        if height != self.height():
+            self.setFixedHeight(height)
+        bar = self.verticalScrollBar()
+        bar.setRange(0, max(0, int(total) - self.viewport().height()))
+        bar.setPageStep(self.viewport().height())
+        bar.setSingleStep(int(QFontMetricsF(self.font()).lineSpacing()) * 3)
+
+    # ---- 排版与绘制 ----
+
+    def _document(self, index: int) -> QTextDocument:
+        """取出排好版的块，必要时新建并放入 LRU 缓存"""
+        width = self._text_width()
+        document = self._documents.get(index)
+        if document is None:
+            block = self.blocks[index]
+            document = QTextDocument()
+            document.setDocumentMargin(0)
+            if block.kind == "code":
+                document.setDefaultFont(self.code_font)
+                option = QTextOption()
+                option.setWrapMode(QTextOption.WrapAtWordBoundaryOrAnywhere)
+                document.setDefaultTextOption(option)
+                document.setPlainText(block.text)
+                document.highlighter = CodeHighlighter(document, block.language)
+                # 高亮器默认推迟到下一轮事件循环，块马上就要绘制，直接高亮
+                document.highlighter.rehighlight()
+            else:
+                document.setDefaultFont(self.font())
+                document.setMarkdown(block.text, QTextDocument.MarkdownDialectGitHub)
+            self._documents[index] = document
+            if len(self._documents) > DOCUMENT_CACHE_SIZE:
+                self._documents.popitem(last=False)
+        else:
+            self._documents.move_to_end(index)
+        padding = 2 * CODE_PADDING if self.blocks[index].kind == "code" else 0
+        if document.textWidth() != width - padding:
+            document.setTextWidth(width - padding)
+        return document
+
+    def _layout_visible(self, top: float, bottom: float) -> int:
+        """为可见的块排版并把估计高度换成实际高度，返回第一个可见块的序号"""
+        offsets = self.offsets()
+        first = max(0, bisect.bisect_right(offsets, top) - 1)
+        y = offsets[first]
+        index = first
+        changed = False
+        while index < len(self.blocks) and y < bottom:
+            if not self.exact[index]:
+                document = self._document(index)
+                padding = 2 * CODE_PADDING if self.blocks[index].kind == "code" else 0
+                self.heights[index] = self._spacing(index) + document.size().height() + padding
+                self.exact[index] = True
+                changed = True
+            y += self.heights[index]
+            index += 1
+        if changed:
+            self._offsets = None
+            self._update_geometry()
+        return first
+
+    def paintEvent(self, event):
+        if not self.blocks:
+            return
+        top = float(self.verticalScrollBar().value())
+        bottom = top + self.viewport().height()
+        first = self._layout_visible(top, bottom)
+        offsets = self.offsets()
+        painter = QPainter(self.viewport())
+        painter.setRenderHint(QPainter.Antialiasing)
+        context = QAbstractTextDocumentLayout.PaintContext()
+        context.palette = self.palette()
+        context.palette.setColor(QPalette.Text, self.palette().color(QPalette.WindowText))
+        code_context = QAbstractTextDocumentLayout.PaintContext()
+        code_context.palette = self.palette()
+        code_context.palette.setColor(QPalette.Text, CODE_FOREGROUND)
+        width = self._text_width()
+        index = first
+        while index < len(self.blocks) and offsets[index] < bottom:
+            block = self.blocks[index]
+            y = offsets[index] + self._spacing(index) - top
+            height = self.heights[index] - self._spacing(index)
+            document = self._document(index)
+            painter.save()
+            if block.kind == "code":
+                painter.fillRect(QRectF(0, y, width, height), CODE_BACKGROUND)
+                painter.translate(CODE_PADDING, y + CODE_PADDING)
+                document.documentLayout().draw(painter, code_context)
+            else:
+                painter.translate(0, y)
+                document.documentLayout().draw(painter, context)
+            painter.restore()
+            index += 1
+        painter.end()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if event.oldSize().width() != event.size().width():
+            # 宽度变化后所有块需要重新排版，先换回估计高度，可见的块在绘制时重新计算
+            width = self._text_width()
+            self.heights = [self._estimate(i, width) for i in range(len(self.blocks))]
+            self.exact = [False] * len(self.blocks)
+            self._offsets = None
+        self._update_geometry()
+
+    def scrollContentsBy(self, dx: int, dy: int):
+        self.viewport().update()
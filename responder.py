@@ -0,0 +1,169 @@
+# 脚本化应答：不创建任何窗口，按规则文件或回放日志自动回答反馈请求，用于CI和压力测试
+#
+# 规则文件（.json），按顺序匹配第一条 match 正则命中提示的规则，都不命中时使用 default：
+#   {
+#     "rules": [
+#       {"match": "是否继续", "options": ["继续"], "text": "", "attachments": ["shot.png"], "delay_ms": 0, "hunks": "accepted"}
+#     ],
+#     "default": {"text": "好的"}
+#   }
+#   options 中的整数表示选项序号，字符串表示匹配选项文字的正则；attachments 的相对路径相对于规则文件所在目录；
+#   hunks 是提示带有补丁时每块的决定（accepted/rejected/undecided），单个字符串对所有块生效。
+#
+# 回放日志（.jsonl），每行一轮：{"prompt": ..., "interactive_feedback": ..., "attachments": [路径, ...]}
+#   提示完全相同的记录优先（多条时轮流使用），否则按日志顺序循环回放。
+#   设置 INTERACTIVE_FEEDBACK_RECORD_LOG 后服务端会把每轮真实反馈按这个格式记录下来。
+import os
+import re
+import json
+import uuid
+import time
+import itertools
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+
+import ipc
+
+IMAGE_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp']
+
+
+def compose_feedback(selected_options: List[str], feedback_text: str) -> str:
+    """把选中的预定义选项和文字反馈组合成返回给模型的文本"""
+    parts = []
+    if selected_options:
+        parts.append("选中选项: " + "; ".join(selected_options))
+    if feedback_text:
+        parts.append(feedback_text)
+    return "\n\n".join(parts)
+
+
+def pick_options(wanted: List[Any], predefined_options: List[str]) -> List[str]:
+    """按序号（整数）或匹配选项文字的正则（字符串）选出预定义选项"""
+    selected = []
+    for index, option in enumerate(predefined_options):
+        for choice in wanted:
+            if (isinstance(choice, int) and choice == index) or (
+                isinstance(choice, str) and re.search(choice, option)
+            ):
+                selected.append(option)
+                break
+    return selected
+
+
+def file_attachment(path: str) -> Optional[Dict[str, Any]]:
+    """按界面中添加文件附件时相同的格式描述一个文件，文件不存在时返回 None"""
+    path = os.path.normpath(path)
+    if not os.path.isfile(path):
+        return None
+    name = os.path.basename(path)
+    return {
+        'id': str(uuid.uuid4()),
+        'name': name,
+        'path': path,
+        'type': 'image' if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS else 'file',
+        'size': os.path.getsize(path),
+    }
+
+
+class ScriptedResponder:
+    """从规则文件或回放日志生成与 FeedbackUI 相同结构的反馈结果"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.base_dir = os.path.dirname(os.path.abspath(path))
+        self.rules: List[Dict[str, Any]] = []
+        self.default: Dict[str, Any] = {}
+        self.by_prompt: Dict[str, Iterator[Dict[str, Any]]] = {}
+        self.sequence: Optional[Iterator[Dict[str, Any]]] = None
+
+        if path.endswith(".jsonl"):
+            self._load_replay(path)
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                spec = json.load(f)
+            for rule in spec.get("rules", []):
+                self.rules.append({**rule, "pattern": re.compile(rule.get("match", ""), re.S)})
+            self.default = spec.get("default", {})
+
+    def _load_replay(self, path: str):
+        with open(path, "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for record in records:
+            grouped.setdefault(record.get("prompt", ""), []).append(record)
+        self.by_prompt = {prompt: itertools.cycle(items) for prompt, items in grouped.items()}
+        self.sequence = itertools.cycle(records) if records else None
+
+    def _select(self, prompt: str) -> Dict[str, Any]:
+        if self.sequence is not None:
+            answers = self.by_prompt.get(prompt)
+            return next(answers) if answers is not None else next(self.sequence)
+        for rule in self.rules:
+            if rule["pattern"].search(prompt):
+                return rule
+        return self.default
+
+    def delay_seconds(self, prompt: str) -> float:
+        """规则中配置的模拟思考时间（回放日志没有延迟）"""
+        if self.sequence is not None:
+            return 0.0
+        return self._select(prompt).get("delay_ms", 0) / 1000
+
+    def respond(self, prompt: str, predefined_options: Optional[List[str]] = None) -> Dict[str, Any]:
+        answer = self._select(prompt)
+        if "interactive_feedback" in answer:
+            feedback = answer["interactive_feedback"]
+        else:
+            selected = pick_options(answer.get("options", []), predefined_options or [])
+            feedback = compose_feedback(selected, answer.get("text", ""))
+        attachments = []
+        for path in answer.get("attachments", []):
+            attachment = file_attachment(os.path.join(self.base_dir, path))
+            if attachment is not None:
+                attachments.append(attachment)
+        result = {"interactive_feedback": feedback, "attachments": attachments}
+        if "hunks" in answer:
+            result["hunks"] = answer["hunks"]
+        return result
+
+    def respond_batch(self, questions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """批量提问时逐个问题应答（不含附件），格式与界面中每个问题的回答相同"""
+        answers = []
+        for question in questions:
+            answer = self._select(question.get("question", ""))
+            if "interactive_feedback" in answer:
+                selected, text = [], answer["interactive_feedback"]
+            else:
+                selected = pick_options(answer.get("options", []), question.get("predefined_options") or [])
+                text = answer.get("text", "")
+            answers.append({
+                "question": question.get("question", ""),
+                "selected_options": selected,
+                "text": text,
+                "interactive_feedback": compose_feedback(selected, text),
+            })
+        return answers
+
+
+def append_replay(path: str, prompt: str, predefined_options: List[str], feedback: str, attachment_paths: List[str]):
+    """按回放日志的格式追加一轮真实反馈"""
+    record = {
+        "prompt": prompt,
+        "predefined_options": predefined_options,
+        "interactive_feedback": feedback,
+        "attachments": attachment_paths,
+    }
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def serve(responder: ScriptedResponder, requests: BinaryIO, output: BinaryIO):
+    """按常驻界面进程的协议逐个应答请求（feedback_ui.py --daemon --responder）"""
+    while (request := ipc.read_message(requests)) is not None:
+        if request.get("type") != "request":
+            continue
+        prompt = request.get("prompt", "")
+        time.sleep(responder.delay_seconds(prompt))
+        result = responder.respond(prompt, request.get("predefined_options"))
+        if request.get("questions"):
+            result["answers"] = responder.respond_batch(request["questions"])
+        ipc.write_result(output, request.get("id"), result)
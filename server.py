@@ -5,130 +5,798 @@
 import os
 import sys
 import json
-import tempfile
-import subprocess
+import time
+import atexit
+import asyncio
 import shutil
+import weakref
+import argparse
+from urllib.parse import quote, unquote, urlparse
 from pathlib import Path
+from contextlib import asynccontextmanager
 
-from typing import Annotated, Dict, List, Optional, Any
+from typing import Annotated, List, Optional, Any
 
-from fastmcp import FastMCP
+from fastmcp import Context, FastMCP, Image
+from mcp.types import ClientCapabilities, RootsCapability, TextContent
 from pydantic import Field
 
+import ipc
+import config
+import history
+import timing
+from answer_cache import AnswerCache
+from client_queue import FairQueue
+from attachment_store import AttachmentStore, StoreSession, read_range
+from responder import ScriptedResponder, append_replay
+from storage_gc import GarbageCollector
+from unified_diff import extract_diff, parse_diff, review_result
+
+# 附件目录在首次写入附件时才创建，启动时不做任何文件系统操作
+attachment_store = AttachmentStore(config.ATTACHMENTS_DIR)
+
+# 附件库和临时目录的垃圾回收在后台线程中增量进行
+garbage_collector = GarbageCollector(
+    attachment_store,
+    temp_dirs=[config.TEMP_DIR, attachment_store.tmp_dir],
+    max_age_seconds=config.GC_MAX_AGE_DAYS * 86400,
+    max_bytes=config.GC_MAX_SIZE,
+    interval_seconds=config.GC_INTERVAL_SECONDS,
+    batch_size=config.GC_BATCH_SIZE,
+)
+
+# HTTP 传输下每个客户端会话都会进入一次 lifespan：回收只启动一次，
+# 常驻服务不因某个客户端断开而收尾（stdio 只有一个会话，会话结束即进程退出）
+shared_server = False
+_live_sessions = 0
+_gc_handle: asyncio.TimerHandle | None = None
+
+@asynccontextmanager
+async def server_lifespan(server: FastMCP):
+    global _live_sessions, _gc_handle
+    if _gc_handle is None:
+        # 服务开始处理请求之后才延迟启动回收，不拖慢MCP握手
+        _gc_handle = asyncio.get_running_loop().call_later(
+            config.GC_STARTUP_DELAY_SECONDS, garbage_collector.start
+        )
+    _live_sessions += 1
+    try:
+        yield {}
+    finally:
+        _live_sessions -= 1
+        if _live_sessions == 0 and not shared_server:
+            _gc_handle.cancel()
+            garbage_collector.stop()
+            if history_writer is not None:
+                history_writer.stop()
+            # 关闭仍在等待回答的窗口
+            for ticket in list(tickets.values()):
+                ticket.task.cancel()
+
 # The log_level is necessary for Cline to work: https://github.com/jlowin/fastmcp/issues/81
-mcp = FastMCP("Interactive Feedback MCP", log_level="ERROR")
+mcp = FastMCP("Interactive Feedback MCP", log_level="ERROR", lifespan=server_lifespan)
 
-# 确保附件目录存在
 script_dir = os.path.dirname(os.path.abspath(__file__))
-attachments_dir = os.path.join(script_dir, "attachments")
-os.makedirs(attachments_dir, exist_ok=True)
-
-# 临时文件清理
-def cleanup_temp_files():
-    """清理临时目录中的过期文件"""
-    temp_dir = os.path.join(os.path.expanduser("~"), ".interactive_feedback_temp")
-    if os.path.exists(temp_dir):
-        try:
-            # 删除7天前的临时文件
-            import time
-            current_time = time.time()
-            for item in os.listdir(temp_dir):
-                item_path = os.path.join(temp_dir, item)
-                if os.path.isfile(item_path):
-                    # 获取文件修改时间
-                    file_time = os.path.getmtime(item_path)
-                    # 如果文件超过7天未修改，删除它
-                    if current_time - file_time > 7 * 86400:  # 7天的秒数
-                        os.remove(item_path)
-        except Exception as e:
-            print(f"清理临时文件时出错: {e}")
-
-# 启动时清理临时文件
-cleanup_temp_files()
-
-def launch_feedback_ui(summary: str, predefinedOptions: list[str] | None = None) -> dict[str, Any]:
-    # Create a temporary file for the feedback result
-    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
-        output_file = tmp.name
 
+async def receive_result(reader: asyncio.StreamReader, header: dict[str, Any]) -> dict[str, Any]:
+    """读取 result 消息之后的附件数据流，附件按内容去重存入附件库；
+    本地存储出错（如磁盘已满）时仍读完数据流，抛出只影响这次请求的 ipc.AttachmentStorageError"""
+    spans = timing.SpanRecorder()
     try:
-        # Get the path to feedback_ui.py relative to this script
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        feedback_ui_path = os.path.join(script_dir, "feedback_ui.py")
+        session: StoreSession | None = attachment_store.new_session()
+        open_attachment = session.open
+    except OSError as e:
+        # 没有附件的结果不受影响，有附件时在读完数据流后报错
+        session = None
+        def open_attachment(meta: dict[str, Any], error: OSError = e):
+            raise error
+    with spans.span("server_read"):
+        result = await ipc.read_result_async(reader, header, open_attachment)
+    with spans.span("attachment_commit"):
+        try:
+            if session is not None:
+                finish_session(session, result)
+        except OSError as e:
+            raise ipc.AttachmentStorageError(f"保存附件失败: {e}") from e
+    # 界面进程记录的阶段在 result 消息中一并传回
+    result["spans"] = (header.get("spans") or []) + spans.drain()
+    return result
+
+def finish_session(session: StoreSession, result: dict[str, Any]):
+    """写出会话清单并登记回收；附件内容只通过资源按需读取，结果中只保留元数据和资源URI"""
+    session.commit()
+    garbage_collector.record_session(session)
+    for attachment, entry in zip(result["attachments"], session.entries):
+        attachment["name"] = entry["name"]
+        attachment["uri"] = attachment_uri(session.session_id, entry["name"])
+        attachment["mime_type"] = entry["mime_type"]
+    result["session_dir"] = session.session_dir
+
+def attachment_uri(session_id: str, name: str) -> str:
+    return f"attachment://{session_id}/{quote(name, safe='')}"
+
+# 每个会话最近一次刷新访问时间的时刻，避免分段读取大文件时频繁写回收日志
+_session_touches: dict[str, float] = {}
+
+def touch_session(session_id: str):
+    now = time.monotonic()
+    if now - _session_touches.get(session_id, float("-inf")) >= 60:
+        _session_touches[session_id] = now
+        garbage_collector.touch_session(session_id)
+
+async def load_attachment(session: str, name: str, offset: int = 0, length: int | None = None) -> bytes:
+    entry = attachment_store.find_attachment(session, name)
+    if entry is None:
+        raise FileNotFoundError(f"附件不存在: {session}/{name}")
+    if offset < 0 or (length is not None and length < 0):
+        raise ValueError("offset 和 length 不能为负数")
+    touch_session(session)
+    return await asyncio.to_thread(read_range, entry["path"], offset, length)
+
+class FeedbackDaemonClient:
+    """常驻界面进程（feedback_ui.py --daemon）的异步客户端，首次使用时才启动"""
+
+    def __init__(self, feedback_ui_path: str):
+        self.feedback_ui_path = feedback_ui_path
+        self.process: asyncio.subprocess.Process | None = None
+        self.reader_task: asyncio.Task | None = None
+        # 每个常驻进程各自的等待者（请求ID -> future），进程退出时只影响发给它的请求
+        self.pending: dict[asyncio.subprocess.Process, dict[str, asyncio.Future]] = {}
+        self.start_lock = asyncio.Lock()
+
+    async def _ensure_started(self) -> asyncio.subprocess.Process:
+        async with self.start_lock:
+            if self.process is None or self.process.returncode is not None:
+                self.process = await asyncio.create_subprocess_exec(
+                    sys.executable, "-u", self.feedback_ui_path, "--daemon",
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL,
+                    close_fds=True,
+                    env=timing.child_env(),
+                )
+                self.pending[self.process] = {}
+                self.reader_task = asyncio.create_task(self._read_responses(self.process, self.pending[self.process]))
+        return self.process
+
+    async def _read_responses(self, process: asyncio.subprocess.Process, pending: dict[str, asyncio.Future]):
+        """把常驻进程返回的结果分发给对应的等待者；读取结束时（包括意外的异常）该进程的所有等待者都会收到 ConnectionError"""
+        error = ConnectionError("常驻界面进程已退出")
+        try:
+            while (message := await ipc.read_message_async(process.stdout)) is not None:
+                if message.get("type") != "result":
+                    continue
+                # 即使请求已被取消也要读完附件数据，保持数据流同步
+                try:
+                    result = await receive_result(process.stdout, message)
+                except ipc.AttachmentStorageError as e:
+                    result = e
+                future = pending.pop(message.get("id"), None)
+                if future is None or future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        except (OSError, ValueError, ipc.ProtocolError) as e:
+            error = ConnectionError(f"常驻界面进程通信失败: {e}")
+        finally:
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            pending.clear()
+            self.pending.pop(process, None)
+
+    async def _send(self, process: asyncio.subprocess.Process, message: dict[str, Any]):
+        ipc.write_message(process.stdin, message)
+        await process.stdin.drain()
+    async def request(self, request: dict[str, Any]) -> dict[str, Any]:
+        """发送一次反馈请求（ui_request 生成）并等待结果，进程异常时抛出 ConnectionError"""
+        process = await self._ensure_started()
+        pending = self.pending.get(process)
+        if pending is None:
+            raise ConnectionError("常驻界面进程已退出")
+        request_id = request["id"]
+        future = asyncio.get_running_loop().create_future()
+        pending[request_id] = future
+        try:
+            await self._send(process, {"type": "request", **request})
+            return await future
+        except OSError as e:
+            raise ConnectionError(f"常驻界面进程通信失败: {e}") from e
+        except asyncio.CancelledError:
+            # 客户端取消了调用，关闭对应的窗口
+            try:
+                await self._send(process, {"type": "cancel", "id": request_id})
+            except OSError:
+                pass
+            raise
+        finally:
+            pending.pop(request_id, None)
+
+    async def close(self):
+        if self.process is not None and self.process.returncode is None:
+            self.process.terminate()
+            await self.process.wait()
+        self.process = None
+
+feedback_ui_path = os.path.join(script_dir, "feedback_ui.py")
+feedback_daemon = FeedbackDaemonClient(feedback_ui_path)
 
+def ui_request(summary: str, predefinedOptions: list[str] | None, deadline: float | None, questions: list[dict[str, Any]] | None = None,
+               client: dict[str, Any] | None = None, diff: str | None = None) -> dict[str, Any]:
+    """发给界面进程的请求；剪贴板图片存放在本次请求专用的临时目录中，请求结束后由服务端整个删除"""
+    request_id = os.urandom(8).hex()
+    return {
+        "id": request_id,
+        "prompt": summary,
+        "predefined_options": predefinedOptions or [],
+        "image_options": config.image_options(),
+        "deadline": deadline,
+        "temp_dir": os.path.join(config.TEMP_DIR, request_id),
+        "questions": questions,
+        # 同时有多个请求时界面上显示已等待的时间
+        "asked_at": time.time(),
+        # 界面上显示提问的客户端和工作区，多个客户端共用界面时便于区分
+        "client": {"name": client["name"], "workspace": client["workspace"]} if client else None,
+        # 需要审阅的补丁（unified diff），界面逐块显示并回传每块的决定
+        "diff": diff,
+    }
+
+async def spawn_feedback_ui(request: dict[str, Any]) -> dict[str, Any]:
+    """为单次请求启动独立的 feedback_ui.py 进程（常驻进程不可用时的回退路径）"""
+    process = None
+    spans = timing.SpanRecorder()
+    try:
         # Run feedback_ui.py as a separate process
         # NOTE: There appears to be a bug in uv, so we need
         # to pass a bunch of special flags to make this work
-        args = [
+        spans.begin("spawn_exec")
+        process = await asyncio.create_subprocess_exec(
             sys.executable,
             "-u",
             feedback_ui_path,
-            "--prompt", summary,
-            "--output-file", output_file,
-            "--predefined-options", "|||".join(predefinedOptions) if predefinedOptions else ""
-        ]
-        result = subprocess.run(
-            args,
-            check=False,
-            shell=False,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-            stdin=subprocess.DEVNULL,
-            close_fds=True
+            "--request-stdin",
+            "--stream-output",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            stdin=asyncio.subprocess.PIPE,
+            close_fds=True,
+            env=timing.child_env(),
         )
-        if result.returncode != 0:
-            raise Exception(f"Failed to launch feedback UI: {result.returncode}")
-
-        # Read the result from the temporary file
-        with open(output_file, 'r') as f:
-            result = json.load(f)
-        os.unlink(output_file)
-        
-        # 处理附件数据
-        if "attachments" in result and result["attachments"]:
-            # 创建会话特定的附件目录
-            session_id = os.urandom(4).hex()
-            attachment_dir = os.path.join(script_dir, "attachments", session_id)
-            os.makedirs(attachment_dir, exist_ok=True)
-            
-            # 处理每个附件
-            processed_attachments = []
-            for attachment in result["attachments"]:
-                if os.path.exists(attachment["path"]):
-                    # 复制文件到附件目录
-                    dest_path = os.path.join(attachment_dir, attachment["name"])
-                    shutil.copy2(attachment["path"], dest_path)
-                    
-                    # 更新附件信息
-                    attachment_info = {
-                        "name": attachment["name"],
-                        "type": attachment["type"],
-                        "size": attachment["size"],
-                    }
-                    
-                    # 如果是图片且有base64数据，保留它
-                    if attachment["type"] == "image" and "data" in attachment:
-                        attachment_info["data"] = attachment["data"]
-                    
-                    processed_attachments.append(attachment_info)
-            
-            # 更新结果中的附件数据
-            result["attachments"] = processed_attachments
-        
+        spans.end("spawn_exec")
+        # 提示和选项通过标准输入传递，避免命令行长度限制和分隔符转义问题
+        ipc.write_message(process.stdin, request)
+        await process.stdin.drain()
+        process.stdin.close()
+
+        # 结果和附件内容直接从管道读取
+        header = await ipc.read_message_async(process.stdout)
+        result = await receive_result(process.stdout, header) if header else None
+        returncode = await process.wait()
+        if returncode != 0 or result is None:
+            raise Exception(f"Failed to launch feedback UI: {returncode}")
+        result["spans"] = spans.drain() + result["spans"]
         return result
-    except Exception as e:
-        if os.path.exists(output_file):
-            os.unlink(output_file)
-        raise e
+    finally:
+        # 被取消时不留下孤儿界面进程
+        if process is not None and process.returncode is None:
+            process.kill()
+            await process.wait()
+
+_responder: ScriptedResponder | None = None
+
+async def scripted_feedback(summary: str, predefinedOptions: list[str] | None = None, questions: list[dict[str, Any]] | None = None) -> dict[str, Any]:
+    """按 INTERACTIVE_FEEDBACK_RESPONDER 指定的脚本应答，不启动界面进程"""
+    global _responder
+    if _responder is None:
+        _responder = ScriptedResponder(config.RESPONDER)
+    await asyncio.sleep(_responder.delay_seconds(summary))
+    answer = _responder.respond(summary, predefinedOptions)
+    spans = timing.SpanRecorder()
+    session = attachment_store.new_session()
+    result = {"interactive_feedback": answer["interactive_feedback"], "attachments": []}
+    if questions:
+        result["answers"] = _responder.respond_batch(questions)
+    if "hunks" in answer:
+        result["hunks"] = answer["hunks"]
+    with spans.span("attachment_commit"):
+        for attachment in answer["attachments"]:
+            await asyncio.to_thread(session.add_file, attachment["path"], {"name": attachment["name"], "file_type": attachment["type"]})
+            result["attachments"].append({"name": attachment["name"], "type": attachment["type"], "size": attachment["size"]})
+        finish_session(session, result)
+    result["spans"] = spans.drain()
+    return result
+
+def format_result(result: dict[str, Any]) -> list[Any]:
+    """文本与附件元数据放在第一个内容块中，图片的压缩版本以原生 MCP 图片内容紧随其后"""
+    images = []
+    for attachment in result.get("attachments") or []:
+        rendition = attachment.pop("rendition", None)
+        image_format = attachment.pop("rendition_format", None)
+        attachment["inline_image"] = bool(rendition)
+        if rendition:
+            images.append(Image(data=rendition, format=image_format).to_image_content())
+    return [TextContent(type="text", text=json.dumps(result, ensure_ascii=False, indent=2)), *images]
+
+def record_round(summary: str, predefinedOptions: list[str] | None, result: dict[str, Any], session_dir: str | None):
+    """把本轮反馈追加到回放日志，附件记录为会话目录中的路径"""
+    paths = [os.path.join(session_dir, a["name"]) for a in result["attachments"]] if session_dir else []
+    try:
+        append_replay(config.RECORD_LOG, summary, predefinedOptions or [], result["interactive_feedback"], paths)
+    except OSError as e:
+        print(f"记录回放日志失败: {e}", file=sys.stderr)
+
+# 每轮反馈各阶段耗时的汇总，通过 metrics://timing 资源查询
+span_stats = timing.SpanStats(config.METRICS_JSONL, config.METRICS_TEXTFILE)
+
+# 重复问题的自动应答，命中时不启动界面；命中统计通过 metrics://answer_cache 资源查询
+answer_cache = AnswerCache(config.ANSWER_CACHE, config.ANSWER_CACHE_TTL_SECONDS) if config.ANSWER_CACHE else None
+
+def cached_feedback(summary: str, predefinedOptions: list[str] | None, project: str) -> dict[str, Any] | None:
+    if answer_cache is None:
+        return None
+    answer = answer_cache.lookup(summary, predefinedOptions, project)
+    if answer is None:
+        return None
+    return {
+        "interactive_feedback": answer["interactive_feedback"],
+        "attachments": [],
+        "auto_answered": {"source": answer["source"], "expires": answer["expires"]},
+    }
+
+# 反馈历史在后台线程中批量写入 SQLite，查询见 search_feedback_history 工具和界面的历史面板
+history_writer = history.HistoryWriter(config.HISTORY_DB) if config.HISTORY_DB else None
+if history_writer is not None:
+    # 常驻 HTTP 服务不经过 lifespan 收尾，退出时写完队列中剩余的记录
+    atexit.register(history_writer.stop)
+
+def history_prompt(summary: str, questions: list[dict[str, Any]] | None) -> str:
+    """写入历史的提示文本：批量提问时把各个问题附在说明之后，便于按问题内容检索"""
+    if not questions:
+        return summary
+    return "\n".join([summary, *(f"{i}. {q['question']}" for i, q in enumerate(questions, 1))]).strip()
+
+def record_history(summary: str, predefinedOptions: list[str] | None, project: str, client: dict[str, Any] | None,
+                   mode: str, questions: list[dict[str, Any]] | None, result: dict[str, Any]):
+    """只把记录放入写入队列，不等待数据库"""
+    attachments = [
+        {key: attachment[key] for key in ("name", "type", "size", "mime_type", "uri") if key in attachment}
+        for attachment in result.get("attachments") or []
+    ]
+    extra = {key: result[key] for key in ("answers", "hunks", "timed_out", "auto_answered") if key in result}
+    history_writer.record(
+        history_prompt(summary, questions), result["interactive_feedback"], project=project,
+        client=client["name"] if client else None, mode=mode, predefined_options=predefinedOptions,
+        attachments=attachments, extra=extra,
+    )
+
+# 同时显示的窗口数受限时按客户端轮流排队，排队情况通过 metrics://queue 资源查询
+feedback_queue = FairQueue(max(config.MAX_WINDOWS, 0))
+
+async def request_feedback(summary: str, predefinedOptions: list[str] | None, deadline: float | None, questions: list[dict[str, Any]] | None = None,
+                           client: dict[str, Any] | None = None, diff: str | None = None) -> dict[str, Any]:
+    """由脚本、常驻界面进程或新启动的界面进程回答一次请求"""
+    if config.RESPONDER:
+        return await scripted_feedback(summary, predefinedOptions, questions)
+    request = ui_request(summary, predefinedOptions, deadline, questions, client, diff)
+    try:
+        async with feedback_queue.slot(client["id"] if client else "local"):
+            if config.UI_MODE == "spawn":
+                return await spawn_feedback_ui(request)
+            try:
+                return await feedback_daemon.request(request)
+            except ConnectionError:
+                # 常驻进程挂掉时回退到每次启动新进程，下次调用会重新拉起常驻进程
+                await feedback_daemon.close()
+                return await spawn_feedback_ui(request)
+    finally:
+        # 无论提交、超时还是被客户端取消，附件内容都已入库或不再需要
+        await asyncio.to_thread(remove_temp_dir, request["temp_dir"])
+
+def remove_temp_dir(path: str):
+    """删除请求专用的临时目录；其中有文件（粘贴过图片）时登记删除，让回收索引及时移除对应条目"""
+    if not os.path.isdir(path):
+        return
+    shutil.rmtree(path, True)
+    try:
+        garbage_collector.record_removed(path)
+    except OSError as e:
+        print(f"登记临时目录删除失败: {e}", file=sys.stderr)
+
+def timeout_result(default_answer: str | None, questions: list[dict[str, Any]] | None = None) -> dict[str, Any]:
+    answer = config.TIMEOUT_ANSWER if default_answer is None else default_answer
+    result = {"interactive_feedback": answer, "attachments": [], "timed_out": True, "spans": []}
+    if questions:
+        result["answers"] = [
+            {"question": q["question"], "selected_options": [], "text": "", "interactive_feedback": answer}
+            for q in questions
+        ]
+    return result
+
+async def launch_feedback_ui(
+    summary: str,
+    predefinedOptions: list[str] | None = None,
+    project: str | None = None,
+    timeout_seconds: float | None = None,
+    default_answer: str | None = None,
+    questions: list[dict[str, Any]] | None = None,
+    client: dict[str, Any] | None = None,
+    diff: str | None = None,
+) -> list[Any]:
+    # 设置了应答脚本时不经过界面进程，耗时统计和历史记录按 scripted 区分
+    mode = "scripted" if config.RESPONDER else config.UI_MODE
+    timing.mark("call_start", mode=mode)
+    spans = timing.SpanRecorder()
+    spans.begin("round_total")
+    project = project or (client["workspace"] if client else None) or os.getcwd()
+    if timeout_seconds is None:
+        timeout_seconds = config.TIMEOUT_SECONDS
+    files = parse_diff(diff) if diff else []
+    diff = diff if files else None
+    with spans.span("answer_cache"):
+        # 记住的回答按单个问题匹配，批量提问和审阅补丁不查缓存
+        result = None if questions or files else cached_feedback(summary, predefinedOptions, project)
+    if result is not None:
+        mode = "cache"
+        result["spans"] = []
+    elif timeout_seconds and timeout_seconds > 0:
+        # 超时会取消等待：常驻进程关闭对应窗口，单独启动的进程被结束
+        try:
+            result = await asyncio.wait_for(
+                request_feedback(summary, predefinedOptions, time.time() + timeout_seconds, questions, client, diff), timeout_seconds
+            )
+        except asyncio.TimeoutError:
+            mode = "timeout"
+            result = timeout_result(default_answer, questions)
+    else:
+        result = await request_feedback(summary, predefinedOptions, None, questions, client, diff)
+    timing.mark("result_received")
+    ui_spans = result.pop("spans", [])
+    session_dir = result.pop("session_dir", None)
+    # 没有作出决定（超时、点击"问题已解决"等）的块为 undecided
+    hunks = result.pop("hunks", None)
+    if files:
+        result["hunks"] = review_result(files, hunks)
+    if result.pop("remember", False) and answer_cache is not None and not questions and not files:
+        answer_cache.store(summary, predefinedOptions, project, result["interactive_feedback"])
+    if config.RECORD_LOG and mode not in ("cache", "timeout") and not questions:
+        record_round(summary, predefinedOptions, result, session_dir)
+    if history_writer is not None:
+        with spans.span("history_record"):
+            record_history(summary, predefinedOptions, project, client, mode, questions, result)
+    with spans.span("serialization"):
+        content = format_result(result)
+    timing.mark("result_serialized")
+    spans.end("round_total")
+    span_stats.record_round(ui_spans + spans.drain(), mode=mode)
+    return content
+
+# 各客户端会话的工作区（来自 roots），每个会话只向客户端查询一次
+_session_workspaces: "weakref.WeakKeyDictionary[Any, str | None]" = weakref.WeakKeyDictionary()
+ROOTS_TIMEOUT_SECONDS = 2
+
+async def client_workspace(ctx: Context) -> str | None:
+    """客户端声明的第一个本地 root，客户端不支持 roots 或没有及时回应时返回 None"""
+    session = ctx.session
+    if session in _session_workspaces:
+        return _session_workspaces[session]
+    workspace = None
+    if session.check_client_capability(ClientCapabilities(roots=RootsCapability())):
+        try:
+            roots = await asyncio.wait_for(ctx.list_roots(), ROOTS_TIMEOUT_SECONDS)
+        except Exception:
+            roots = []
+        for root in roots:
+            uri = urlparse(str(root.uri))
+            if uri.scheme == "file":
+                workspace = os.path.normpath(unquote(uri.path))
+                break
+    _session_workspaces[session] = workspace
+    return workspace
+
+async def identify_client(ctx: Context | None, project: str | None) -> dict[str, Any]:
+    """提问的客户端：名称来自 MCP 握手，工作区依次取 project_directory、客户端的 roots、服务端工作目录；
+    id 区分同一服务端上的各个会话，用于公平排队"""
+    if ctx is None:
+        return {"id": "local", "name": "local", "workspace": project or os.getcwd()}
+    params = ctx.session.client_params
+    name = params.clientInfo.name if params is not None else "unknown"
+    if project or shared_server:
+        # mcp 1.8 的 HTTP 传输收不到服务端向客户端发起的请求的回应，还会丢失本次工具调用的结果，
+        # 常驻服务只用 project_directory；服务端工作目录与客户端无关，不作为工作区显示
+        return {"id": f"{name}#{id(ctx.session):x}", "name": name, "workspace": project}
+    workspace = await client_workspace(ctx) or os.getcwd()
+    return {"id": f"{name}#{id(ctx.session):x}", "name": name, "workspace": workspace}
+
+@mcp.resource("attachment://{session}", mime_type="application/json")
+async def attachment_manifest(session: str) -> dict[str, Any]:
+    """List the attachments of a feedback session (name, type, size, mime_type, sha256)"""
+    manifest = attachment_store.read_manifest(session)
+    if manifest is None:
+        raise FileNotFoundError(f"附件会话不存在: {session}")
+    touch_session(session)
+    for entry in manifest.get("attachments", []):
+        entry["uri"] = attachment_uri(session, entry["name"])
+    return manifest
+
+@mcp.resource("attachment://{session}/{name}", mime_type="application/octet-stream")
+async def read_attachment(session: str, name: str) -> bytes:
+    """Read the full content of an attachment returned by interactive_feedback"""
+    return await load_attachment(session, name)
+
+@mcp.resource("attachment://{session}/{name}/range/{offset}/{length}", mime_type="application/octet-stream")
+async def read_attachment_range(session: str, name: str, offset: int, length: int) -> bytes:
+    """Read `length` bytes of an attachment starting at byte `offset`, for large files"""
+    return await load_attachment(session, name, offset, length)
+
+@mcp.resource("metrics://timing", mime_type="application/json")
+def timing_metrics() -> dict[str, Any]:
+    """Per-phase latency aggregates (count, mean, min, max, p50/p95/p99 in ms) of feedback rounds served by this process"""
+    return span_stats.snapshot()
+
+@mcp.resource("metrics://answer_cache", mime_type="application/json")
+def answer_cache_metrics() -> dict[str, Any]:
+    """Hit/miss counters of the auto-answer cache (remembered answers and rules) of this process"""
+    if answer_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **answer_cache.snapshot()}
+
+@mcp.resource("metrics://queue", mime_type="application/json")
+def queue_metrics() -> dict[str, Any]:
+    """Feedback windows currently shown and requests waiting per client (seconds shown / waited)"""
+    return feedback_queue.snapshot()
+
+@mcp.resource("metrics://history", mime_type="application/json")
+def history_metrics() -> dict[str, Any]:
+    """Counters of the feedback history writer of this process (rounds recorded, written, batches, errors)"""
+    if history_writer is None:
+        return {"enabled": False}
+    return {"enabled": True, "path": history_writer.path, **history_writer.counters}
 
 @mcp.tool()
-def interactive_feedback(
+async def interactive_feedback(
     message: str = Field(description="The specific question for the user"),
     predefined_options: list = Field(default=None, description="Predefined options for the user to choose from (optional)"),
-) -> Dict[str, Any]:
-    """Request interactive feedback from the user"""
+    project_directory: str = Field(default=None, description="Absolute path of the project the question is about; remembered answers are scoped to it (optional)"),
+    timeout_seconds: float = Field(default=None, description="Give up waiting after this many seconds and return default_answer (optional)"),
+    default_answer: str = Field(default=None, description="Answer returned when timeout_seconds expires without a reply (optional)"),
+    diff: str = Field(default=None, description=(
+        "Unified diff (e.g. `git diff` output) for the user to review hunk by hunk (optional). "
+        "When omitted, a unified diff inside `message` is detected and shown the same way"
+    )),
+    ctx: Context | None = None,
+) -> List[Any]:
+    """Request interactive feedback from the user.
+
+    Attachments are returned as metadata with an `attachment://<session>/<name>` resource URI;
+    read the resource (or `.../range/<offset>/<length>`) to fetch the content on demand.
+    Questions the user chose to always answer the same way return immediately with an
+    `auto_answered` field instead of showing the feedback window. When `timeout_seconds`
+    expires the window is closed and `default_answer` is returned with `timed_out: true`.
+    With a diff the result also has `hunks`: one `{file, hunk, header, added, removed, decision}`
+    per hunk in diff order, where `decision` is `accepted`, `rejected` or `undecided`.
+    """
     predefined_options_list = predefined_options if isinstance(predefined_options, list) else None
-    return launch_feedback_ui(message, predefined_options_list)
+    project = project_directory if isinstance(project_directory, str) else None
+    timeout = timeout_seconds if isinstance(timeout_seconds, (int, float)) else None
+    answer = default_answer if isinstance(default_answer, str) else None
+    message, patch = review_diff(message, diff)
+    client = await identify_client(ctx, project)
+    return await launch_feedback_ui(message, predefined_options_list, project, timeout, answer, client=client, diff=patch)
+
+def review_diff(message: str, diff: Any) -> tuple[str, str | None]:
+    """要审阅的补丁：优先使用 diff 参数，否则从提示中找出补丁并从提示中去掉"""
+    if isinstance(diff, str) and diff.strip():
+        return message, diff
+    message, found = extract_diff(message)
+    return message, found or None
+
+def normalize_questions(questions: list) -> list[dict[str, Any]]:
+    """把批量提问的参数整理为界面使用的格式，问题可以直接写成字符串"""
+    normalized = []
+    for index, question in enumerate(questions):
+        if isinstance(question, str):
+            question = {"question": question}
+        if not isinstance(question, dict) or not str(question.get("question") or "").strip():
+            raise ValueError(f"第 {index + 1} 个问题缺少 question 字段")
+        options = question.get("predefined_options") or []
+        normalized.append({
+            "question": str(question["question"]),
+            "predefined_options": [str(option) for option in options] if isinstance(options, list) else [],
+            "multi_select": bool(question.get("multi_select", False)),
+            "allow_text": bool(question.get("allow_text", True)),
+        })
+    return normalized
+
+@mcp.tool()
+async def interactive_feedback_batch(
+    questions: list = Field(description=(
+        "Questions to ask in one window. Each item is either a string or an object with "
+        "`question`, optional `predefined_options` (list of strings), `multi_select` "
+        "(allow several options, default false) and `allow_text` (free-text answer, default true)"
+    )),
+    message: str = Field(default=None, description="Optional introduction shown above the questions"),
+    project_directory: str = Field(default=None, description="Absolute path of the project the questions are about (optional)"),
+    timeout_seconds: float = Field(default=None, description="Give up waiting after this many seconds and return default_answer for every question (optional)"),
+    default_answer: str = Field(default=None, description="Answer returned for every question when timeout_seconds expires (optional)"),
+    ctx: Context | None = None,
+) -> List[Any]:
+    """Ask the user several questions at once in a single feedback window.
+
+    Returns `answers` in the same order as `questions`, each with `selected_options`, `text`
+    and a combined `interactive_feedback` string. The top-level `interactive_feedback` holds
+    any general remarks, and attachments are shared by the whole batch.
+    """
+    if not isinstance(questions, list) or not questions:
+        raise ValueError("questions 不能为空")
+    normalized = normalize_questions(questions)
+    timeout = timeout_seconds if isinstance(timeout_seconds, (int, float)) else None
+    answer = default_answer if isinstance(default_answer, str) else None
+    intro = message if isinstance(message, str) else ""
+    project = project_directory if isinstance(project_directory, str) else None
+    client = await identify_client(ctx, project)
+    return await launch_feedback_ui(intro, None, project, timeout, answer, normalized, client)
+
+class Ticket:
+    """start_feedback 发起、尚未被 get_feedback 取走的一次请求"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.created = time.time()
+        self.finished: float | None = None
+        task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: asyncio.Task):
+        self.finished = time.time()
+
+    def status(self, ticket_id: str) -> dict[str, Any]:
+        return {
+            "ticket": ticket_id,
+            "status": "pending",
+            "elapsed_seconds": round(time.time() - self.created, 1),
+        }
+
+# 已经有结果但一直没有被取走的 ticket 保留多久（秒）
+TICKET_RETENTION_SECONDS = 3600
+
+tickets: dict[str, Ticket] = {}
+
+def _expire_tickets():
+    cutoff = time.time() - TICKET_RETENTION_SECONDS
+    for ticket_id, ticket in list(tickets.items()):
+        if ticket.finished is not None and ticket.finished < cutoff:
+            del tickets[ticket_id]
+
+def _find_ticket(ticket: str) -> Ticket:
+    _expire_tickets()
+    found = tickets.get(ticket)
+    if found is None:
+        raise ValueError(f"ticket 不存在或已被取走: {ticket}")
+    return found
+
+def _ticket_content(payload: dict[str, Any]) -> list[Any]:
+    return [TextContent(type="text", text=json.dumps(payload, ensure_ascii=False, indent=2))]
+
+@mcp.tool()
+async def start_feedback(
+    message: str = Field(description="The specific question for the user"),
+    predefined_options: list = Field(default=None, description="Predefined options for the user to choose from (optional)"),
+    project_directory: str = Field(default=None, description="Absolute path of the project the question is about; remembered answers are scoped to it (optional)"),
+    timeout_seconds: float = Field(default=None, description="Give up waiting after this many seconds and answer with default_answer (optional)"),
+    default_answer: str = Field(default=None, description="Answer used when timeout_seconds expires without a reply (optional)"),
+    diff: str = Field(default=None, description=(
+        "Unified diff (e.g. `git diff` output) for the user to review hunk by hunk (optional). "
+        "When omitted, a unified diff inside `message` is detected and shown the same way"
+    )),
+    ctx: Context | None = None,
+) -> List[Any]:
+    """Show the feedback window and return a ticket immediately, without waiting for the answer.
+
+    Keep working and call `get_feedback` with the ticket to collect the answer (it has the same
+    format as `interactive_feedback`), or `cancel_feedback` to close the window.
+    """
+    predefined_options_list = predefined_options if isinstance(predefined_options, list) else None
+    project = project_directory if isinstance(project_directory, str) else None
+    timeout = timeout_seconds if isinstance(timeout_seconds, (int, float)) else None
+    answer = default_answer if isinstance(default_answer, str) else None
+    message, patch = review_diff(message, diff)
+    _expire_tickets()
+    # 在工具调用返回之前识别客户端（查询 roots 需要当前会话）
+    client = await identify_client(ctx, project)
+    ticket_id = os.urandom(8).hex()
+    task = asyncio.create_task(launch_feedback_ui(message, predefined_options_list, project, timeout, answer, client=client, diff=patch))
+    tickets[ticket_id] = Ticket(task)
+    return _ticket_content(tickets[ticket_id].status(ticket_id))
+
+@mcp.tool()
+async def get_feedback(
+    ticket: str = Field(description="Ticket returned by start_feedback"),
+    wait_seconds: float = Field(default=30, description="Wait up to this many seconds for the answer before returning `status: pending`"),
+) -> List[Any]:
+    """Collect the answer of a `start_feedback` ticket, waiting up to `wait_seconds` for it.
+
+    Returns the same content as `interactive_feedback` once the user has answered (the ticket is
+    then consumed), otherwise `{"ticket", "status": "pending", "elapsed_seconds"}`.
+    """
+    found = _find_ticket(ticket)
+    wait = max(0.0, wait_seconds) if isinstance(wait_seconds, (int, float)) else 0.0
+    # 只等待不取消：轮询超时或本次调用被取消都不影响窗口
+    await asyncio.wait({found.task}, timeout=wait)
+    if not found.task.done():
+        return _ticket_content(found.status(ticket))
+    tickets.pop(ticket, None)
+    return found.task.result()
+
+@mcp.tool()
+async def cancel_feedback(
+    ticket: str = Field(description="Ticket returned by start_feedback"),
+) -> List[Any]:
+    """Close the feedback window of a `start_feedback` ticket and discard its answer"""
+    found = _find_ticket(ticket)
+    tickets.pop(ticket, None)
+    found.task.cancel()
+    # 等待界面关闭和临时文件清理完成
+    await asyncio.wait({found.task})
+    if found.task.cancelled():
+        status = "cancelled"
+    else:
+        status = "failed" if found.task.exception() else "answered"
+    return _ticket_content({"ticket": ticket, "status": status})
+
+def _search_history(query: str, project: str | None, client: str | None, limit: int) -> list[dict[str, Any]]:
+    conn = history.connect(config.HISTORY_DB, readonly=True)
+    if conn is None:
+        return []
+    try:
+        return history.search(conn, query, project, limit, client)
+    finally:
+        conn.close()
+
+@mcp.tool()
+async def search_feedback_history(
+    query: str = Field(default="", description=(
+        "Keywords separated by whitespace; every keyword must appear in the question or the answer. "
+        "Empty returns the most recent rounds"
+    )),
+    project_directory: str = Field(default=None, description="Only return rounds asked about this project (optional)"),
+    client_name: str = Field(default=None, description="Only return rounds asked by this client, as shown in `client` (optional)"),
+    limit: int = Field(default=10, description="Maximum number of rounds to return, newest first"),
+) -> List[Any]:
+    """Search the user's earlier feedback rounds to reuse decisions instead of asking again.
+
+    Returns `{"rounds": [...]}`, newest first. Each round has `id`, `time`, `project`, `client`,
+    `mode` (`daemon` / `spawn`, `scripted` when answered by the responder script, `cache`,
+    or `timeout` when not answered in the window), `prompt`, `predefined_options`,
+    `answer`, `attachments` (metadata and `attachment://` URIs, which may have been cleaned up
+    since), plus `answers` / `hunks` for batch questions and diff reviews.
+    """
+    if history_writer is None:
+        raise ValueError("反馈历史已关闭（INTERACTIVE_FEEDBACK_HISTORY_DB 为空）")
+    text = query if isinstance(query, str) else ""
+    project = project_directory if isinstance(project_directory, str) else None
+    client = client_name if isinstance(client_name, str) else None
+    count = max(1, min(int(limit), 100)) if isinstance(limit, (int, float)) else 10
+    # 先等待队列中的记录写完，刚结束的一轮也能查到
+    await asyncio.to_thread(history_writer.flush, 2)
+    rounds = await asyncio.to_thread(_search_history, text, project, client, count)
+    for record in rounds:
+        record["time"] = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.pop("created")))
+    return [TextContent(type="text", text=json.dumps({"rounds": rounds}, ensure_ascii=False, indent=2))]
 
 if __name__ == "__main__":
-    mcp.run(transport="stdio")
+    parser = argparse.ArgumentParser(description="Interactive Feedback MCP 服务端")
+    parser.add_argument("--transport", choices=["stdio", "streamable-http", "sse"], default=config.TRANSPORT,
+                        help="stdio 由客户端启动；streamable-http/sse 作为常驻服务供多个客户端共用")
+    parser.add_argument("--host", default=config.HTTP_HOST, help="HTTP 传输监听的地址")
+    parser.add_argument("--port", type=int, default=config.HTTP_PORT, help="HTTP 传输监听的端口")
+    args = parser.parse_args()
+
+    if args.transport == "stdio":
+        mcp.run(transport="stdio")
+    else:
+        shared_server = True
+        if config.MAX_WINDOWS < 0 and config.UI_MODE == "spawn":
+            # 常驻界面进程把所有请求放在同一个窗口中排队；每次启动新进程时默认一次只弹出一个窗口
+            feedback_queue.max_active = 1
+        mcp.run(transport=args.transport, host=args.host, port=args.port)
@@ -0,0 +1,477 @@
+# 附件库和临时目录的垃圾回收
+# 所有被创建的文件（附件会话、剪贴板临时图片）都会以一行JSON追加到日志 gc_journal.jsonl，
+# 回收器把日志增量合并进索引 gc_index.json，并按最后访问时间维护一个最小堆：
+#   - 过期删除只需从堆顶弹出过期条目，代价与过期条目数成正比，而不是与文件总数成正比
+#   - 总占用超过上限时，继续从堆顶按最近最少使用的顺序淘汰
+# 只有索引尚不存在时（从旧版本升级）才会分批扫描一次目录，把已有文件登记进索引。
+# 多个服务端进程共享同一份索引，用锁文件保证同一时刻只有一个进程在回收，
+# 并且两次回收之间至少间隔 interval_seconds（记录在单独的时间戳文件中）。
+# 索引只在合并了日志、扫描了目录或删除了条目时才重写，其他进程也只在索引变化时重新载入。
+# 会话目录中的文件是 blob 的硬链接，删除 blob 不会影响仍在使用它的会话。
+import os
+import re
+import sys
+import json
+import stat
+import time
+import contextlib
+import heapq
+import shutil
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from attachment_store import AttachmentStore, StoreSession, _write_json_atomic
+
+# 旧版本直接在 attachments/ 下创建的会话目录
+_LEGACY_SESSION_RE = re.compile(r"^[0-9a-f]{8}$")
+# 锁文件超过这个时间未更新即视为持有者已退出
+_STALE_LOCK_SECONDS = 300
+# 日志文件超过这个大小且已全部合并后会被轮转
+_JOURNAL_ROTATE_BYTES = 1024 * 1024
+
+
+def append_journal(journal_path: str, record: Dict[str, Any]):
+    """向回收日志追加一条记录（多进程并发追加安全）"""
+    line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+    os.makedirs(os.path.dirname(journal_path), exist_ok=True)
+    fd = os.open(journal_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def record_temp_file(journal_path: str, path: str):
+    """登记一个新建的临时文件，供界面进程调用"""
+    try:
+        append_journal(journal_path, {
+            "kind": "temp",
+            "path": os.path.abspath(path),
+            "size": os.path.getsize(path),
+            "time": time.time(),
+        })
+    except OSError as e:
+        print(f"登记临时文件失败: {e}", file=sys.stderr)
+
+
+def _force_remove(path: str):
+    """删除文件或目录，只读的 blob 需要先去掉只读属性（Windows）"""
+    def on_error(func, failed_path, _exc_info):
+        os.chmod(failed_path, stat.S_IWRITE)
+        func(failed_path)
+
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, onerror=on_error)
+    elif os.path.lexists(path):
+        try:
+            os.unlink(path)
+        except PermissionError:
+            os.chmod(path, stat.S_IWRITE)
+            os.unlink(path)
+
+
+def _newest_mtime(path: str, default: float) -> float:
+    """目录中所有条目最新的修改时间，目录为空时返回 default
+    （不取目录自身的时间：回收其中的文件也会更新它）"""
+    newest = default
+    for dir_path, dir_names, file_names in os.walk(path):
+        for name in dir_names + file_names:
+            try:
+                newest = max(newest, os.stat(os.path.join(dir_path, name), follow_symlinks=False).st_mtime)
+            except OSError:
+                continue
+    return newest
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for entry in os.scandir(path):
+        if entry.is_file(follow_symlinks=False):
+            total += entry.stat(follow_symlinks=False).st_size
+    return total
+
+
+class GarbageCollector:
+    def __init__(
+        self,
+        store: AttachmentStore,
+        temp_dirs: List[str],
+        max_age_seconds: float,
+        max_bytes: int,
+        interval_seconds: float = 60,
+        batch_size: int = 200,
+    ):
+        self.store = store
+        self.temp_dirs = temp_dirs
+        self._temp_roots = {os.path.abspath(d) for d in temp_dirs}
+        self.max_age_seconds = max_age_seconds
+        self.max_bytes = max_bytes
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.index_path = os.path.join(store.root, "gc_index.json")
+        self.journal_path = os.path.join(store.root, "gc_journal.jsonl")
+        self.lock_path = os.path.join(store.root, "gc.lock")
+        self.stamp_path = os.path.join(store.root, "gc_stamp")
+
+        self.lock = threading.Lock()
+        # sessions[会话目录] = {"last_access": 时间, "blobs": {sha: 大小}, "size": 旧版会话自身大小}
+        self.sessions: Dict[str, Dict[str, Any]] = {}
+        # temp_files[路径] = {"last_access": 时间, "size": 大小}；路径也可以是每个请求的临时子目录
+        self.temp_files: Dict[str, Dict[str, Any]] = {}
+        self.blob_refs: Dict[str, int] = {}
+        self.blob_sizes: Dict[str, int] = {}
+        self.total_bytes = 0
+        # (最后访问时间, 类型, 路径)；条目被访问后旧的堆元素会在弹出时被识别并丢弃
+        self._heap: List[Tuple[float, str, str]] = []
+        self._journal_offset = 0
+        self._bootstrapped = False
+        self._index_mtime: Optional[float] = None
+        self._cursor: Optional[Iterator[Tuple[str, os.DirEntry]]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- 记录（任意线程/进程调用，只追加日志） ----
+
+    def record_session(self, session: StoreSession):
+        """登记一个刚提交的会话"""
+        if not session.entries:
+            return
+        append_journal(self.journal_path, {
+            "kind": "session",
+            "path": session.session_dir,
+            "blobs": {e["sha256"]: e["size"] for e in session.entries},
+            "time": time.time(),
+        })
+
+    def record_removed(self, path: str):
+        """登记一个已被删除的临时目录（每个请求的临时子目录在请求结束时删除）"""
+        append_journal(self.journal_path, {"kind": "removed", "path": os.path.abspath(path), "time": time.time()})
+
+    def touch_session(self, session_id: str):
+        """会话被读取时刷新最后访问时间"""
+        append_journal(self.journal_path, {
+            "kind": "touch",
+            "path": os.path.join(self.store.sessions_dir, session_id),
+            "time": time.time(),
+        })
+
+    # ---- 索引维护 ----
+
+    def _reset(self):
+        self.sessions.clear()
+        self.temp_files.clear()
+        self.blob_refs.clear()
+        self.blob_sizes.clear()
+        self.total_bytes = 0
+        self._heap = []
+
+    def _load(self):
+        """索引被其他进程更新过时重新载入"""
+        try:
+            mtime = os.stat(self.index_path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._index_mtime and (mtime is not None or self._bootstrapped):
+            return
+        self._reset()
+        self._index_mtime = mtime
+        self._journal_offset = 0
+        self._bootstrapped = False
+        if mtime is None:
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        for path, entry in data.get("sessions", {}).items():
+            self._add_session_entry(path, entry, push=False)
+        for path, entry in data.get("temp_files", {}).items():
+            self._add_temp_entry(path, entry, push=False)
+        self._heap = [(e["last_access"], "session", p) for p, e in self.sessions.items()]
+        self._heap += [(e["last_access"], "temp", p) for p, e in self.temp_files.items()]
+        heapq.heapify(self._heap)
+        self._journal_offset = data.get("journal_offset", 0)
+        self._bootstrapped = data.get("bootstrapped", False)
+
+    def _save(self):
+        os.makedirs(self.store.root, exist_ok=True)
+        _write_json_atomic(self.index_path, {
+            "sessions": self.sessions,
+            "temp_files": self.temp_files,
+            "journal_offset": self._journal_offset,
+            "bootstrapped": self._bootstrapped,
+        })
+        self._index_mtime = os.stat(self.index_path).st_mtime
+
+    def _add_session_entry(self, path: str, entry: Dict[str, Any], push: bool = True):
+        self._remove_session_entry(path)
+        self.sessions[path] = entry
+        self.total_bytes += entry.get("size", 0)
+        for digest, size in entry.get("blobs", {}).items():
+            if self.blob_refs.get(digest, 0) == 0:
+                self.blob_sizes[digest] = size
+                self.total_bytes += size
+            self.blob_refs[digest] = self.blob_refs.get(digest, 0) + 1
+        if push:
+            heapq.heappush(self._heap, (entry["last_access"], "session", path))
+
+    def _remove_session_entry(self, path: str) -> List[str]:
+        """从索引中移除会话，返回因此不再被引用的 blob"""
+        entry = self.sessions.pop(path, None)
+        if entry is None:
+            return []
+        self.total_bytes -= entry.get("size", 0)
+        released = []
+        for digest in entry.get("blobs", {}):
+            self.blob_refs[digest] -= 1
+            if self.blob_refs[digest] <= 0:
+                del self.blob_refs[digest]
+                self.total_bytes -= self.blob_sizes.pop(digest, 0)
+                released.append(digest)
+        return released
+
+    def _add_temp_entry(self, path: str, entry: Dict[str, Any], push: bool = True):
+        self._remove_temp_entry(path)
+        self.temp_files[path] = entry
+        self.total_bytes += entry.get("size", 0)
+        if push:
+            heapq.heappush(self._heap, (entry["last_access"], "temp", path))
+
+    def _remove_temp_entry(self, path: str):
+        entry = self.temp_files.pop(path, None)
+        if entry is not None:
+            self.total_bytes -= entry.get("size", 0)
+
+    def _apply_record(self, record: Dict[str, Any]):
+        kind, path = record.get("kind"), record.get("path")
+        if kind == "session":
+            self._add_session_entry(path, {"last_access": record["time"], "blobs": record.get("blobs", {})})
+        elif kind == "temp":
+            # 请求专用的临时子目录（TEMP_DIR/<请求ID>）正常由服务端删除（并记录 removed），
+            # 进程崩溃或被结束时会残留，与其中的文件一起登记。其中的剪贴板图片提交后已存为 blob，
+            # 不再计入占用，否则同一张图片会被计算两次，使附件会话被提前淘汰
+            parent = os.path.dirname(path)
+            scoped = os.path.dirname(parent) in self._temp_roots
+            self._add_temp_entry(path, {"last_access": record["time"], "size": 0 if scoped else record.get("size", 0)})
+            if scoped and parent not in self.temp_files:
+                self._add_temp_entry(parent, {"last_access": record["time"], "size": 0})
+        elif kind == "removed":
+            # 临时目录已被删除，移除它和其中文件的条目（堆中的旧元素弹出时会被丢弃）
+            prefix = path + os.sep
+            for temp_path in [p for p in self.temp_files if p == path or p.startswith(prefix)]:
+                self._remove_temp_entry(temp_path)
+        elif kind == "touch" and path in self.sessions:
+            # 旧的堆元素保留在堆中，弹出时发现时间不一致会被重新入堆
+            self.sessions[path]["last_access"] = record["time"]
+
+    def _ingest_journal(self) -> bool:
+        """合并上次之后新追加的日志记录，返回索引是否有变化（读取位置移动或日志被轮转）"""
+        try:
+            size = os.path.getsize(self.journal_path)
+        except OSError:
+            return False
+        start = self._journal_offset
+        if size < self._journal_offset:
+            # 日志已被轮转
+            self._journal_offset = 0
+        if size == self._journal_offset:
+            return self._journal_offset != start
+        with open(self.journal_path, "rb") as f:
+            f.seek(self._journal_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # 另一个进程正在写入的半行，下次再读
+                    break
+                self._journal_offset += len(line)
+                try:
+                    self._apply_record(json.loads(line))
+                except (ValueError, KeyError):
+                    continue
+        if self._journal_offset >= _JOURNAL_ROTATE_BYTES and self._journal_offset == size:
+            rotated = f"{self.journal_path}.old"
+            os.replace(self.journal_path, rotated)
+            # 轮转瞬间其他进程追加的记录也要合并
+            with open(rotated, "rb") as f:
+                f.seek(self._journal_offset)
+                for line in f:
+                    try:
+                        self._apply_record(json.loads(line))
+                    except (ValueError, KeyError):
+                        continue
+            os.unlink(rotated)
+            self._journal_offset = 0
+            return True
+        return self._journal_offset != start
+
+    # ---- 首次运行时的目录扫描（从旧版本升级） ----
+
+    def _iter_entries(self) -> Iterator[Tuple[str, os.DirEntry]]:
+        """依次遍历临时目录、会话目录和旧版会话目录"""
+        for temp_dir in self.temp_dirs:
+            if os.path.isdir(temp_dir):
+                for entry in os.scandir(temp_dir):
+                    yield "temp", entry
+        if os.path.isdir(self.store.sessions_dir):
+            for entry in os.scandir(self.store.sessions_dir):
+                yield "session", entry
+        if os.path.isdir(self.store.root):
+            for entry in os.scandir(self.store.root):
+                if _LEGACY_SESSION_RE.match(entry.name):
+                    yield "legacy", entry
+
+    def _bootstrap_batch(self):
+        if self._cursor is None:
+            self._cursor = self._iter_entries()
+        for _ in range(self.batch_size):
+            try:
+                kind, entry = next(self._cursor)
+            except StopIteration:
+                self._cursor = None
+                self._bootstrapped = True
+                return
+            except OSError:
+                continue
+            try:
+                self._discover(kind, entry)
+            except OSError:
+                continue
+
+    def _discover(self, kind: str, entry: os.DirEntry):
+        if kind == "temp":
+            if entry.path in self.temp_files:
+                return
+            if entry.is_file(follow_symlinks=False):
+                st = entry.stat(follow_symlinks=False)
+                self._add_temp_entry(entry.path, {"last_access": st.st_mtime, "size": st.st_size})
+            elif entry.is_dir(follow_symlinks=False):
+                self._add_temp_entry(entry.path, {"last_access": _newest_mtime(entry.path, entry.stat().st_mtime), "size": _dir_size(entry.path)})
+        elif kind == "session":
+            if entry.is_dir(follow_symlinks=False) and entry.path not in self.sessions:
+                manifest = self.store.read_manifest(entry.name) or {}
+                attachments = manifest.get("attachments", [])
+                self._add_session_entry(entry.path, {
+                    "last_access": manifest.get("created", entry.stat().st_mtime),
+                    "blobs": {a["sha256"]: a["size"] for a in attachments if "sha256" in a},
+                })
+        elif kind == "legacy":
+            if entry.is_dir(follow_symlinks=False) and entry.path not in self.sessions:
+                self._add_session_entry(entry.path, {
+                    "last_access": entry.stat().st_mtime,
+                    "size": _dir_size(entry.path),
+                })
+
+    # ---- 回收 ----
+
+    def _evict(self, kind: str, path: str):
+        if kind == "temp":
+            self._remove_temp_entry(path)
+            _force_remove(path)
+        else:
+            released = self._remove_session_entry(path)
+            _force_remove(path)
+            for digest in released:
+                _force_remove(self.store.blob_path(digest))
+
+    def _collect(self) -> int:
+        removed = 0
+        cutoff = time.time() - self.max_age_seconds
+        while self._heap and removed < self.batch_size:
+            last_access, kind, path = self._heap[0]
+            if last_access >= cutoff and self.total_bytes <= self.max_bytes:
+                break
+            heapq.heappop(self._heap)
+            entry = (self.sessions if kind == "session" else self.temp_files).get(path)
+            if entry is None:
+                continue
+            if entry["last_access"] != last_access:
+                # 条目在入堆后被访问过，按新的时间重新入堆
+                heapq.heappush(self._heap, (entry["last_access"], kind, path))
+                continue
+            if kind == "temp" and os.path.isdir(path):
+                # 临时子目录按其中最新的修改时间计算年龄，仍在使用的请求目录不会被删除
+                try:
+                    newest = _newest_mtime(path, last_access)
+                except OSError:
+                    newest = last_access
+                if newest > last_access:
+                    entry["last_access"] = newest
+                    heapq.heappush(self._heap, (newest, kind, path))
+                    continue
+            try:
+                self._evict(kind, path)
+                removed += 1
+            except OSError as e:
+                print(f"清理 {path} 时出错: {e}", file=sys.stderr)
+        return removed
+
+    def _acquire_process_lock(self) -> bool:
+        try:
+            fd = os.open(self.lock_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+            os.close(fd)
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - os.stat(self.lock_path).st_mtime > _STALE_LOCK_SECONDS:
+                    os.unlink(self.lock_path)
+            except OSError:
+                pass
+            return False
+
+    def _due(self) -> bool:
+        """距离上次（任一进程的）回收是否已超过间隔"""
+        try:
+            return time.time() - os.stat(self.stamp_path).st_mtime >= self.interval_seconds
+        except OSError:
+            return True
+
+    def _touch_stamp(self):
+        with open(self.stamp_path, "a"):
+            pass
+        os.utime(self.stamp_path)
+
+    def step(self, force: bool = False) -> int:
+        """执行一步增量回收，返回本步删除的条目数"""
+        with self.lock:
+            if not force and not self._due():
+                return 0
+            os.makedirs(self.store.root, exist_ok=True)
+            if not self._acquire_process_lock():
+                return 0
+            try:
+                self._load()
+                changed = self._ingest_journal()
+                if not self._bootstrapped:
+                    self._bootstrap_batch()
+                    changed = True
+                removed = self._collect()
+                # 没有变化时不重写索引，单步的代价与新日志和过期条目的数量成正比
+                if changed or removed:
+                    self._save()
+                self._touch_stamp()
+                return removed
+            finally:
+                # 本步耗时过长时锁可能已被其他进程当作失效锁删除
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(self.lock_path)
+
+    # ---- 后台线程 ----
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.step()
+            except Exception as e:
+                print(f"垃圾回收出错: {e}", file=sys.stderr)
+            self._stop.wait(self.interval_seconds)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="storage-gc", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+import answer_cache
+from answer_cache import AnswerCache
+
+PROJECT = "/work/app"
+OPTIONS = ["继续", "停止"]
+
+
+def make_cache(tmp_path, ttl=3600, rules=None):
+    path = tmp_path / "answer_cache.json"
+    if rules is not None:
+        path.write_text(json.dumps({"rules": rules, "entries": []}, ensure_ascii=False), encoding="utf-8")
+    return AnswerCache(str(path), ttl)
+
+
+def test_stored_answer_matches_normalized_prompt(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.store("Proceed with the changes?", OPTIONS, PROJECT, "选中选项: 继续")
+    hit = cache.lookup("  proceed with   the CHANGES", OPTIONS, PROJECT)
+    assert hit["interactive_feedback"] == "选中选项: 继续"
+    assert hit["source"] == "cache"
+    # 选项或项目不同都不算同一问题
+    assert cache.lookup("Proceed with the changes?", ["继续"], PROJECT) is None
+    assert cache.lookup("Proceed with the changes?", OPTIONS, "/work/other") is None
+    # 其他进程读取同一个文件也能命中
+    assert make_cache(tmp_path).lookup("Proceed with the changes", OPTIONS, PROJECT) is not None
+    assert cache.snapshot()["hits"] == 1 and cache.snapshot()["misses"] == 2
+
+
+def test_ttl_expiry(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, ttl=60)
+    cache.store("是否继续", OPTIONS, PROJECT, "继续")
+    assert cache.lookup("是否继续", OPTIONS, PROJECT)["expires"] == pytest.approx(time.time() + 60, abs=5)
+
+    later = time.time() + 61
+    monkeypatch.setattr(answer_cache.time, "time", lambda: later)
+    assert cache.lookup("是否继续", OPTIONS, PROJECT) is None
+    assert cache.counters["expired"] == 1
+    # 过期的条目从文件中删除
+    assert json.loads((tmp_path / "answer_cache.json").read_text(encoding="utf-8"))["entries"] == []
+
+
+def test_zero_ttl_never_expires(tmp_path):
+    cache = make_cache(tmp_path, ttl=0)
+    cache.store("是否继续", OPTIONS, PROJECT, "继续")
+    assert cache.lookup("是否继续", OPTIONS, PROJECT)["expires"] is None
+
+
+def test_rules(tmp_path):
+    cache = make_cache(tmp_path, rules=[
+        {"match": "只在 b 项目", "project": "/work/b", "text": "b"},
+        {"match": "^是否继续", "predefined_options": OPTIONS, "options": ["继续"], "text": "自动确认"},
+        {"match": "覆盖", "options": [1]},
+        {"match": "[无效"},
+    ])
+    hit = cache.lookup("是否继续执行？", OPTIONS, PROJECT)
+    assert hit == {"interactive_feedback": "选中选项: 继续\n\n自动确认", "source": "rule", "expires": None}
+    # predefined_options 不一致时规则不生效
+    assert cache.lookup("是否继续执行？", ["继续"], PROJECT) is None
+    assert cache.lookup("要覆盖文件吗", ["是", "否"], PROJECT)["interactive_feedback"] == "选中选项: 否"
+    assert cache.lookup("只在 b 项目", None, PROJECT) is None
+    assert cache.lookup("只在 b 项目", None, "/work/b")["interactive_feedback"] == "b"
+    # 无效的正则被忽略，其余规则照常使用
+    assert cache.snapshot()["rules"] == 3
+
+    # 记住的回答优先于规则
+    cache.store("是否继续执行", OPTIONS, PROJECT, "停止")
+    assert cache.lookup("是否继续执行？", OPTIONS, PROJECT)["source"] == "cache"
+    # 写入记住的回答时保留手工编写的规则
+    other = make_cache(tmp_path)
+    assert other.lookup("要覆盖文件吗", ["是", "否"], PROJECT)["source"] == "rule"
+    assert other.snapshot()["rules"] == 3
+
+
+def test_corrupt_file_is_a_miss(tmp_path):
+    (tmp_path / "answer_cache.json").write_text("{not json", encoding="utf-8")
+    assert make_cache(tmp_path).lookup("是否继续", OPTIONS, PROJECT) is None
+
+
+class TestServerNeverCaches:
+    """服务端只记住用户点了"总是这样回答"的单个问题，批量提问、审阅补丁和超时不进缓存"""
+
+    DIFF = "--- a/x\n+++ b/x\n@@ -1 +1 @@\n-a\n+b"
+
+    @pytest.fixture
+    def server(self, tmp_path, monkeypatch):
+        pytest.importorskip("fastmcp")
+        import server
+        monkeypatch.setattr(server, "answer_cache", make_cache(tmp_path))
+        monkeypatch.setattr(server, "history_writer", None)
+        monkeypatch.setattr(server.config, "RECORD_LOG", "")
+        monkeypatch.setattr(server.config, "RESPONDER", "")
+        self.calls = 0
+
+        async def request_feedback(summary, predefinedOptions, deadline, questions=None, client=None, diff=None):
+            self.calls += 1
+            if summary == "slow":
+                await asyncio.sleep(10)
+            result = {"interactive_feedback": "选中选项: 继续", "attachments": [], "remember": summary != "forget"}
+            if questions:
+                result["answers"] = [{"question": q["question"], "interactive_feedback": "继续"} for q in questions]
+            return result
+
+        monkeypatch.setattr(server, "request_feedback", request_feedback)
+        return server
+
+    def ask(self, server, summary, **kwargs):
+        content = asyncio.run(server.launch_feedback_ui(summary, OPTIONS, PROJECT, **kwargs))
+        return json.loads(content[0].text)
+
+    def test_remembered_answer_is_reused(self, server):
+        self.ask(server, "是否继续")
+        result = self.ask(server, "是否继续")
+        assert result["auto_answered"]["source"] == "cache"
+        assert self.calls == 1
+
+    def test_not_remembered(self, server):
+        self.ask(server, "forget")
+        self.ask(server, "forget")
+        assert self.calls == 2
+        assert server.answer_cache.entries == {}
+
+    def test_batch_questions(self, server):
+        questions = [{"question": "是否继续"}]
+        self.ask(server, "是否继续", questions=questions)
+        self.ask(server, "是否继续", questions=questions)
+        assert self.calls == 2
+        assert server.answer_cache.entries == {}
+
+    def test_diff_review(self, server):
+        server.answer_cache.store("是否继续", OPTIONS, PROJECT, "记住的回答")
+        result = self.ask(server, "是否继续", diff=self.DIFF)
+        # 带补丁时不查缓存，也不记住这次的回答
+        assert self.calls == 1
+        assert result["hunks"][0]["decision"] == "undecided"
+        assert [e["interactive_feedback"] for e in server.answer_cache.entries.values()] == ["记住的回答"]
+
+    def test_timeout(self, server):
+        result = self.ask(server, "slow", timeout_seconds=0.05, default_answer="默认")
+        assert result["timed_out"] and result["interactive_feedback"] == "默认"
+        assert server.answer_cache.entries == {}
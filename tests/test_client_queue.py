@@ -0,0 +1,79 @@
+import asyncio
+
+from client_queue import FairQueue
+
+
+async def _run_jobs(queue: FairQueue, clients: list, order: list, peak: list):
+    running = 0
+
+    async def job(client: str):
+        nonlocal running
+        async with queue.slot(client):
+            running += 1
+            peak[0] = max(peak[0], running)
+            order.append(client)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    tasks = [asyncio.create_task(job(client)) for client in clients]
+    # 释放名额和等待者恢复之间到来的新请求也不能越过上限
+    await asyncio.sleep(0.005)
+    tasks.append(asyncio.create_task(job("late")))
+    await asyncio.gather(*tasks)
+
+
+def test_peak_concurrency_within_limit():
+    for max_active in (1, 2):
+        queue = FairQueue(max_active)
+        order, peak = [], [0]
+        asyncio.run(_run_jobs(queue, ["A", "A", "A", "B", "B"], order, peak))
+        assert peak[0] <= max_active
+        assert len(order) == 6
+        assert queue.reserved == 0 and not queue.active and not queue.waiting
+
+
+def test_round_robin_between_clients():
+    async def main():
+        queue = FairQueue(1)
+        order = []
+
+        async def job(client: str):
+            async with queue.slot(client):
+                order.append(client)
+                await asyncio.sleep(0.01)
+
+        tasks = [asyncio.create_task(job(c)) for c in "AAAABB"]
+        await asyncio.gather(*tasks)
+        return order
+
+    # 第一个 A 直接拿到名额，其余请求按客户端轮转
+    assert asyncio.run(main()) == list("AABABA")
+
+
+def test_cancelled_waiter_releases_reservation():
+    async def main():
+        queue = FairQueue(1)
+        release = asyncio.Event()
+
+        async def holder():
+            async with queue.slot("A"):
+                await release.wait()
+
+        async def waiter(client: str):
+            async with queue.slot(client):
+                await asyncio.sleep(0)
+
+        first = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        second = asyncio.create_task(waiter("B"))
+        third = asyncio.create_task(waiter("C"))
+        await asyncio.sleep(0)
+        release.set()
+        # 名额已分配给 B，但 B 在恢复运行之前被取消，名额应转给 C
+        await asyncio.sleep(0)
+        second.cancel()
+        await asyncio.gather(first, second, third, return_exceptions=True)
+        return queue
+
+    queue = asyncio.run(main())
+    assert queue.reserved == 0 and not queue.active and not queue.waiting
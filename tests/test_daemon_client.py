@@ -0,0 +1,67 @@
+import asyncio
+import io
+
+import pytest
+
+pytest.importorskip("fastmcp")
+
+import ipc
+import server
+from attachment_store import AttachmentStore
+
+
+class FakeProcess:
+    def __init__(self):
+        self.stdout = asyncio.StreamReader()
+
+
+def result_frames(request_id: str, text: str, attachment: bytes = b"") -> bytes:
+    buffer = io.BytesIO()
+    ipc.write_message(buffer, {"type": "result", "id": request_id, "interactive_feedback": text,
+                               "attachment_count": 1 if attachment else 0})
+    if attachment:
+        ipc.write_message(buffer, {"type": "attachment", "name": "a.bin", "file_type": "file", "size": len(attachment)})
+        ipc.write_bytes(buffer, attachment)
+    return buffer.getvalue()
+
+
+def test_exit_fails_only_that_process_requests():
+    async def main():
+        client = server.FeedbackDaemonClient("unused")
+        old, new = FakeProcess(), FakeProcess()
+        loop = asyncio.get_running_loop()
+        client.pending = {old: {"a": loop.create_future()}, new: {"b": loop.create_future()}}
+        old_pending, new_pending = client.pending[old], client.pending[new]
+        futures = {**old_pending, **new_pending}
+        old.stdout.feed_eof()
+        await client._read_responses(old, old_pending)
+        return client, futures, new
+
+    client, futures, new = asyncio.run(main())
+    assert isinstance(futures["a"].exception(), ConnectionError)
+    assert not futures["b"].done()
+    assert list(client.pending) == [new]
+
+
+def test_storage_error_fails_only_that_request(tmp_path, monkeypatch):
+    class FullStore(AttachmentStore):
+        def new_session(self):
+            raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(server, "attachment_store", FullStore(str(tmp_path)))
+
+    async def main():
+        client = server.FeedbackDaemonClient("unused")
+        process = FakeProcess()
+        loop = asyncio.get_running_loop()
+        pending = {"a": loop.create_future(), "b": loop.create_future()}
+        client.pending = {process: pending}
+        futures = dict(pending)
+        process.stdout.feed_data(result_frames("a", "with attachment", b"x" * 100) + result_frames("b", "plain"))
+        process.stdout.feed_eof()
+        await client._read_responses(process, pending)
+        return futures
+
+    futures = asyncio.run(main())
+    assert isinstance(futures["a"].exception(), ipc.AttachmentStorageError)
+    assert futures["b"].result()["interactive_feedback"] == "plain"
@@ -0,0 +1,73 @@
+import pytest
+
+import history
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "history.sqlite3")
+    writer = history.HistoryWriter(path)
+    writer.start()
+    yield path, writer
+    writer.stop()
+
+
+def fill(db, rounds):
+    path, writer = db
+    for prompt, answer, project, client in rounds:
+        writer.record(prompt, answer, project=project, client=client, mode="daemon")
+    assert writer.flush(5)
+    return history.connect(path, readonly=True)
+
+
+ROUNDS = [
+    ("是否继续部署到测试环境", "继续", "/work/a", "Cursor"),
+    ("Run the database migration?", "yes, go", "/work/a", "Cline"),
+    ("删除旧的 UI 组件", "保留 UI 目录", "/work/b", "Cursor"),
+    ("Rename the CLI flag", "ok", "/work/b", "Cline"),
+]
+
+
+def prompts(rounds):
+    return [r["prompt"] for r in rounds]
+
+
+def test_trigram_and_recent(db):
+    conn = fill(db, ROUNDS)
+    assert history.count(conn) == 4
+    assert prompts(history.search(conn, "migration")) == ["Run the database migration?"]
+    # 中文按子串匹配，关键词可以出现在提示或回答中
+    assert prompts(history.search(conn, "测试环境")) == ["是否继续部署到测试环境"]
+    assert prompts(history.search(conn, "保留")) == ["删除旧的 UI 组件"]
+    assert prompts(history.search(conn, "database yes")) == ["Run the database migration?"]
+    assert prompts(history.search(conn, "", limit=2)) == ["Rename the CLI flag", "删除旧的 UI 组件"]
+    record = history.search(conn, "Rename")[0]
+    assert (record["project"], record["client"], record["mode"], record["answer"]) == ("/work/b", "Cline", "daemon", "ok")
+
+
+def test_short_terms(db, monkeypatch):
+    conn = fill(db, ROUNDS)
+    assert prompts(history.search(conn, "UI")) == ["删除旧的 UI 组件"]
+    assert prompts(history.search(conn, "ok")) == ["Rename the CLI flag"]
+    # 短词和长词组合时在全文检索结果中再过滤
+    assert prompts(history.search(conn, "UI 组件")) == ["删除旧的 UI 组件"]
+    assert history.search(conn, "UI migration") == []
+    # LIKE 的通配符按字面匹配
+    assert history.search(conn, "%") == []
+    # 短词只查最近的记录
+    monkeypatch.setattr(history, "SHORT_TERM_WINDOW", 1)
+    assert history.search(conn, "UI") == []
+
+
+def test_filter_by_project_and_client(db):
+    conn = fill(db, ROUNDS)
+    assert prompts(history.search(conn, project="/work/a")) == ["Run the database migration?", "是否继续部署到测试环境"]
+    assert prompts(history.search(conn, client="Cursor")) == ["删除旧的 UI 组件", "是否继续部署到测试环境"]
+    assert prompts(history.search(conn, project="/work/b", client="Cline")) == ["Rename the CLI flag"]
+    assert prompts(history.search(conn, "UI", client="Cursor")) == ["删除旧的 UI 组件"]
+    assert history.search(conn, "migration", client="Cursor") == []
+    assert history.search(conn, "migration", project="/work/b") == []
+
+
+def test_readonly_missing_database(tmp_path):
+    assert history.connect(str(tmp_path / "missing.sqlite3"), readonly=True) is None
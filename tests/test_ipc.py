@@ -0,0 +1,129 @@
+import asyncio
+import io
+
+import pytest
+
+import ipc
+
+
+class Sink(io.BytesIO):
+    """open_attachment 返回的可写对象，关闭时保留内容"""
+
+    def __init__(self, store: dict, name: str):
+        super().__init__()
+        self.store = store
+        self.name = name
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.store[self.name] = self.getvalue()
+        return super().__exit__(exc_type, exc, tb)
+
+
+def stream_reader(data: bytes) -> asyncio.StreamReader:
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return reader
+
+
+def read_frame_async(data: bytes):
+    async def read():
+        return await ipc.read_frame_async(stream_reader(data))
+    return asyncio.run(read())
+
+
+def encode(write) -> bytes:
+    buffer = io.BytesIO()
+    write(buffer)
+    return buffer.getvalue()
+
+
+def test_result_round_trip(tmp_path):
+    big = bytes(range(256)) * (ipc.CHUNK_SIZE // 128)  # 跨越多个数据块
+    small = b"hello"
+    (tmp_path / "big.bin").write_bytes(big)
+    (tmp_path / "a.png").write_bytes(small)
+    result = {
+        "interactive_feedback": "好的",
+        "remember": True,
+        "answers": [{"question": "q", "text": "a"}],
+        "hunks": ["accepted"],
+        "spans": [{"name": "submit", "ms": 1.0}],
+        "attachments": [
+            {"name": "big.bin", "type": "file", "size": len(big), "path": str(tmp_path / "big.bin")},
+            {"name": "a.png", "type": "image", "size": len(small), "path": str(tmp_path / "a.png"),
+             "rendition": b"jpegdata", "rendition_format": "jpeg"},
+        ],
+    }
+    data = encode(lambda s: ipc.write_result(s, "r1", result))
+
+    async def read():
+        reader = stream_reader(data)
+        header = await ipc.read_message_async(reader)
+        stored = {}
+        decoded = await ipc.read_result_async(reader, header, lambda meta: Sink(stored, meta["name"]))
+        return header, decoded, stored, await ipc.read_message_async(reader)
+
+    header, decoded, stored, tail = asyncio.run(read())
+    assert header["id"] == "r1" and header["spans"] == result["spans"]
+    assert stored == {"big.bin": big, "a.png": small}
+    assert decoded["interactive_feedback"] == "好的"
+    assert decoded["remember"] is True
+    assert decoded["answers"] == result["answers"]
+    assert decoded["hunks"] == ["accepted"]
+    assert decoded["attachments"][0] == {"name": "big.bin", "type": "file", "size": len(big)}
+    assert decoded["attachments"][1]["rendition"] == b"jpegdata"
+    assert decoded["attachments"][1]["rendition_format"] == "jpeg"
+    assert tail is None
+
+
+@pytest.mark.parametrize("cut", [3, ipc.FRAME_HEADER.size + 4])
+def test_truncated_frame_raises_protocol_error(cut):
+    data = encode(lambda s: ipc.write_message(s, {"type": "result", "text": "x" * 100}))[:cut]
+    with pytest.raises(ipc.ProtocolError):
+        read_frame_async(data)
+    with pytest.raises(ipc.ProtocolError):
+        ipc.read_frame(io.BytesIO(data))
+
+
+def test_end_of_stream_returns_none():
+    assert read_frame_async(b"") is None
+    assert ipc.read_frame(io.BytesIO(b"")) is None
+
+
+def test_empty_chunk_ends_stream():
+    def write(stream):
+        ipc.write_frame(stream, ipc.CHUNK, b"abc")
+        ipc.write_frame(stream, ipc.CHUNK, b"def")
+        ipc.write_frame(stream, ipc.CHUNK)
+        ipc.write_message(stream, {"type": "next"})
+
+    async def read():
+        reader = stream_reader(encode(write))
+        chunks = [chunk async for chunk in ipc.read_chunks_async(reader)]
+        return chunks, await ipc.read_message_async(reader)
+
+    assert asyncio.run(read()) == ([b"abc", b"def"], {"type": "next"})
+
+
+def test_storage_error_keeps_stream_in_sync(tmp_path):
+    (tmp_path / "a.bin").write_bytes(b"x" * 1000)
+    attachment = {"name": "a.bin", "type": "file", "size": 1000, "path": str(tmp_path / "a.bin")}
+    data = encode(lambda s: (ipc.write_result(s, "r1", {"attachments": [attachment]}),
+                             ipc.write_result(s, "r2", {"interactive_feedback": "next"})))
+
+    class Full(io.BytesIO):
+        def write(self, chunk):
+            raise OSError(28, "No space left on device")
+
+    async def read():
+        reader = stream_reader(data)
+        with pytest.raises(ipc.AttachmentStorageError):
+            await ipc.read_result_async(reader, await ipc.read_message_async(reader), lambda meta: Full())
+        header = await ipc.read_message_async(reader)
+        return header, await ipc.read_result_async(reader, header, lambda meta: Full())
+
+    header, result = asyncio.run(read())
+    assert header["id"] == "r2"
+    assert result["interactive_feedback"] == "next"
@@ -0,0 +1,200 @@
+import os
+import time
+
+import pytest
+
+import storage_gc
+from attachment_store import AttachmentStore
+from storage_gc import GarbageCollector, append_journal
+
+MAX_AGE = 3600
+OLD = time.time() - 2 * MAX_AGE
+
+
+@pytest.fixture
+def store(tmp_path):
+    return AttachmentStore(str(tmp_path / "attachments"))
+
+
+@pytest.fixture
+def temp_dir(tmp_path):
+    path = tmp_path / "temp"
+    path.mkdir()
+    return str(path)
+
+
+def make_gc(store, temp_dir, max_bytes=10 ** 12, interval=0):
+    return GarbageCollector(store, [temp_dir], max_age_seconds=MAX_AGE, max_bytes=max_bytes,
+                            interval_seconds=interval, batch_size=1000)
+
+
+def make_temp(gc, temp_dir, name, when=None, size=10):
+    path = os.path.join(temp_dir, name)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    append_journal(gc.journal_path, {"kind": "temp", "path": path, "size": size, "time": when or time.time()})
+    return path
+
+
+def make_session(store, gc, files, when):
+    """提交一个包含 files（名字 -> 内容）的会话，并以 when 为最后访问时间登记"""
+    session = store.new_session()
+    for name, content in files.items():
+        with session.open({"name": name}) as writer:
+            writer.write(content)
+    session.commit()
+    append_journal(gc.journal_path, {
+        "kind": "session",
+        "path": session.session_dir,
+        "blobs": {e["sha256"]: e["size"] for e in session.entries},
+        "time": when,
+    })
+    return session
+
+
+def test_half_written_line_is_read_on_next_step(store, temp_dir):
+    gc = make_gc(store, temp_dir)
+    gc.step(force=True)
+    first = make_temp(gc, temp_dir, "a.png")
+    line = f'{{"kind": "temp", "path": "{os.path.join(temp_dir, "b.png")}", "size": 5, "time": {time.time()}}}'
+    with open(gc.journal_path, "ab") as f:
+        f.write(line[:20].encode())
+    gc.step(force=True)
+    assert list(gc.temp_files) == [first]
+
+    with open(gc.journal_path, "ab") as f:
+        f.write(line[20:].encode() + b"\n")
+    gc.step(force=True)
+    assert sorted(gc.temp_files) == [first, os.path.join(temp_dir, "b.png")]
+
+
+def test_rotated_journal_keeps_entries(store, temp_dir, monkeypatch):
+    monkeypatch.setattr(storage_gc, "_JOURNAL_ROTATE_BYTES", 1)
+    gc = make_gc(store, temp_dir)
+    gc.step(force=True)
+    first = make_temp(gc, temp_dir, "a.png")
+    gc.step(force=True)
+    assert not os.path.exists(gc.journal_path)
+    assert gc._journal_offset == 0
+
+    second = make_temp(gc, temp_dir, "b.png")
+    gc.step(force=True)
+    assert sorted(gc.temp_files) == [first, second]
+    # 另一个进程从索引载入，也能看到轮转前后的条目
+    other = make_gc(store, temp_dir)
+    other.step(force=True)
+    assert sorted(other.temp_files) == [first, second]
+
+
+def test_expired_entries_are_removed(store, temp_dir):
+    gc = make_gc(store, temp_dir)
+    gc.step(force=True)
+    old = make_temp(gc, temp_dir, "old.png", when=OLD)
+    fresh = make_temp(gc, temp_dir, "fresh.png")
+    assert gc.step(force=True) == 1
+    assert not os.path.exists(old)
+    assert os.path.exists(fresh)
+    assert list(gc.temp_files) == [fresh]
+    assert gc.total_bytes == 10
+
+
+def test_touched_session_survives_stale_heap_entry(store, temp_dir):
+    gc = make_gc(store, temp_dir)
+    gc.step(force=True)
+    touched = make_session(store, gc, {"a.txt": b"touched"}, OLD)
+    expired = make_session(store, gc, {"b.txt": b"expired"}, OLD)
+    gc.step(force=True)
+    assert not os.path.exists(expired.session_dir)
+
+    # 首次登记也是在过期之前，堆中留下旧的元素
+    gc2 = make_gc(store, temp_dir)
+    session = make_session(store, gc2, {"c.txt": b"later"}, OLD)
+    gc2.touch_session(session.session_id)
+    gc2.step(force=True)
+    assert os.path.exists(session.session_dir)
+    assert os.path.exists(store.blob_path(session.entries[0]["sha256"]))
+    assert gc2.sessions[session.session_dir]["last_access"] > OLD
+    assert not os.path.exists(touched.session_dir)
+
+
+def test_lru_eviction_keeps_shared_blob(store, temp_dir):
+    shared, unique = b"s" * 100, b"u" * 50
+    gc = make_gc(store, temp_dir, max_bytes=120)
+    gc.step(force=True)
+    now = time.time()
+    oldest = make_session(store, gc, {"shared.bin": shared, "unique.bin": unique}, now - 20)
+    newer = make_session(store, gc, {"shared.bin": shared}, now - 10)
+    shared_digest = newer.entries[0]["sha256"]
+    unique_digest = next(e["sha256"] for e in oldest.entries if e["name"] == "unique.bin")
+
+    assert gc.step(force=True) == 1
+    assert not os.path.exists(oldest.session_dir)
+    assert not os.path.exists(store.blob_path(unique_digest))
+    assert os.path.exists(newer.session_dir)
+    assert os.path.exists(store.blob_path(shared_digest))
+    assert gc.total_bytes == 100
+
+
+def test_rate_limit_and_lock(store, temp_dir):
+    gc = make_gc(store, temp_dir, interval=3600)
+    gc.step(force=True)
+    old = make_temp(gc, temp_dir, "old.png", when=OLD)
+    # 间隔内（任一进程回收过）不回收
+    assert make_gc(store, temp_dir, interval=3600).step() == 0
+    assert os.path.exists(old)
+
+    # 其他进程持有锁时即使强制也不回收；锁失效后被清除
+    open(gc.lock_path, "w").close()
+    assert gc.step(force=True) == 0
+    assert os.path.exists(old)
+    stale = time.time() - storage_gc._STALE_LOCK_SECONDS - 1
+    os.utime(gc.lock_path, (stale, stale))
+    assert gc.step(force=True) == 0
+    assert not os.path.exists(gc.lock_path)
+    assert gc.step(force=True) == 1
+    assert not os.path.exists(old)
+
+
+def test_lock_removed_by_other_process(store, temp_dir, monkeypatch):
+    gc = make_gc(store, temp_dir)
+    original = gc._collect
+
+    def collect():
+        os.unlink(gc.lock_path)
+        return original()
+
+    monkeypatch.setattr(gc, "_collect", collect)
+    assert gc.step(force=True) == 0
+
+
+def test_index_rewritten_only_on_change(store, temp_dir):
+    gc = make_gc(store, temp_dir)
+    gc.step(force=True)
+    make_temp(gc, temp_dir, "a.png")
+    gc.step(force=True)
+    inode = os.stat(gc.index_path).st_ino
+    gc.step(force=True)
+    make_gc(store, temp_dir).step(force=True)
+    assert os.stat(gc.index_path).st_ino == inode
+
+    make_temp(gc, temp_dir, "b.png")
+    gc.step(force=True)
+    assert os.stat(gc.index_path).st_ino != inode
+
+
+def test_removed_request_dir_leaves_index(store, temp_dir):
+    gc = make_gc(store, temp_dir)
+    gc.step(force=True)
+    request_dir = os.path.join(temp_dir, "0123456789abcdef")
+    os.makedirs(request_dir)
+    make_temp(gc, request_dir, "clipboard.png", size=1000)
+    loose = make_temp(gc, temp_dir, "loose.png", size=10)
+    gc.step(force=True)
+    # 请求目录中的文件提交后已存为 blob，不计入占用
+    assert gc.total_bytes == 10
+    assert request_dir in gc.temp_files
+
+    storage_gc.shutil.rmtree(request_dir)
+    gc.record_removed(request_dir)
+    gc.step(force=True)
+    assert list(gc.temp_files) == [loose]
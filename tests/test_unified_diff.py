@@ -0,0 +1,111 @@
+from unified_diff import ACCEPTED, REJECTED, UNDECIDED, extract_diff, hunk_count, parse_diff, review_result
+
+TWO_HUNKS = """\
+diff --git a/src/app.py b/src/app.py
+index 1111111..2222222 100644
+--- a/src/app.py
++++ b/src/app.py
+@@ -1,3 +1,3 @@
+ import os
+-import sys
++import json
+
+@@ -10,2 +10,3 @@ def main():
+     run()
++    cleanup()
+     return 0"""
+
+
+def kinds(hunk):
+    return "".join(line.kind for line in hunk.lines)
+
+
+def test_multiple_hunks_and_line_numbers():
+    files = parse_diff(TWO_HUNKS)
+    assert len(files) == 1
+    file = files[0]
+    assert (file.old_path, file.new_path, file.path) == ("src/app.py", "src/app.py", "src/app.py")
+    assert file.meta == ["index 1111111..2222222 100644"]
+    assert hunk_count(files) == 2
+    first, second = file.hunks
+    assert kinds(first) == " -+ "
+    # 行首空格被去掉的空上下文行仍算作上下文
+    assert [(l.old_no, l.new_no) for l in first.lines] == [(1, 1), (2, None), (None, 2), (3, 3)]
+    assert second.header == "@@ -10,2 +10,3 @@ def main():"
+    assert (second.old_start, second.new_start, second.added, second.removed) == (10, 10, 1, 0)
+    assert (file.added, file.removed) == (2, 1)
+
+
+def test_no_newline_marker():
+    files = parse_diff("""\
+--- a/notes.txt
++++ b/notes.txt
+@@ -1 +1 @@
+-old
+\\ No newline at end of file
++new
+\\ No newline at end of file""")
+    hunk = files[0].hunks[0]
+    assert kinds(hunk) == "-\\+\\"
+    assert hunk.lines[1].text == "No newline at end of file"
+    assert (hunk.lines[1].old_no, hunk.lines[1].new_no) == (None, None)
+    assert (hunk.added, hunk.removed) == (1, 1)
+
+
+def test_dev_null_add_and_delete():
+    files = parse_diff("""\
+diff --git a/new.txt b/new.txt
+new file mode 100644
+--- /dev/null
++++ b/new.txt
+@@ -0,0 +1,2 @@
++one
++two
+diff --git a/gone.txt b/gone.txt
+deleted file mode 100644
+--- a/gone.txt
++++ /dev/null
+@@ -1 +0,0 @@
+-bye""")
+    added, deleted = files
+    assert (added.old_path, added.path) == ("/dev/null", "new.txt")
+    assert added.meta == ["new file mode 100644"]
+    assert [l.new_no for l in added.hunks[0].lines] == [1, 2]
+    assert (deleted.new_path, deleted.path) == ("/dev/null", "gone.txt")
+    assert [l.old_no for l in deleted.hunks[0].lines] == [1]
+    assert [r["file"] for r in review_result(files, ACCEPTED)] == ["new.txt", "gone.txt"]
+
+
+def test_extract_fenced_diff():
+    message = f"请检查下面的修改：\n```diff\n{TWO_HUNKS}\n```\n确认后我再提交。"
+    prompt, diff = extract_diff(message)
+    assert diff == TWO_HUNKS
+    assert prompt == "请检查下面的修改：\n确认后我再提交。"
+
+
+def test_extract_bare_diff_stops_at_prose():
+    message = f"修改如下\n{TWO_HUNKS}\n这样可以吗？"
+    prompt, diff = extract_diff(message)
+    assert diff == TWO_HUNKS
+    assert prompt == "修改如下\n这样可以吗？"
+
+
+def test_extract_without_diff():
+    message = "比较 a @@ b 的写法\n--- 分隔线\n没有补丁"
+    assert extract_diff(message) == (message, "")
+    # 代码块中不是补丁时继续查找后面的内容
+    fenced = "```diff\n不是补丁 @@\n```"
+    assert extract_diff(fenced) == (fenced, "")
+
+
+def test_truncated_hunk_keeps_lines():
+    files = parse_diff("--- a/x\n+++ b/x\n@@ -1,5 +1,5 @@\n ctx\n-old")
+    assert kinds(files[0].hunks[0]) == " -"
+
+
+def test_review_result_decisions():
+    files = parse_diff(TWO_HUNKS)
+    assert [r["decision"] for r in review_result(files, [ACCEPTED, "bogus"])] == [ACCEPTED, UNDECIDED]
+    assert [r["decision"] for r in review_result(files, [REJECTED])] == [REJECTED, UNDECIDED]
+    assert [r["decision"] for r in review_result(files, None)] == [UNDECIDED, UNDECIDED]
+    assert [r["hunk"] for r in review_result(files, REJECTED)] == [0, 1]
@@ -0,0 +1,172 @@
+# 耗时统计
+# 1. 打点（mark）：设置 INTERACTIVE_FEEDBACK_TIMING_LOG 后，服务端和界面进程会把关键时刻各以一行JSON
+#    追加到同一个文件（{"event": ..., "time": 墙上时间, "pid": ..., ...}），
+#    供 benchmark.py 按时间先后拼出启动、首帧、提交到返回等各阶段的耗时。未设置时 mark() 直接返回。
+# 2. 阶段（span）：每轮反馈都会记录各阶段的起止时间。界面进程的阶段随结果一起回传给服务端，
+#    服务端补上自己的阶段后汇总到 SpanStats，通过 MCP 资源 metrics://timing 查询，
+#    并可选地写入 JSONL 文件（每轮一行）和 Prometheus textfile。
+import os
+import sys
+import json
+import math
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List
+
+import config
+
+
+def enabled() -> bool:
+    return bool(config.TIMING_LOG)
+
+
+def mark(event: str, **fields: Any):
+    """记录一个时间点（多进程并发追加安全）"""
+    if not config.TIMING_LOG:
+        return
+    record = {"event": event, "time": time.time(), "pid": os.getpid(), **fields}
+    line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+    try:
+        fd = os.open(config.TIMING_LOG, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+class SpanRecorder:
+    """记录一轮反馈中的各个阶段，span 为 {"name", "start"(墙上时间), "duration"(秒)}"""
+
+    def __init__(self):
+        self.spans: List[Dict[str, Any]] = []
+        self._open: Dict[str, float] = {}
+
+    def add(self, name: str, start: float, duration: float):
+        self.spans.append({"name": name, "start": start, "duration": max(0.0, duration)})
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        start = time.time()
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.perf_counter() - began)
+
+    def begin(self, name: str):
+        """开始一个跨事件的阶段（例如用户停留时间），由 end() 结束"""
+        self._open[name] = time.time()
+
+    def end(self, name: str):
+        start = self._open.pop(name, None)
+        if start is not None:
+            self.add(name, start, time.time() - start)
+
+    def is_open(self, name: str) -> bool:
+        return name in self._open
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """取出已记录的阶段并清空（未结束的阶段丢弃）"""
+        spans, self.spans = self.spans, []
+        self._open.clear()
+        return spans
+
+
+# 界面进程启动阶段（进程启动、QApplication 初始化等），随该进程的第一轮结果一起回传
+startup = SpanRecorder()
+
+# 服务端创建界面进程时把当时的墙上时间放在这个环境变量中
+SPAWNED_AT_ENV = "INTERACTIVE_FEEDBACK_SPAWNED_AT"
+
+
+def child_env() -> Dict[str, str]:
+    """创建界面进程时使用的环境变量"""
+    return {**os.environ, SPAWNED_AT_ENV: repr(time.time())}
+
+
+def record_process_launch():
+    """在界面进程的入口处调用，记录从创建进程到开始执行脚本的耗时"""
+    try:
+        spawned_at = float(os.environ.pop(SPAWNED_AT_ENV))
+    except (KeyError, ValueError):
+        return
+    startup.add("process_launch", spawned_at, time.time() - spawned_at)
+
+
+def _percentile(ordered: List[float], p: float) -> float:
+    """最近秩法计算百分位数，ordered 需已排序"""
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class SpanStats:
+    """服务端汇总：每个阶段的次数、总和、最小/最大值，以及最近 window 个样本用于计算分位数"""
+
+    QUANTILES = (50, 95, 99)
+
+    def __init__(self, jsonl_path: str = "", textfile_path: str = "", window: int = 1024):
+        self.jsonl_path = jsonl_path
+        self.textfile_path = textfile_path.replace("{pid}", str(os.getpid()))
+        self.window = window
+        self.rounds = 0
+        self.stats: Dict[str, Dict[str, Any]] = {}
+        self.samples: Dict[str, Deque[float]] = {}
+
+    def record_round(self, spans: List[Dict[str, Any]], **labels: Any):
+        """汇总一轮反馈的所有阶段，并写出到已配置的输出"""
+        self.rounds += 1
+        for span in spans:
+            name, duration = span["name"], float(span["duration"])
+            stat = self.stats.setdefault(name, {"count": 0, "sum": 0.0, "min": duration, "max": duration})
+            stat["count"] += 1
+            stat["sum"] += duration
+            stat["min"] = min(stat["min"], duration)
+            stat["max"] = max(stat["max"], duration)
+            self.samples.setdefault(name, deque(maxlen=self.window)).append(duration)
+        try:
+            if self.jsonl_path:
+                self._append_jsonl(spans, labels)
+            if self.textfile_path:
+                self._write_textfile()
+        except OSError as e:
+            print(f"写出耗时统计失败: {e}", file=sys.stderr)
+
+    def snapshot(self) -> Dict[str, Any]:
+        spans = {}
+        for name, stat in self.stats.items():
+            ordered = sorted(self.samples[name])
+            spans[name] = {
+                "count": stat["count"],
+                "mean_ms": stat["sum"] / stat["count"] * 1000,
+                "min_ms": stat["min"] * 1000,
+                "max_ms": stat["max"] * 1000,
+                **{f"p{q}_ms": _percentile(ordered, q) * 1000 for q in self.QUANTILES},
+            }
+        return {"rounds": self.rounds, "window": self.window, "spans": spans}
+
+    def _append_jsonl(self, spans: List[Dict[str, Any]], labels: Dict[str, Any]):
+        record = {"time": time.time(), "pid": os.getpid(), **labels, "spans": spans}
+        with open(self.jsonl_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _write_textfile(self):
+        """按 node_exporter textfile 采集器的格式整体重写（先写临时文件再替换）"""
+        lines = [
+            "# HELP interactive_feedback_rounds_total Feedback rounds recorded by this server process.",
+            "# TYPE interactive_feedback_rounds_total counter",
+            f"interactive_feedback_rounds_total {self.rounds}",
+            "# HELP interactive_feedback_span_seconds Duration of each phase of a feedback round.",
+            "# TYPE interactive_feedback_span_seconds summary",
+        ]
+        for name, stat in sorted(self.stats.items()):
+            ordered = sorted(self.samples[name])
+            for q in self.QUANTILES:
+                lines.append(f'interactive_feedback_span_seconds{{span="{name}",quantile="{q / 100}"}} {_percentile(ordered, q):.6f}')
+            lines.append(f'interactive_feedback_span_seconds_sum{{span="{name}"}} {stat["sum"]:.6f}')
+            lines.append(f'interactive_feedback_span_seconds_count{{span="{name}"}} {stat["count"]}')
+        tmp_path = f"{self.textfile_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.textfile_path)
@@ -0,0 +1,212 @@
+# unified diff 的解析，供服务端识别提示中的补丁、界面逐块显示和回传每块的接受/拒绝
+# 支持 git diff 和 diff -u 的输出：文件头（diff --git、index、---/+++ 等）和 @@ 块，
+# 块内按 @@ 头中的行数判断结束，遇到不属于补丁的行就停止，后面的文字仍当作普通提示。
+import re
+from typing import Any, List, Optional, Tuple
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@(.*)$")
+_FENCE = re.compile(r"^ {0,3}(`{3,}|~{3,})\s*(diff|patch|udiff)\s*$", re.IGNORECASE)
+# 文件头中可能出现的元信息行
+_FILE_META = ("index ", "new file mode", "deleted file mode", "old mode", "new mode", "similarity index",
+              "dissimilarity index", "rename from", "rename to", "copy from", "copy to", "Binary files", "GIT binary patch")
+
+# 每块的处理结果
+ACCEPTED = "accepted"
+REJECTED = "rejected"
+UNDECIDED = "undecided"
+DECISIONS = (ACCEPTED, REJECTED, UNDECIDED)
+
+
+class DiffLine:
+    """块中的一行；kind 为 " "（上下文）、"-"、"+" 或 "\\"（无换行标记），行号从 1 开始，不适用时为 None"""
+
+    __slots__ = ("kind", "text", "old_no", "new_no")
+
+    def __init__(self, kind: str, text: str, old_no: Optional[int], new_no: Optional[int]):
+        self.kind = kind
+        self.text = text
+        self.old_no = old_no
+        self.new_no = new_no
+
+
+class Hunk:
+    __slots__ = ("header", "old_start", "new_start", "lines", "added", "removed")
+
+    def __init__(self, header: str, old_start: int, new_start: int):
+        self.header = header
+        self.old_start = old_start
+        self.new_start = new_start
+        self.lines: List[DiffLine] = []
+        self.added = 0
+        self.removed = 0
+
+
+class DiffFile:
+    __slots__ = ("old_path", "new_path", "meta", "hunks")
+
+    def __init__(self, old_path: str = "", new_path: str = ""):
+        self.old_path = old_path
+        self.new_path = new_path
+        self.meta: List[str] = []
+        self.hunks: List[Hunk] = []
+
+    @property
+    def path(self) -> str:
+        """显示用的路径：删除的文件用旧路径，其余用新路径"""
+        if self.new_path and self.new_path != "/dev/null":
+            return self.new_path
+        return self.old_path
+
+    @property
+    def added(self) -> int:
+        return sum(hunk.added for hunk in self.hunks)
+
+    @property
+    def removed(self) -> int:
+        return sum(hunk.removed for hunk in self.hunks)
+
+
+def _strip_prefix(path: str) -> str:
+    """去掉 ---/+++ 行中的时间戳和 git 的 a/、b/ 前缀"""
+    path = path.split("\t", 1)[0].strip()
+    if path.startswith('"') and path.endswith('"'):
+        path = path[1:-1]
+    if path[:2] in ("a/", "b/"):
+        path = path[2:]
+    return path
+
+
+def parse_diff_lines(lines: List[str], start: int = 0) -> Tuple[List[DiffFile], int]:
+    """从 lines[start] 开始解析，返回解析出的文件和补丁之后第一行的位置"""
+    files: List[DiffFile] = []
+    current: Optional[DiffFile] = None
+    hunk: Optional[Hunk] = None
+    old_left = new_left = 0
+    old_no = new_no = 0
+    index = start
+    while index < len(lines):
+        line = lines[index]
+        if hunk is not None and (old_left > 0 or new_left > 0):
+            kind = line[:1] or " "  # 有的编辑器会去掉上下文空行行首的空格
+            if kind == " " and old_left > 0 and new_left > 0:
+                hunk.lines.append(DiffLine(" ", line[1:], old_no, new_no))
+                old_no += 1
+                new_no += 1
+                old_left -= 1
+                new_left -= 1
+            elif kind == "-" and old_left > 0:
+                hunk.lines.append(DiffLine("-", line[1:], old_no, None))
+                hunk.removed += 1
+                old_no += 1
+                old_left -= 1
+            elif kind == "+" and new_left > 0:
+                hunk.lines.append(DiffLine("+", line[1:], None, new_no))
+                hunk.added += 1
+                new_no += 1
+                new_left -= 1
+            elif kind == "\\":
+                hunk.lines.append(DiffLine("\\", line[1:].strip(), None, None))
+            else:
+                break
+            index += 1
+            continue
+        if line.startswith("\\") and hunk is not None:
+            hunk.lines.append(DiffLine("\\", line[1:].strip(), None, None))
+        elif line.startswith("diff --git ") or line.startswith("diff -"):
+            current = DiffFile()
+            files.append(current)
+            hunk = None
+            # 路径含空格时以后面的 ---/+++ 行为准
+            parts = line.split(" ")
+            current.old_path, current.new_path = _strip_prefix(parts[-2]), _strip_prefix(parts[-1])
+        elif line.startswith("--- ") and index + 1 < len(lines) and lines[index + 1].startswith("+++ "):
+            if current is None or current.hunks:
+                current = DiffFile()
+                files.append(current)
+            current.old_path = _strip_prefix(line[4:])
+            current.new_path = _strip_prefix(lines[index + 1][4:])
+            hunk = None
+            index += 1
+        elif line.startswith("@@") and current is not None:
+            match = _HUNK_HEADER.match(line)
+            if match is None:
+                break
+            old_start, old_count, new_start, new_count, _ = match.groups()
+            old_left = 1 if old_count is None else int(old_count)
+            new_left = 1 if new_count is None else int(new_count)
+            old_no = int(old_start) if old_left else int(old_start) + 1
+            new_no = int(new_start) if new_left else int(new_start) + 1
+            hunk = Hunk(line, old_no, new_no)
+            current.hunks.append(hunk)
+        elif current is not None and not current.hunks and line.startswith(_FILE_META):
+            current.meta.append(line)
+        else:
+            break
+        index += 1
+    # 补丁被截断时最后一块不完整，保留已有的行
+    return [f for f in files if f.hunks or f.meta], index
+
+
+def parse_diff(text: str) -> List[DiffFile]:
+    files, _ = parse_diff_lines(text.splitlines())
+    return files
+
+
+def _starts_diff(lines: List[str], index: int) -> bool:
+    line = lines[index]
+    if line.startswith("diff --git "):
+        return True
+    return (line.startswith("--- ") and index + 2 < len(lines)
+            and lines[index + 1].startswith("+++ ") and lines[index + 2].startswith("@@"))
+
+
+def extract_diff(message: str) -> Tuple[str, str]:
+    """在提示中找出补丁：优先取 ```diff 代码块，否则取第一段 git diff / diff -u 输出。
+    返回 (去掉补丁后的提示, 补丁)，没有找到时补丁为空字符串"""
+    if "@@" not in message:
+        return message, ""
+    lines = message.splitlines()
+    index = 0
+    while index < len(lines):
+        fence = _FENCE.match(lines[index])
+        if fence is not None:
+            marker = fence.group(1)
+            end = next((i for i in range(index + 1, len(lines)) if lines[i].strip().startswith(marker)), len(lines))
+            body = lines[index + 1:end]
+            files, _ = parse_diff_lines(body)
+            if any(f.hunks for f in files):
+                return "\n".join(lines[:index] + lines[end + 1:]).strip(), "\n".join(body)
+            index = end + 1
+            continue
+        if _starts_diff(lines, index):
+            files, stop = parse_diff_lines(lines, index)
+            if any(f.hunks for f in files):
+                return "\n".join(lines[:index] + lines[stop:]).strip(), "\n".join(lines[index:stop])
+        index += 1
+    return message, ""
+
+
+def hunk_count(files: List[DiffFile]) -> int:
+    return sum(len(f.hunks) for f in files)
+
+
+def review_result(files: List[DiffFile], decisions: Any) -> List[dict]:
+    """把界面或脚本回传的决定整理成返回给模型的列表；decisions 可以是按块顺序的列表、
+    对所有块生效的单个字符串，缺少或无法识别时为 undecided"""
+    if isinstance(decisions, str):
+        decisions = [decisions] * hunk_count(files)
+    elif not isinstance(decisions, list):
+        decisions = []
+    result = []
+    for file in files:
+        for number, hunk in enumerate(file.hunks):
+            decision = decisions[len(result)] if len(result) < len(decisions) else UNDECIDED
+            result.append({
+                "file": file.path,
+                "hunk": number,
+                "header": hunk.header,
+                "added": hunk.added,
+                "removed": hunk.removed,
+                "decision": decision if decision in DECISIONS else UNDECIDED,
+            })
+    return result